@@ -0,0 +1,113 @@
+"""
+Activity Log Detail Columns
+===========================
+JSON paths of activity_logs.details promoted to real, indexed columns.
+
+Login metadata (method, location, device), the UBA verdict (status) and
+every behaviour feature used to live only inside the details JSON, so
+filtering on them meant a full scan with json_extract. They are now
+columns of their own; details keeps whatever is left over (e.g. a failure
+reason) and is NULL when nothing is.
+
+SQLite cannot add STORED generated columns to an existing table, and a
+generated column could not outlive its JSON source anyway, so these are
+plain columns written by log_activity() and backfilled by migration 5.
+"""
+
+import json
+
+# (column, SQL type, JSON path in details)
+DETAIL_COLUMNS = (
+    ('method', 'TEXT', '$.method'),
+    ('location', 'TEXT', '$.location'),
+    ('device', 'TEXT', '$.device'),
+    ('status', 'TEXT', '$.status'),
+    ('login_hour', 'INTEGER', '$.behavior.login_hour'),
+    ('location_id', 'INTEGER', '$.behavior.location_id'),
+    ('is_new_device', 'INTEGER', '$.behavior.is_new_device'),
+    ('actions_count', 'INTEGER', '$.behavior.actions_count'),
+    ('files_accessed', 'INTEGER', '$.behavior.files_accessed'),
+    ('session_duration', 'REAL', '$.behavior.session_duration'),
+    ('failed_logins', 'INTEGER', '$.behavior.failed_logins'),
+    ('sensitive_access', 'INTEGER', '$.behavior.sensitive_access'),
+)
+
+DETAIL_COLUMN_NAMES = tuple(name for name, _, _ in DETAIL_COLUMNS)
+
+BEHAVIOR_COLUMNS = tuple(name for name, _, path in DETAIL_COLUMNS if path.startswith('$.behavior.'))
+
+# Partial indexes: only rows carrying the value are indexed
+DETAIL_INDEXES = tuple(
+    f'CREATE INDEX IF NOT EXISTS {{schema}}idx_activity_logs_{name}_time '
+    f'ON activity_logs({name}, timestamp) WHERE {name} IS NOT NULL'
+    for name in DETAIL_COLUMN_NAMES
+)
+
+def split_details(details, risk_score=None):
+    """
+    Split a details dict into promoted column values and the remainder.
+
+    A 'risk_score' equal to the row's risk_score column is dropped too.
+
+    Returns:
+        (tuple of values in DETAIL_COLUMNS order, remaining details JSON or None)
+    """
+    if not details:
+        return (None,) * len(DETAIL_COLUMNS), None
+    rest = dict(details)
+    behavior = rest.pop('behavior', None)
+    behavior = dict(behavior) if isinstance(behavior, dict) else behavior
+    values = []
+    for name, _, path in DETAIL_COLUMNS:
+        if path.startswith('$.behavior.'):
+            value = behavior.pop(name, None) if isinstance(behavior, dict) else None
+        else:
+            value = rest.pop(name, None)
+        values.append(int(value) if isinstance(value, bool) else value)
+    if behavior:
+        rest['behavior'] = behavior
+    if risk_score is not None and rest.get('risk_score') == risk_score:
+        del rest['risk_score']
+    return tuple(values), json.dumps(rest) if rest else None
+
+def add_detail_columns(conn, schema='main'):
+    """ALTER TABLE in any detail column activity_logs is missing (idempotent)"""
+    existing = {row[1] for row in conn.execute(f'PRAGMA {schema}.table_info(activity_logs)')}
+    for name, sql_type, _ in DETAIL_COLUMNS:
+        if name not in existing:
+            conn.execute(f'ALTER TABLE {schema}.activity_logs ADD COLUMN {name} {sql_type}')
+
+def backfill_detail_columns(conn, schema='main'):
+    """
+    Copy promoted JSON paths into their columns and strip them from details.
+
+    Columns already set are kept, so a re-run after details were stripped
+    does not blank them out.
+    """
+    assignments = ', '.join(f"{name} = COALESCE({name}, json_extract(details, '{path}'))"
+                            for name, _, path in DETAIL_COLUMNS)
+    conn.execute(f'''
+        UPDATE {schema}.activity_logs SET {assignments}
+        WHERE details IS NOT NULL AND json_valid(details)
+    ''')
+    paths = ', '.join(f"'{path}'" for _, _, path in DETAIL_COLUMNS)
+    conn.execute(f'''
+        UPDATE {schema}.activity_logs SET details = json_remove(details, {paths})
+        WHERE details IS NOT NULL AND json_valid(details)
+    ''')
+    conn.execute(f'''
+        UPDATE {schema}.activity_logs SET details = json_remove(details, '$.behavior')
+        WHERE details IS NOT NULL AND json_valid(details) AND json_extract(details, '$.behavior') = '{{}}'
+    ''')
+    conn.execute(f'''
+        UPDATE {schema}.activity_logs SET details = json_remove(details, '$.risk_score')
+        WHERE details IS NOT NULL AND json_valid(details) AND json_extract(details, '$.risk_score') = risk_score
+    ''')
+    conn.execute(f"UPDATE {schema}.activity_logs SET details = NULL WHERE details = '{{}}'")
+
+def migrate_detail_columns(conn):
+    """Migration step: add, backfill and index the detail columns"""
+    add_detail_columns(conn)
+    backfill_detail_columns(conn)
+    for statement in DETAIL_INDEXES:
+        conn.execute(statement.format(schema=''))
@@ -4,31 +4,47 @@ Nafath SSO MVP - Extended API Server
 Flask REST API with full dashboard support.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from datetime import datetime
-import json
 
 from database import (
     init_database, seed_data, 
-    get_all_users, get_user_by_id, get_user_by_national_id, create_user, get_users_by_tenant,
+    get_all_users, get_user_by_id, create_user, create_users_bulk, get_users_by_tenant,
     get_all_roles, get_roles_by_tenant,
     get_activity_logs, get_alerts, get_dashboard_stats, get_user_sessions,
-    get_all_tenants, get_tenant_by_id, get_tenant_by_code,
+    get_tenants_with_revenue, get_tenant_by_id, get_tenant_by_code,
     get_tenant_integrations, update_integration,
     get_tenant_settings, update_tenant_settings,
     get_login_stats, get_platform_revenue,
-    update_user_last_login
+    get_pool_stats,
+    WRITE_BEHIND_ENABLED, start_write_behind, get_write_behind_stats,
+    SINGLE_WRITER_ENABLED, start_single_writer, get_writer_stats,
+    decode_cursor, page_cursors, page_limit, JsonPage, reconcile_counters, archive_activity_logs, query_activity_logs, search,
+    iter_activity_logs, iter_alerts, LOG_EXPORT_COLUMNS, ALERT_EXPORT_COLUMNS,
+    USER_FIELDS, ALL_USER_FIELDS, LOG_FIELDS, ALERT_FIELDS, SESSION_FIELDS, get_session_cache_stats,
+    get_config_cache_stats
 )
 from auth import (
     initiate_nafath_auth, verify_nafath_otp, logout,
-    require_auth, verify_jwt_token
+    require_auth, verify_jwt_token, get_token_cache_stats, is_platform_admin
 )
 from uba_service import (
-    analyze_behavior, analyze_login, get_user_risk_profile
+    analyze_behavior, get_user_risk_profile
 )
+from login_rollup import rollup as login_rollup
+from session_reaper import reaper as session_reaper
+from otp_store import get_otp_store
+from throttle import throttle
+from bulk_io import detect_format, read_rows, ndjson_chunks, csv_chunks, json_page_chunks
+from feature_store import get_feature_store
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 
+# Reverse proxies in front of the app; request.remote_addr is taken from the
+# X-Forwarded-For hop the outermost one appended (0: use the socket address)
+TRUSTED_PROXY_COUNT = 0
+
 # Get parent directory for static files
 PARENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -37,6 +53,103 @@ app = Flask(__name__,
             static_folder=PARENT_DIR,
             static_url_path='/static')
 CORS(app)
+if TRUSTED_PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT)
+
+# =====================================
+# TENANT SCOPE
+# =====================================
+
+def get_scoped_tenant_id():
+    """
+    Tenant a cross-tenant read (search, export) is limited to, from ?tenant_id=.
+    
+    Callers see only their own tenant; platform admins may pass any
+    tenant_id, or none for every tenant. Needs @require_auth.
+    
+    Returns:
+        (tenant_id, error_response) - error_response is None if allowed
+    """
+    user = request.auth_context['user']
+    tenant_id = request.args.get('tenant_id', type=int)
+    if is_platform_admin(user):
+        return tenant_id, None
+    if user['tenant_id'] is None or tenant_id not in (None, user['tenant_id']):
+        return None, (jsonify({'success': False, 'error': 'Access denied', 'error_ar': 'غير مصرح'}), 403)
+    return user['tenant_id'], None
+
+# =====================================
+# PAGINATION
+# =====================================
+
+def get_page_args(default_limit):
+    """
+    Read limit/after/before query parameters.
+    
+    The limit is clamped to MAX_PAGE_SIZE here, so the cursors are worked
+    out against the page size the query actually used.
+    
+    Returns:
+        (limit, after, before, error_response) - error_response is None if valid
+    """
+    limit = page_limit(request.args.get('limit', default_limit, type=int))
+    after = request.args.get('after')
+    before = request.args.get('before')
+    try:
+        if after and before:
+            raise ValueError('Use either after or before, not both')
+        for cursor in (after, before):
+            if cursor:
+                decode_cursor(cursor)
+    except ValueError as e:
+        return limit, None, None, (jsonify({'success': False, 'error': str(e)}), 400)
+    return limit, after, before, None
+
+def get_projection_args(projection):
+    """
+    Read ?fields=a,b (subset of the projection) and ?format=compact.
+    
+    Returns:
+        (fields or None, json_rows, error_response) - error_response is None if valid
+    """
+    fields = request.args.get('fields')
+    fields = [name.strip() for name in fields.split(',') if name.strip()] if fields else None
+    json_rows = 'array' if request.args.get('format') == 'compact' else 'object'
+    unknown = [name for name in fields or () if name not in projection]
+    if unknown:
+        return None, None, (jsonify({'success': False, 'error': f'Unknown field {unknown[0]}'}), 400)
+    return fields, json_rows, None
+
+def page_response(key, rows, limit, sort_key, after=None, before=None):
+    """
+    Build a list response with keyset pagination cursors.
+    
+    A JsonPage is streamed out as-is (its rows are already JSON); compact
+    pages carry a "fields" header and one array per row.
+    """
+    next_cursor, prev_cursor = page_cursors(rows, limit, sort_key, after, before)
+    if isinstance(rows, JsonPage):
+        meta = {'next_cursor': next_cursor, 'prev_cursor': prev_cursor}
+        chunks = json_page_chunks(key, rows.rows, len(rows), meta, rows.fields if rows.arrays else None)
+        return Response(chunks, mimetype='application/json'), 200
+    return jsonify({
+        'success': True,
+        'count': len(rows),
+        key: rows,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor
+    }), 200
+
+def throttled_response(rejection):
+    """429 response for a login throttle rejection (see throttle.py)"""
+    response = jsonify({
+        'success': False,
+        'error': rejection['error'],
+        'error_ar': rejection['error_ar'],
+        'retry_after': rejection['retry_after']
+    })
+    response.headers['Retry-After'] = str(rejection['retry_after'])
+    return response, 429
 
 # =====================================
 # HEALTH & INFO
@@ -114,7 +227,17 @@ def health():
         'status': 'healthy',
         'service': 'Nafath SSO MVP',
         'version': '2.0.0',
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': datetime.utcnow().isoformat(),
+        'database_pool': get_pool_stats(),
+        'write_behind': get_write_behind_stats(),
+        'single_writer': get_writer_stats(),
+        'login_rollup': login_rollup.stats(),
+        'session_cache': get_session_cache_stats(),
+        'session_reaper': session_reaper.stats(),
+        'config_cache': get_config_cache_stats(),
+        'otp_store': get_otp_store().stats(),
+        'token_cache': get_token_cache_stats(),
+        'throttle': throttle.stats()
     })
 
 @app.route('/api/info', methods=['GET'])
@@ -156,7 +279,11 @@ def login_step1():
             'error_ar': 'يجب إدخال رقم الهوية'
         }), 400
     
-    result = initiate_nafath_auth(national_id)
+    rejection = throttle.check_login(national_id, request.remote_addr)
+    if rejection:
+        return throttled_response(rejection)
+    
+    result = initiate_nafath_auth(national_id, ip_address=request.remote_addr)
     
     if result['success']:
         return jsonify(result), 200
@@ -182,6 +309,10 @@ def login_step2():
             'error_ar': 'يجب إدخال رقم الهوية ورمز التحقق'
         }), 400
     
+    rejection = throttle.check_verify(national_id, request.remote_addr)
+    if rejection:
+        return throttled_response(rejection)
+    
     result = verify_nafath_otp(
         national_id=national_id,
         otp=otp,
@@ -191,26 +322,6 @@ def login_step2():
     )
     
     if result['success']:
-        # Update last login
-        user = get_user_by_national_id(national_id)
-        update_user_last_login(user['id'])
-        
-        # Analyze login behavior with UBA
-        uba_result = analyze_login(
-            user_id=user['id'],
-            session_id=result['session_id'],
-            login_hour=datetime.now().hour,
-            location=location,
-            location_id=0 if location in ['الرياض', 'riyadh'] else 1,
-            is_new_device='new' in device_info.lower() if device_info else False
-        )
-        
-        result['uba_analysis'] = {
-            'risk_score': uba_result['risk_score'],
-            'status': uba_result['status'],
-            'status_ar': uba_result['status_ar']
-        }
-        
         return jsonify(result), 200
     else:
         return jsonify(result), 401
@@ -227,9 +338,8 @@ def logout_user():
 @require_auth
 def get_current_user():
     """Get current authenticated user"""
-    user = get_user_by_id(request.current_user['user_id'])
+    user = request.auth_context['user']
     if user:
-        permissions = json.loads(user.get('permissions', '[]')) if user.get('permissions') else []
         return jsonify({
             'success': True,
             'user': {
@@ -240,7 +350,7 @@ def get_current_user():
                 'email': user['email'],
                 'role': user['role_name'],
                 'role_ar': user['role_name_ar'],
-                'permissions': permissions,
+                'permissions': user['permissions'],
                 'tenant_code': user.get('tenant_code'),
                 'tenant_name': user.get('tenant_name')
             }
@@ -254,8 +364,7 @@ def get_current_user():
 @app.route('/api/tenants', methods=['GET'])
 def list_tenants():
     """Get all tenants with stats"""
-    tenants = get_all_tenants()
-    revenue = get_platform_revenue()
+    tenants, revenue = get_tenants_with_revenue()
     
     return jsonify({
         'success': True,
@@ -284,13 +393,14 @@ def get_tenant_by_code_endpoint(code):
 
 @app.route('/api/tenants/<int:tenant_id>/users', methods=['GET'])
 def get_tenant_users(tenant_id):
-    """Get all users for a tenant"""
-    users = get_users_by_tenant(tenant_id)
-    return jsonify({
-        'success': True,
-        'count': len(users),
-        'users': users
-    }), 200
+    """Get users for a tenant (keyset paginated, ?fields= / ?format=compact)"""
+    limit, after, before, error = get_page_args(default_limit=100)
+    fields, json_rows, field_error = get_projection_args(USER_FIELDS)
+    if error or field_error:
+        return error or field_error
+    users = get_users_by_tenant(tenant_id, limit=limit, after=after, before=before,
+                                fields=fields, json_rows=json_rows)
+    return page_response('users', users, limit, 'created_at', after, before)
 
 @app.route('/api/tenants/<int:tenant_id>/roles', methods=['GET'])
 def get_tenant_roles(tenant_id):
@@ -315,25 +425,27 @@ def get_tenant_stats(tenant_id):
 
 @app.route('/api/tenants/<int:tenant_id>/logs', methods=['GET'])
 def get_tenant_logs(tenant_id):
-    """Get activity logs for a tenant"""
-    limit = request.args.get('limit', 50, type=int)
-    logs = get_activity_logs(tenant_id=tenant_id, limit=limit)
-    return jsonify({
-        'success': True,
-        'count': len(logs),
-        'logs': logs
-    }), 200
+    """Get activity logs for a tenant (keyset paginated, ?archived=true to include archives)"""
+    include_archived = request.args.get('archived', 'false').lower() == 'true'
+    limit, after, before, error = get_page_args(default_limit=50)
+    fields, json_rows, field_error = get_projection_args(LOG_FIELDS)
+    if error or field_error:
+        return error or field_error
+    logs = get_activity_logs(tenant_id=tenant_id, limit=limit, after=after, before=before,
+                             include_archived=include_archived, fields=fields, json_rows=json_rows)
+    return page_response('logs', logs, limit, 'timestamp', after, before)
 
 @app.route('/api/tenants/<int:tenant_id>/alerts', methods=['GET'])
 def get_tenant_alerts(tenant_id):
-    """Get security alerts for a tenant"""
+    """Get security alerts for a tenant (keyset paginated, ?fields= / ?format=compact)"""
     is_resolved = request.args.get('resolved', type=lambda x: x.lower() == 'true')
-    alerts = get_alerts(tenant_id=tenant_id, is_resolved=is_resolved)
-    return jsonify({
-        'success': True,
-        'count': len(alerts),
-        'alerts': alerts
-    }), 200
+    limit, after, before, error = get_page_args(default_limit=50)
+    fields, json_rows, field_error = get_projection_args(ALERT_FIELDS)
+    if error or field_error:
+        return error or field_error
+    alerts = get_alerts(tenant_id=tenant_id, is_resolved=is_resolved, limit=limit, after=after, before=before,
+                        fields=fields, json_rows=json_rows)
+    return page_response('alerts', alerts, limit, 'created_at', after, before)
 
 # =====================================
 # INTEGRATIONS
@@ -383,7 +495,8 @@ def update_settings(tenant_id):
     data = request.get_json()
     allowed_keys = [
         'nafath_sso_enabled', 'two_factor_required', 'audit_logging',
-        'siem_alerts', 'mdr_enabled', 'session_timeout_minutes', 'max_failed_attempts'
+        'siem_alerts', 'mdr_enabled', 'session_timeout_minutes', 'max_failed_attempts',
+        'ip_requests_per_minute', 'ip_failures_limit'
     ]
     settings = {k: v for k, v in data.items() if k in allowed_keys}
     
@@ -400,13 +513,13 @@ def update_settings(tenant_id):
 
 @app.route('/api/users', methods=['GET'])
 def list_users():
-    """Get all users"""
-    users = get_all_users()
-    return jsonify({
-        'success': True,
-        'count': len(users),
-        'users': users
-    }), 200
+    """Get all users (keyset paginated, ?fields= / ?format=compact)"""
+    limit, after, before, error = get_page_args(default_limit=100)
+    fields, json_rows, field_error = get_projection_args(ALL_USER_FIELDS)
+    if error or field_error:
+        return error or field_error
+    users = get_all_users(limit=limit, after=after, before=before, fields=fields, json_rows=json_rows)
+    return page_response('users', users, limit, 'created_at', after, before)
 
 @app.route('/api/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):
@@ -449,6 +562,30 @@ def add_user():
             'error': str(e)
         }), 400
 
+@app.route('/api/users/bulk', methods=['POST'])
+@require_auth
+def add_users_bulk():
+    """
+    Provision users from a streamed CSV or NDJSON body.
+    
+    Columns: national_id, name, name_ar, email, tenant_id or tenant_code,
+    role_id or role (name). ?tenant_id= sets a default tenant and
+    ?format=csv|ndjson overrides the Content-Type.
+    """
+    fmt = detect_format(request.content_type, request.args.get('format'))
+    if fmt is None:
+        return jsonify({
+            'success': False,
+            'error': 'Send text/csv or application/x-ndjson (or pass ?format=csv|ndjson)'
+        }), 415
+    
+    report = create_users_bulk(read_rows(request.stream, fmt),
+                               default_tenant_id=request.args.get('tenant_id', type=int))
+    return jsonify({
+        'success': report['failed'] == 0,
+        **report
+    }), 200
+
 # =====================================
 # ROLES
 # =====================================
@@ -476,6 +613,7 @@ def uba_analyze():
     
     session_data = {
         'session_id': session_id,
+        'tenant_id': request.current_session.get('tenant_id'),
         'login_hour': data.get('login_hour', datetime.now().hour),
         'location_id': data.get('location_id', 0),
         'is_new_device': data.get('is_new_device', False),
@@ -502,6 +640,39 @@ def uba_profile(user_id):
         'profile': profile
     }), 200
 
+@app.route('/api/uba/hunt', methods=['POST'])
+@require_auth
+def uba_hunt():
+    """
+    Threat hunt over the UBA feature store.
+    
+    Body: {"where": {"location_id": {"gte": 3}, "is_new_device": 1},
+           "since": "2026-01-01", "until": ..., "group_by": "user_id", "limit": 100}
+    """
+    store = get_feature_store()
+    if store is None:
+        return jsonify({
+            'success': False,
+            'error': 'Feature store not available (numpy not installed)'
+        }), 503
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        result = store.hunt(
+            where=data.get('where'),
+            since=data.get('since'),
+            until=data.get('until'),
+            group_by=data.get('group_by'),
+            limit=min(int(data.get('limit', 100)), 1000)
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        **result
+    }), 200
+
 @app.route('/api/uba/score', methods=['POST'])
 def uba_quick_score():
     """Quick UBA scoring (no auth required for demo)"""
@@ -607,17 +778,65 @@ def uba_model_info():
 
 @app.route('/api/logs', methods=['GET'])
 def list_logs():
-    """Get activity logs"""
+    """Get activity logs (keyset paginated, ?archived=true to include archives, ?fields= / ?format=compact)"""
     user_id = request.args.get('user_id', type=int)
     tenant_id = request.args.get('tenant_id', type=int)
-    limit = request.args.get('limit', 50, type=int)
+    include_archived = request.args.get('archived', 'false').lower() == 'true'
+    limit, after, before, error = get_page_args(default_limit=50)
+    fields, json_rows, field_error = get_projection_args(LOG_FIELDS)
+    if error or field_error:
+        return error or field_error
     
-    logs = get_activity_logs(user_id=user_id, tenant_id=tenant_id, limit=limit)
+    logs = get_activity_logs(user_id=user_id, tenant_id=tenant_id, limit=limit, after=after, before=before,
+                             include_archived=include_archived, fields=fields, json_rows=json_rows)
     
+    return page_response('logs', logs, limit, 'timestamp', after, before)
+
+@app.route('/api/logs/query', methods=['POST'])
+def query_logs():
+    """
+    Filter activity logs on method/location/device/status/behaviour columns.
+    
+    Body: {"where": {"location_id": {"gte": 3}, "is_new_device": 1},
+           "since": "2026-10-12", "until": ..., "tenant_id": 1, "action": "behavior_check",
+           "limit": 50, "after": <cursor>, "fields": ["id", "timestamp"], "format": "compact"}
+    """
+    data = request.get_json(silent=True) or {}
+    limit = data.get('limit', 50)
+    after = data.get('after')
+    before = data.get('before')
+    try:
+        if after and before:
+            raise ValueError('Use either after or before, not both')
+        limit = page_limit(limit)
+        logs = query_activity_logs(
+            where=data.get('where'),
+            since=data.get('since'),
+            until=data.get('until'),
+            tenant_id=data.get('tenant_id'),
+            user_id=data.get('user_id'),
+            action=data.get('action'),
+            limit=limit,
+            after=after,
+            before=before,
+            fields=data.get('fields'),
+            json_rows='array' if data.get('format') == 'compact' else 'object'
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return page_response('logs', logs, limit, 'timestamp', after, before)
+
+@app.route('/api/logs/archive', methods=['POST'])
+@require_auth
+def archive_logs():
+    """Move cold activity log months into compressed archives"""
+    data = request.get_json(silent=True) or {}
+    hot_days = data.get('hot_days')
+    moved = archive_activity_logs(hot_days) if hot_days else archive_activity_logs()
     return jsonify({
         'success': True,
-        'count': len(logs),
-        'logs': logs
+        'archived': [{'month': month, 'rows': rows} for month, rows in moved]
     }), 200
 
 # =====================================
@@ -626,17 +845,60 @@ def list_logs():
 
 @app.route('/api/alerts', methods=['GET'])
 def list_alerts():
-    """Get security alerts"""
+    """Get security alerts (keyset paginated, ?fields= / ?format=compact)"""
     tenant_id = request.args.get('tenant_id', type=int)
     is_resolved = request.args.get('resolved', type=lambda x: x.lower() == 'true')
-    limit = request.args.get('limit', 50, type=int)
+    limit, after, before, error = get_page_args(default_limit=50)
+    fields, json_rows, field_error = get_projection_args(ALERT_FIELDS)
+    if error or field_error:
+        return error or field_error
     
-    alerts = get_alerts(tenant_id=tenant_id, is_resolved=is_resolved, limit=limit)
+    alerts = get_alerts(tenant_id=tenant_id, is_resolved=is_resolved, limit=limit, after=after, before=before,
+                        fields=fields, json_rows=json_rows)
     
+    return page_response('alerts', alerts, limit, 'created_at', after, before)
+
+# =====================================
+# SEARCH
+# =====================================
+
+@app.route('/api/search', methods=['GET'])
+@require_auth
+def search_events():
+    """
+    Full-text search over security alerts and activity logs.
+    
+    Query: ?q=<words>&type=alerts|logs|all&tenant_id=1&limit=20&after=<cursor>
+    Results are ranked best match first; cursors need a single type.
+    Searches are limited to the caller's tenant; only platform admins may
+    pass another tenant_id, or none to search every tenant.
+    """
+    text = request.args.get('q', '')
+    source = request.args.get('type', 'all')
+    tenant_id, error = get_scoped_tenant_id()
+    if error:
+        return error
+    limit, after, before, error = get_page_args(default_limit=20)
+    if error:
+        return error
+    if source == 'all' and (after or before):
+        return jsonify({'success': False, 'error': 'Paging needs type=alerts or type=logs'}), 400
+    
+    sources = ('alerts', 'logs') if source == 'all' else (source,)
+    try:
+        results = {name: search(name, text, tenant_id=tenant_id, limit=limit, after=after, before=before)
+                   for name in sources}
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    
+    if len(sources) == 1:
+        return page_response(source, results[source], limit, 'rank', after, before)
     return jsonify({
         'success': True,
-        'count': len(alerts),
-        'alerts': alerts
+        **{name: rows for name, rows in results.items()},
+        'next_cursors': {name: page_cursors(rows, limit, 'rank')[0] for name, rows in results.items()}
     }), 200
 
 # =====================================
@@ -646,17 +908,115 @@ def list_alerts():
 @app.route('/api/sessions', methods=['GET'])
 @require_auth
 def list_sessions():
-    """Get user's sessions"""
+    """Get user's sessions (keyset paginated, ?fields= / ?format=compact)"""
     user_id = request.current_user['user_id']
-    limit = request.args.get('limit', 10, type=int)
+    limit, after, before, error = get_page_args(default_limit=10)
+    fields, json_rows, field_error = get_projection_args(SESSION_FIELDS)
+    if error or field_error:
+        return error or field_error
     
-    sessions = get_user_sessions(user_id=user_id, limit=limit)
+    sessions = get_user_sessions(user_id=user_id, limit=limit, after=after, before=before,
+                                 fields=fields, json_rows=json_rows)
     
+    return page_response('sessions', sessions, limit, 'login_time', after, before)
+
+@app.route('/api/sessions/reap', methods=['POST'])
+@require_auth
+def reap_sessions():
+    """Expire sessions past their tenant's session timeout now"""
     return jsonify({
         'success': True,
-        'count': len(sessions),
-        'sessions': sessions
-    }), 200
+        'reaped': session_reaper.reap(),
+        'stats': session_reaper.stats()
+    })
+
+# =====================================
+# BULK EXPORT
+# =====================================
+
+EXPORT_MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+def get_export_range():
+    """
+    Read ?since=&until= (ISO dates or datetimes) for exports.
+    
+    Returns:
+        (since, until, error_response)
+    """
+    bounds = []
+    for name in ('since', 'until'):
+        value = request.args.get(name)
+        if value:
+            try:
+                value = datetime.fromisoformat(value).strftime('%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                return None, None, (jsonify({
+                    'success': False,
+                    'error': f'{name} must be an ISO date or datetime'
+                }), 400)
+        bounds.append(value)
+    return bounds[0], bounds[1], None
+
+def export_response(name, batches, columns):
+    """Stream batches as NDJSON (default) or CSV with chunked transfer"""
+    fmt = request.args.get('format', 'ndjson').lower()
+    chunks = csv_chunks(batches, columns) if fmt == 'csv' else ndjson_chunks(batches, columns)
+    return Response(chunks, mimetype=EXPORT_MIMETYPES.get(fmt, EXPORT_MIMETYPES['ndjson']), headers={
+        'Content-Disposition': f'attachment; filename={name}.{"csv" if fmt == "csv" else "ndjson"}'
+    })
+
+@app.route('/api/export/logs', methods=['GET'])
+@require_auth
+def export_logs():
+    """
+    Stream activity logs oldest first for SIEM backfill.
+    
+    Filters: since, until, tenant_id, user_id, action; archived=true also
+    reads archived months. Resume with after=<cursor of the last row>.
+    Limited to the caller's tenant unless they are a platform admin.
+    """
+    since, until, error = get_export_range()
+    tenant_id, scope_error = get_scoped_tenant_id()
+    if error or scope_error:
+        return error or scope_error
+    try:
+        batches = iter_activity_logs(
+            since=since, until=until,
+            tenant_id=tenant_id,
+            user_id=request.args.get('user_id', type=int),
+            action=request.args.get('action'),
+            after=request.args.get('after'),
+            include_archived=request.args.get('archived', 'false').lower() == 'true'
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return export_response('activity_logs', batches, LOG_EXPORT_COLUMNS)
+
+@app.route('/api/export/alerts', methods=['GET'])
+@require_auth
+def export_alerts():
+    """
+    Stream security alerts oldest first for SIEM backfill.
+    
+    Filters: since, until, tenant_id, user_id, alert_type. Resume with
+    after=<cursor of the last row>. Limited to the caller's tenant unless
+    they are a platform admin.
+    """
+    since, until, error = get_export_range()
+    tenant_id, scope_error = get_scoped_tenant_id()
+    if error or scope_error:
+        return error or scope_error
+    try:
+        batches = iter_alerts(
+            since=since, until=until,
+            tenant_id=tenant_id,
+            user_id=request.args.get('user_id', type=int),
+            alert_type=request.args.get('alert_type'),
+            after=request.args.get('after')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return export_response('security_alerts', batches, ALERT_EXPORT_COLUMNS)
 
 # =====================================
 # DASHBOARD - PLATFORM WIDE
@@ -675,6 +1035,27 @@ def platform_dashboard_stats():
         'login_history': login_stats
     }), 200
 
+@app.route('/api/dashboard/throttle', methods=['GET'])
+@require_auth
+def throttle_dashboard_stats():
+    """Login throttling counters for the SOC dashboard (rejections by reason and tenant)"""
+    return jsonify({
+        'success': True,
+        'throttle': throttle.stats()
+    }), 200
+
+@app.route('/api/dashboard/counters/reconcile', methods=['POST'])
+@require_auth
+def reconcile_dashboard_counters():
+    """Recompute dashboard counters from source tables and report drift"""
+    data = request.get_json(silent=True) or {}
+    drift = reconcile_counters(fix=data.get('fix', True))
+    return jsonify({
+        'success': True,
+        'drift_count': len(drift),
+        'drift': drift
+    }), 200
+
 @app.route('/api/dashboard/revenue', methods=['GET'])
 def get_revenue():
     """Get platform revenue"""
@@ -697,6 +1078,14 @@ if __name__ == '__main__':
     print("\n[1] Initializing database...")
     init_database()
     seed_data()
+    if SINGLE_WRITER_ENABLED:
+        start_single_writer()
+        print("✓ Single-writer mode enabled (read-only connection pool for reads)")
+    if WRITE_BEHIND_ENABLED:
+        start_write_behind()
+        print("✓ Write-behind logging enabled")
+    session_reaper.start()
+    print(f"✓ Session reaper running every {session_reaper.interval}s")
     
     print("\n[2] Starting Flask server on port 5002...")
     print("\n" + "-" * 60)
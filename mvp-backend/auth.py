@@ -12,17 +12,28 @@ from functools import wraps
 from flask import request, jsonify
 
 from database import (
-    get_user_by_national_id, create_session, get_session_by_token,
-    end_session, log_activity
+    get_user_by_national_id, record_login, get_session_by_token, get_auth_context,
+    end_session, log_activity, get_tenant_settings
+)
+from login_rollup import record_login_event
+from uba_service import score_behavior, login_session_data, log_details, alert_for
+from feature_store import record_features
+from throttle import throttle
+from token_cache import TokenCache
+from otp_store import (
+    get_otp_store, OTP_TTL_SECONDS, OTP_MAX_ATTEMPTS,
+    OTP_MISSING, OTP_EXPIRED, OTP_BLOCKED, OTP_INVALID
 )
 
 # Configuration
 JWT_SECRET = 'nafath-sso-mvp-secret-key-2024'
 JWT_ALGORITHM = 'HS256'
 TOKEN_EXPIRY_HOURS = 8
+TOKEN_CACHE_ENABLED = True       # Serve repeat tokens from verified payloads instead of jwt.decode
+TOKEN_CACHE_MAX_ENTRIES = 10000
+PLATFORM_ADMIN_PERMISSION = 'platform_admin'   # Role permission for cross-tenant access
 
-# Simulated Nafath OTP storage (in production, this would be redis/memcached)
-pending_otps = {}
+_token_cache = TokenCache(TOKEN_CACHE_MAX_ENTRIES)
 
 def generate_otp():
     """Generate a 2-digit OTP (like Nafath app)"""
@@ -35,20 +46,35 @@ def generate_jwt_token(user_id, national_id, role):
         'national_id': national_id,
         'role': role,
         'iat': datetime.utcnow(),
+        'jti': secrets.token_hex(8),   # Unique per login, even within the same second
         'exp': datetime.utcnow() + timedelta(hours=TOKEN_EXPIRY_HOURS)
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 def verify_jwt_token(token):
-    """Verify and decode JWT token"""
+    """Verify and decode JWT token (verified payloads are cached until exp / logout)"""
+    if TOKEN_CACHE_ENABLED:
+        payload = _token_cache.get(token)
+        if payload is not None:
+            return payload
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        if TOKEN_CACHE_ENABLED:
+            _token_cache.put(token, payload)
         return payload
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
 
+def get_token_cache_stats():
+    """Get verified-token cache hit/miss and eviction statistics"""
+    return _token_cache.stats()
+
+def is_platform_admin(user):
+    """Whether a user (from request.auth_context) may act across tenants"""
+    return PLATFORM_ADMIN_PERMISSION in (user.get('permissions') or ())
+
 def require_auth(f):
     """Decorator to require authentication"""
     @wraps(f)
@@ -69,19 +95,20 @@ def require_auth(f):
         if not payload:
             return jsonify({'error': 'Invalid or expired token', 'error_ar': 'جلسة منتهية الصلاحية'}), 401
         
-        # Check if session is still active
-        session = get_session_by_token(token)
-        if not session:
+        # Check if session is still active (session, user, role and tenant in one lookup)
+        context = get_auth_context(token)
+        if not context:
             return jsonify({'error': 'Session ended', 'error_ar': 'تم إنهاء الجلسة'}), 401
         
-        # Add user info to request
+        # Add user info to request (handlers read identity from here, not the database)
         request.current_user = payload
-        request.current_session = session
+        request.current_session = context['session']
+        request.auth_context = context
         
         return f(*args, **kwargs)
     return decorated
 
-def initiate_nafath_auth(national_id):
+def initiate_nafath_auth(national_id, ip_address=None):
     """
     Step 1: Initiate Nafath authentication
     In real world: Would call Nafath API
@@ -91,6 +118,7 @@ def initiate_nafath_auth(national_id):
     user = get_user_by_national_id(national_id)
     
     if not user:
+        throttle.record_failure(None, ip_address)
         return {
             'success': False,
             'error': 'user_not_found',
@@ -104,16 +132,15 @@ def initiate_nafath_auth(national_id):
             'error_ar': 'الحساب غير نشط'
         }
     
+    # Let the throttle apply this tenant's limits to later requests
+    settings = get_tenant_settings(user.get('tenant_id')) if user.get('tenant_id') else None
+    throttle.learn(national_id, user.get('tenant_id'), settings)
+    
     # Generate OTP
     otp = generate_otp()
     
-    # Store OTP (expires in 2 minutes)
-    pending_otps[national_id] = {
-        'otp': otp,
-        'user_id': user['id'],
-        'expires': datetime.utcnow() + timedelta(minutes=2),
-        'attempts': 0
-    }
+    # Store OTP (expires in OTP_TTL_SECONDS)
+    get_otp_store().put(national_id, otp, user['id'], user.get('tenant_id'))
     
     return {
         'success': True,
@@ -121,26 +148,25 @@ def initiate_nafath_auth(national_id):
         'message_ar': 'تم إرسال رمز التحقق لتطبيق نفاذ',
         'otp_display': otp,  # In real world, this would NOT be returned
         'user_name': user['name_ar'],
-        'expires_in': 120
+        'expires_in': OTP_TTL_SECONDS
     }
 
 def verify_nafath_otp(national_id, otp, device_info=None, ip_address=None, location=None):
     """
     Step 2: Verify OTP and complete authentication
     """
-    # Check if OTP exists
-    if national_id not in pending_otps:
+    # Check the OTP and count the attempt in one step
+    outcome, otp_data = get_otp_store().verify(national_id, otp, OTP_MAX_ATTEMPTS)
+
+    if outcome == OTP_MISSING:
         return {
             'success': False,
             'error': 'no_pending_auth',
             'error_ar': 'لا توجد عملية مصادقة معلقة'
         }
     
-    otp_data = pending_otps[national_id]
-    
     # Check expiration
-    if datetime.utcnow() > otp_data['expires']:
-        del pending_otps[national_id]
+    if outcome == OTP_EXPIRED:
         return {
             'success': False,
             'error': 'otp_expired',
@@ -148,8 +174,16 @@ def verify_nafath_otp(national_id, otp, device_info=None, ip_address=None, locat
         }
     
     # Check attempts
-    if otp_data['attempts'] >= 3:
-        del pending_otps[national_id]
+    if outcome == OTP_BLOCKED:
+        throttle.record_failure(national_id, ip_address)
+        log_activity(
+            user_id=otp_data['user_id'],
+            session_id=None,
+            action='login_blocked',
+            details={'method': 'nafath', 'reason': 'max_attempts'},
+            tenant_id=otp_data.get('tenant_id')
+        )
+        record_login_event(otp_data.get('tenant_id'), otp_data['user_id'], 'blocked')
         return {
             'success': False,
             'error': 'max_attempts',
@@ -157,16 +191,24 @@ def verify_nafath_otp(national_id, otp, device_info=None, ip_address=None, locat
         }
     
     # Verify OTP
-    if otp != otp_data['otp']:
-        otp_data['attempts'] += 1
+    if outcome == OTP_INVALID:
+        throttle.record_failure(national_id, ip_address)
+        log_activity(
+            user_id=otp_data['user_id'],
+            session_id=None,
+            action='login_failed',
+            details={'method': 'nafath', 'reason': 'invalid_otp'},
+            tenant_id=otp_data.get('tenant_id')
+        )
+        record_login_event(otp_data.get('tenant_id'), otp_data['user_id'], 'failed')
         return {
             'success': False,
             'error': 'invalid_otp',
             'error_ar': 'رمز التحقق غير صحيح',
-            'attempts_remaining': 3 - otp_data['attempts']
+            'attempts_remaining': OTP_MAX_ATTEMPTS - otp_data['attempts']
         }
     
-    # OTP verified - get user and create session
+    # OTP verified - the only user lookup of the login
     user = get_user_by_national_id(national_id)
     
     # Generate JWT token
@@ -180,35 +222,38 @@ def verify_nafath_otp(national_id, otp, device_info=None, ip_address=None, locat
         known_locations = {'الرياض': 0, 'riyadh': 0, 'جدة': 1, 'jeddah': 1, 'الدمام': 2, 'dammam': 2}
         location_id = known_locations.get(location.lower(), 3)
     
-    # Create session
-    session_id = create_session(
+    # Score the login with UBA before anything is written
+    assessment = score_behavior(login_session_data(
+        login_hour=datetime.now().hour,
+        location_id=0 if location in ['الرياض', 'riyadh'] else 1,
+        is_new_device='new' in device_info.lower() if device_info else False
+    ))
+    
+    # Session, last login, activity logs and alert in one transaction
+    ids = record_login(
         user_id=user['id'],
+        tenant_id=user.get('tenant_id'),
         token=token,
         ip_address=ip_address or request.remote_addr if request else 'unknown',
         device_info=device_info or 'unknown',
         location=location or 'الرياض',
         location_id=location_id,
-        is_new_device=is_new_device
-    )
-    
-    # Log activity
-    log_activity(
-        user_id=user['id'],
-        session_id=session_id,
-        action='login',
-        details={
+        is_new_device=is_new_device,
+        login_details={
             'method': 'nafath',
             'location': location,
             'device': device_info
-        }
+        },
+        uba_details=log_details(assessment),
+        risk_score=assessment['risk_score'],
+        is_anomaly=assessment['is_anomaly'],
+        alert=alert_for(assessment['risk_score'])
     )
-    
-    # Clear OTP
-    del pending_otps[national_id]
-    
-    # Import permissions
-    import json
-    permissions = json.loads(user.get('permissions', '[]')) if user.get('permissions') else []
+    session_id = ids['session_id']
+    throttle.record_success(national_id)
+    record_login_event(user.get('tenant_id'), user['id'], 'success')
+    record_features(ids['uba_log_id'], user['id'], user.get('tenant_id'), assessment['risk_score'],
+                    assessment['behavior'])
     
     return {
         'success': True,
@@ -224,7 +269,12 @@ def verify_nafath_otp(national_id, otp, device_info=None, ip_address=None, locat
             'email': user['email'],
             'role': user['role_name'],
             'role_ar': user['role_name_ar'],
-            'permissions': permissions
+            'permissions': user['permissions']
+        },
+        'uba_analysis': {
+            'risk_score': assessment['risk_score'],
+            'status': assessment['status'],
+            'status_ar': assessment['status_ar']
         }
     }
 
@@ -239,5 +289,6 @@ def logout(token):
             details={}
         )
         end_session(token)
+        _token_cache.invalidate(token)
         return {'success': True, 'message_ar': 'تم تسجيل الخروج'}
     return {'success': False, 'error_ar': 'جلسة غير موجودة'}
@@ -0,0 +1,703 @@
+"""
+Backend Benchmarks
+==================
+Micro-benchmarks for database.py hot paths against scratch databases.
+
+Usage: python benchmarks.py [name ...]   (runs all benchmarks by default)
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+
+def scratch_database(name):
+    """Point database.py at a fresh, initialized scratch database"""
+    database.close_pool()
+    database.DATABASE_PATH = os.path.join(tempfile.mkdtemp(), f'{name}.db')
+    database.init_database()
+
+def timed(fn, repeat=20):
+    """Run fn repeatedly; return (median ms, last result)"""
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], result
+
+def report(label, baseline_ms, optimized_ms):
+    print(f"  {label:<40} {baseline_ms:10.2f} ms -> {optimized_ms:8.2f} ms  ({baseline_ms / max(optimized_ms, 1e-6):.0f}x)")
+
+# =====================================
+# TENANT LISTING
+# =====================================
+
+def bench_tenant_listing(n_tenants=1000, users_per_tenant=20, days=365):
+    """/api/tenants: correlated subqueries vs counter-backed single query"""
+    print(f"\n📊 Tenant listing: {n_tenants} tenants, {days} days of login_stats")
+    scratch_database('tenants')
+    rng = random.Random(42)
+    today = datetime.utcnow().date()
+
+    with database.get_db() as conn:
+        conn.executemany('''
+            INSERT INTO tenants (code, name, name_ar, contract_tier) VALUES (?, ?, ?, ?)
+        ''', [(f'T{i:04d}', f'Tenant {i}', f'جهة {i}', rng.choice(list(database.PLAN_PRICING)))
+              for i in range(1, n_tenants + 1)])
+        conn.executemany('''
+            INSERT INTO users (tenant_id, national_id, name, is_active) VALUES (?, ?, ?, ?)
+        ''', [(t, f'1{t:05d}{u:04d}', f'User {u}', rng.random() < 0.9)
+              for t in range(1, n_tenants + 1) for u in range(users_per_tenant)])
+        conn.executemany('''
+            INSERT INTO login_stats (tenant_id, date, successful_logins, failed_logins) VALUES (?, ?, ?, ?)
+        ''', [(t, (today - timedelta(days=d)).isoformat(), rng.randint(0, 200), rng.randint(0, 5))
+              for t in range(1, n_tenants + 1) for d in range(days)])
+        conn.commit()
+
+    def baseline():
+        with database.get_db() as conn:
+            tenants = [dict(row) for row in conn.execute('''
+                SELECT t.*,
+                       (SELECT COUNT(*) FROM users WHERE tenant_id = t.id AND is_active = 1) as user_count,
+                       (SELECT SUM(successful_logins) FROM login_stats WHERE tenant_id = t.id AND date >= date('now', '-30 days')) as monthly_logins,
+                       (SELECT SUM(failed_logins) FROM login_stats WHERE tenant_id = t.id AND date >= date('now', '-30 days')) as monthly_failures
+                FROM tenants t
+                WHERE t.is_active = 1
+                ORDER BY t.id
+            ''')]
+        return tenants, database.get_platform_revenue()
+
+    baseline_ms, (expected, expected_revenue) = timed(baseline, repeat=5)
+    optimized_ms, (tenants, revenue) = timed(database.get_tenants_with_revenue, repeat=5)
+
+    assert revenue == expected_revenue, 'revenue mismatch'
+    summary = lambda rows: [(t['id'], t['user_count'], t['monthly_logins'] or 0, t['monthly_failures'] or 0) for t in rows]
+    assert summary(tenants) == summary(expected), 'stats mismatch'
+    report('get_tenants_with_revenue()', baseline_ms, optimized_ms)
+
+# =====================================
+# MIXED READ/WRITE LOAD
+# =====================================
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+def run_mixed_load(threads, ops_per_thread, write_ratio):
+    """Login/UBA-style traffic from `threads` workers; returns (read_ms, write_ms, errors)"""
+    reads, writes, errors = [], [], []
+    lock = threading.Lock()
+
+    def worker(seed):
+        rng = random.Random(seed)
+        local_reads, local_writes = [], []
+        for i in range(ops_per_thread):
+            user_id = rng.randint(1, 7)
+            is_write = rng.random() < write_ratio
+            start = time.perf_counter()
+            try:
+                if is_write:
+                    op = rng.randrange(3)
+                    if op == 0:
+                        database.log_activity(user_id, None, 'behavior_check', {'actions_count': i}, risk_score=10, tenant_id=1)
+                    elif op == 1:
+                        database.create_session(user_id, f'bench-{seed}-{i}', '127.0.0.1', 'bench', 'Riyadh', tenant_id=1)
+                    else:
+                        database.update_user_last_login(user_id)
+                else:
+                    op = rng.randrange(3)
+                    if op == 0:
+                        database.get_activity_logs(user_id=user_id, limit=50)
+                    elif op == 1:
+                        database.get_dashboard_stats(1)
+                    else:
+                        database.get_user_sessions(user_id)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            (local_writes if is_write else local_reads).append((time.perf_counter() - start) * 1000)
+        with lock:
+            reads.extend(local_reads)
+            writes.extend(local_writes)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return reads, writes, errors
+
+def bench_single_writer(threads=16, ops_per_thread=300, write_ratio=0.3):
+    """Mixed read/write load: shared read-write pool vs single writer + read-only pool"""
+    print(f"\n📊 Mixed load: {threads} threads x {ops_per_thread} ops, {write_ratio:.0%} writes")
+    results = {}
+    for mode in ('pooled', 'single_writer'):
+        scratch_database(f'mixed_{mode}')
+        database.seed_data()
+        if mode == 'single_writer':
+            database.start_single_writer()
+        start = time.perf_counter()
+        reads, writes, errors = run_mixed_load(threads, ops_per_thread, write_ratio)
+        elapsed = time.perf_counter() - start
+        database.stop_single_writer()
+        results[mode] = (reads, writes)
+        print(f"  {mode:<14} {(len(reads) + len(writes)) / elapsed:8.0f} ops/s  "
+              f"read p50 {percentile(reads, 50):6.2f} p99 {percentile(reads, 99):7.2f} ms  "
+              f"write p50 {percentile(writes, 50):6.2f} p99 {percentile(writes, 99):7.2f} ms  "
+              f"errors {len(errors)}")
+    for label, index in (('read p99', 0), ('write p99', 1)):
+        report(label, percentile(results['pooled'][index], 99), percentile(results['single_writer'][index], 99))
+
+# =====================================
+# UBA FEATURE STORE
+# =====================================
+
+def bench_feature_store(n_vectors=1000000):
+    """Threat hunt: json_extract over activity_logs vs memory-mapped feature columns"""
+    import json
+    import feature_store
+
+    print(f"\n📊 Feature store: {n_vectors} UBA vectors")
+    scratch_database('features')
+    rng = random.Random(42)
+    start_ts = int(time.time()) - 90 * 86400
+    rows = []
+    for i in range(n_vectors):
+        behavior = {'login_hour': rng.randint(0, 23), 'location_id': rng.choice([0, 0, 0, 1, 2, 3, 4]),
+                    'is_new_device': int(rng.random() < 0.1), 'actions_count': rng.randint(1, 80),
+                    'files_accessed': rng.randint(0, 30), 'session_duration': rng.randint(0, 480),
+                    'failed_logins': rng.choice([0, 0, 0, 1, 3]), 'sensitive_access': rng.randint(0, 6)}
+        rows.append((i % 5000 + 1, i % 50 + 1, rng.randint(0, 100), start_ts + i * 90 * 86400 // n_vectors, behavior))
+
+    with database.get_db() as conn:
+        conn.executemany('''
+            INSERT INTO activity_logs (user_id, tenant_id, action, details, risk_score, timestamp)
+            VALUES (?, ?, 'behavior_check', ?, ?, datetime(?, 'unixepoch'))
+        ''', [(u, t, json.dumps({'behavior': b, 'risk_score': r, 'status': 'normal'}), r, ts) for u, t, r, ts, b in rows])
+        conn.commit()
+    store = feature_store.get_feature_store()
+    store.append_many([{**b, 'log_id': i + 1, 'user_id': u, 'tenant_id': t, 'risk_score': r, 'timestamp': ts}
+                       for i, (u, t, r, ts, b) in enumerate(rows)])
+
+    def baseline():
+        with database.get_db() as conn:
+            return conn.execute('''
+                SELECT user_id, COUNT(*), AVG(risk_score), MAX(risk_score) FROM activity_logs
+                WHERE json_extract(details, '$.behavior.location_id') >= 3
+                  AND json_extract(details, '$.behavior.is_new_device') = 1
+                GROUP BY user_id
+            ''').fetchall()
+
+    def hunt():
+        return store.hunt(where={'location_id': {'gte': 3}, 'is_new_device': 1}, group_by='user_id', limit=10000)
+
+    baseline_ms, expected = timed(baseline, repeat=3)
+    optimized_ms, result = timed(hunt, repeat=10)
+    assert result['matched'] == sum(row[1] for row in expected), 'match count mismatch'
+    report('hunt(location>=3, new device) by user', baseline_ms, optimized_ms)
+
+# =====================================
+# ACTIVITY DETAIL COLUMNS
+# =====================================
+
+def bench_detail_columns(n_logs=500000):
+    """Detail filters: json_extract over details vs promoted, indexed columns"""
+    import json
+    from activity_details import DETAIL_COLUMN_NAMES, split_details
+
+    print(f"\n📊 Activity detail columns: {n_logs} activity logs")
+    scratch_database('details')
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    rows = []
+    for i in range(n_logs):
+        if i % 3:
+            details = {'method': 'nafath', 'location': rng.choice(['الرياض', 'جدة', 'Unknown']), 'device': 'Chrome'}
+            action, risk = 'login', 0
+        else:
+            risk = rng.randint(0, 100)
+            details = {'behavior': {'login_hour': rng.randint(0, 23), 'location_id': rng.choice([0, 0, 0, 1, 2, 3, 4]),
+                                    'is_new_device': int(rng.random() < 0.05), 'actions_count': rng.randint(1, 80),
+                                    'files_accessed': rng.randint(0, 30), 'session_duration': rng.randint(0, 480),
+                                    'failed_logins': rng.choice([0, 0, 0, 1, 3]), 'sensitive_access': rng.randint(0, 6)},
+                       'risk_score': risk, 'status': 'threat' if risk >= 80 else 'normal'}
+            action = 'behavior_check'
+        stamp = (now - timedelta(minutes=rng.randint(0, 90 * 1440))).strftime('%Y-%m-%d %H:%M:%S')
+        rows.append((i % 5000 + 1, i % 50 + 1, action, details, risk, stamp))
+
+    # Old layout: everything in details. New layout: promoted columns + remainder.
+    old_bytes = sum(len(json.dumps(r[3])) for r in rows)
+    new_bytes = sum(len(split_details(r[3], r[4])[1] or '') for r in rows)
+    with database.get_db() as conn:
+        conn.executemany(f'''
+            INSERT INTO activity_logs (user_id, tenant_id, action, details, risk_score, timestamp, {', '.join(DETAIL_COLUMN_NAMES)})
+            VALUES (?, ?, ?, ?, ?, ?, {', '.join('?' * len(DETAIL_COLUMN_NAMES))})
+        ''', [(u, t, a, json.dumps(d), r, ts) + split_details(d, r)[0] for u, t, a, d, r, ts in rows])
+        conn.execute('ANALYZE')
+        conn.commit()
+    print(f"  details JSON {old_bytes / n_logs:.0f} -> {new_bytes / n_logs:.0f} bytes/row")
+
+    week_ago = (now - timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')
+
+    def baseline():
+        with database.get_db() as conn:
+            return conn.execute('''
+                SELECT * FROM activity_logs
+                WHERE json_extract(details, '$.behavior.location_id') >= 3
+                  AND json_extract(details, '$.behavior.is_new_device') = 1
+                  AND timestamp >= ?
+                ORDER BY timestamp DESC, id DESC LIMIT 50
+            ''', (week_ago,)).fetchall()
+
+    def optimized():
+        return database.query_activity_logs({'location_id': {'gte': 3}, 'is_new_device': 1}, since=week_ago)
+
+    baseline_ms, expected = timed(baseline, repeat=5)
+    optimized_ms, result = timed(optimized)
+    assert [r['id'] for r in expected] == [r['id'] for r in result], 'result mismatch'
+    report('new device, unknown location, last 7 days', baseline_ms, optimized_ms)
+
+    def baseline_status():
+        with database.get_db() as conn:
+            return conn.execute('''
+                SELECT COUNT(*) FROM activity_logs WHERE json_extract(details, '$.status') = 'threat' AND tenant_id = 7
+            ''').fetchone()[0]
+
+    def optimized_status():
+        with database.get_db() as conn:
+            return conn.execute("SELECT COUNT(*) FROM activity_logs WHERE status = 'threat' AND tenant_id = 7").fetchone()[0]
+
+    baseline_ms, expected = timed(baseline_status, repeat=5)
+    optimized_ms, result = timed(optimized_status)
+    assert expected == result, 'count mismatch'
+    report("count status='threat' for a tenant", baseline_ms, optimized_ms)
+
+# =====================================
+# FULL-TEXT SEARCH
+# =====================================
+
+def bench_search(n_alerts=300000):
+    """Alert search: LIKE scan vs FTS5 index"""
+    from search import install_search
+
+    print(f"\n📊 Full-text search: {n_alerts} security alerts")
+    scratch_database('search')
+    rng = random.Random(42)
+    words = ['unusual', 'access', 'pattern', 'detected', 'login', 'from', 'foreign', 'location', 'bulk',
+             'export', 'of', 'classified', 'documents', 'new', 'device', 'after', 'hours', 'risk', 'score']
+    rows = []
+    for i in range(n_alerts):
+        description = ' '.join(rng.choice(words) for _ in range(8))
+        if i % 1000 == 0:
+            description += ' exfiltration attempt'
+        rows.append((i % 5000 + 1, i % 50 + 1, rng.choice(['suspicious_behavior', 'high_risk_behavior']),
+                     'warning', description))
+
+    insert_sql = '''
+        INSERT INTO security_alerts (user_id, tenant_id, alert_type, severity, description) VALUES (?, ?, ?, ?, ?)
+    '''
+    with database.get_db() as conn:
+        start = time.perf_counter()
+        conn.executemany(insert_sql, rows)
+        conn.commit()
+        indexed_ms = (time.perf_counter() - start) * 1000
+        # Same load without the FTS trigger, rolled back
+        conn.execute('DROP TRIGGER trg_alerts_fts_insert')
+        start = time.perf_counter()
+        conn.executemany(insert_sql, rows)
+        plain_ms = (time.perf_counter() - start) * 1000
+        conn.rollback()
+        install_search(conn)
+        conn.commit()
+    print(f"  insert {n_alerts} alerts: {plain_ms:.0f} ms without index, {indexed_ms:.0f} ms with FTS triggers")
+
+    def baseline(tenant_id):
+        query = "SELECT id FROM security_alerts WHERE description LIKE '%exfiltration%' AND description LIKE '%attempt%'"
+        with database.get_db() as conn:
+            if tenant_id:
+                return conn.execute(query + ' AND tenant_id = ?', (tenant_id,)).fetchall()
+            return conn.execute(query).fetchall()
+
+    for tenant_id, label in ((None, 'all tenants'), (1, 'one tenant')):
+        baseline_ms, expected = timed(lambda: baseline(tenant_id), repeat=5)
+        optimized_ms, result = timed(lambda: database.search('alerts', 'exfiltration attempt', tenant_id=tenant_id,
+                                                             limit=1000))
+        assert sorted(r[0] for r in expected) == sorted(r['id'] for r in result), 'result mismatch'
+        report(f"search 'exfiltration attempt', {label}", baseline_ms, optimized_ms)
+
+# =====================================
+# LIST SERIALIZATION
+# =====================================
+
+def bench_serialization(n_users=100000):
+    """User listing: Row -> dict -> json.dumps vs JSON built inside SQLite"""
+    import json
+    import tracemalloc
+    from bulk_io import json_page_chunks
+
+    print(f"\n📊 List serialization: {n_users} users")
+    scratch_database('serialization')
+    with database.get_db() as conn:
+        conn.execute("INSERT INTO tenants (code, name, name_ar) VALUES ('bench', 'Bench', 'Bench')")
+        conn.executemany('''
+            INSERT INTO users (tenant_id, national_id, name, name_ar, email, role_id) VALUES (1, ?, ?, ?, ?, 1)
+        ''', [(str(1000000000 + i), f'User {i}', f'مستخدم {i}', f'user{i}@example.sa') for i in range(n_users)])
+        conn.commit()
+
+    def baseline():
+        with database.read_db() as conn:
+            rows = conn.execute('''
+                SELECT u.*, r.name AS role_name, r.name_ar AS role_name_ar, t.code AS tenant_code, t.name_ar AS tenant_name
+                FROM users u
+                LEFT JOIN roles r ON u.role_id = r.id
+                LEFT JOIN tenants t ON u.tenant_id = t.id
+                ORDER BY u.created_at DESC, u.id DESC
+            ''').fetchall()
+        return json.dumps({'success': True, 'count': len(rows), 'users': [dict(row) for row in rows]})
+
+    def optimized(json_rows):
+        page = database.get_all_users(json_rows=json_rows)
+        return json_page_chunks('users', page.rows, len(page), {}, page.fields if page.arrays else None)
+
+    def peak_mb(fn):
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak / 1e6
+
+    baseline_ms, expected = timed(baseline, repeat=5)
+    baseline_mb = peak_mb(baseline)
+    for json_rows in ('object', 'array'):
+        # The endpoint streams the chunks; joining them here only checks the result
+        optimized_ms, chunks = timed(lambda: list(optimized(json_rows)), repeat=5)
+        result = json.loads(''.join(chunks))
+        assert result['count'] == n_users, 'result mismatch'
+        if json_rows == 'object':
+            assert result == json.loads(expected), 'result mismatch'
+        report(f"list {n_users} users as JSON {json_rows}s", baseline_ms, optimized_ms)
+        print(f"  {'':<40} peak {baseline_mb:8.1f} MB -> {peak_mb(lambda: sum(map(len, optimized(json_rows)))):6.1f} MB")
+
+# =====================================
+# SESSION CACHE
+# =====================================
+
+def bench_session_cache(n_sessions=10000, lookups=20000):
+    """require_auth session lookup: SQLite query vs in-process session cache"""
+    print(f"\n📊 Session lookup: {lookups} lookups over {n_sessions} sessions")
+    scratch_database('sessions')
+    database.seed_data()
+    tokens = [f'bench-token-{i}' for i in range(n_sessions)]
+    for i, token in enumerate(tokens):
+        database.create_session(i % 7 + 1, token, '127.0.0.1', 'bench', 'Riyadh', tenant_id=1)
+    rng = random.Random(42)
+    sample = [rng.choice(tokens) for _ in range(lookups)]
+
+    def baseline():
+        with database.read_db() as conn:
+            for token in sample:
+                dict(conn.execute('SELECT * FROM sessions WHERE token = ? AND is_active = 1', (token,)).fetchone())
+
+    def optimized():
+        for token in sample:
+            database.get_session_by_token(token)
+
+    baseline_ms, _ = timed(baseline, repeat=5)
+    optimized_ms, _ = timed(optimized, repeat=5)
+    report(f"{lookups} get_session_by_token()", baseline_ms, optimized_ms)
+    print(f"  cache: {database.get_session_cache_stats()}")
+
+# =====================================
+# CONFIG CACHE
+# =====================================
+
+def bench_config_cache(lookups=10000):
+    """/api/auth/me-style lookups: roles join + json.loads vs versioned config cache"""
+    import json
+
+    print(f"\n📊 Config lookups: {lookups} x (user + tenant roles + tenant settings)")
+    scratch_database('config')
+    database.seed_data()
+
+    def baseline():
+        with database.read_db() as conn:
+            for i in range(lookups):
+                user = dict(conn.execute('''
+                    SELECT u.*, r.name as role_name, r.name_ar as role_name_ar, r.permissions,
+                           t.code as tenant_code, t.name_ar as tenant_name
+                    FROM users u
+                    LEFT JOIN roles r ON u.role_id = r.id
+                    LEFT JOIN tenants t ON u.tenant_id = t.id
+                    WHERE u.id = ?
+                ''', (i % 7 + 1,)).fetchone())
+                json.loads(user['permissions'])
+                roles = [dict(row) for row in conn.execute('SELECT * FROM roles WHERE tenant_id = ?', (user['tenant_id'],))]
+                for role in roles:
+                    role['permissions'] = json.loads(role['permissions'])
+                dict(conn.execute('SELECT * FROM tenant_settings WHERE tenant_id = ?', (user['tenant_id'],)).fetchone())
+
+    def optimized():
+        for i in range(lookups):
+            user = database.get_user_by_id(i % 7 + 1)
+            database.get_roles_by_tenant(user['tenant_id'])
+            database.get_tenant_settings(user['tenant_id'])
+
+    baseline_ms, _ = timed(baseline, repeat=5)
+    optimized_ms, _ = timed(optimized, repeat=5)
+    report(f"{lookups} config lookups", baseline_ms, optimized_ms)
+    print(f"  cache: {database.get_config_cache_stats()}")
+
+# =====================================
+# OTP STORE
+# =====================================
+
+def bench_otp_store(n_logins=300000, ttl_seconds=0.2):
+    """Abandoned logins: plain pending_otps dict vs expiry-evicting OTP store (memory), plus SQLite backend rates"""
+    import tracemalloc
+    import otp_store
+
+    print(f"\n📊 OTP store: {n_logins} abandoned logins, TTL {ttl_seconds}s")
+
+    def traced_peak(fn):
+        tracemalloc.start()
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return elapsed, peak / 1e6
+
+    def baseline():
+        pending = {}
+        for i in range(n_logins):
+            pending[f'1{i:09d}'] = {'otp': '42', 'user_id': i, 'tenant_id': 1,
+                                    'expires': datetime.utcnow() + timedelta(seconds=ttl_seconds), 'attempts': 0}
+
+    store = otp_store.MemoryOTPStore(ttl_seconds=ttl_seconds)
+
+    def optimized():
+        for i in range(n_logins):
+            store.put(f'1{i:09d}', '42', i, 1)
+
+    baseline_ms, baseline_mb = traced_peak(baseline)
+    optimized_ms, optimized_mb = traced_peak(optimized)
+    print(f"  {'pending_otps dict':<40} {baseline_ms:10.2f} ms  peak {baseline_mb:7.1f} MB")
+    print(f"  {'MemoryOTPStore':<40} {optimized_ms:10.2f} ms  peak {optimized_mb:7.1f} MB  ({len(store)} pending)")
+
+    sqlite_store = otp_store.SQLiteOTPStore(os.path.join(tempfile.mkdtemp(), 'bench.db.otp'), ttl_seconds=60)
+    n_sqlite = 5000
+    put_ms, _ = timed(lambda: [sqlite_store.put(f'2{i:09d}', '42', i, 1) for i in range(n_sqlite)], repeat=3)
+    verify_ms, _ = timed(lambda: [sqlite_store.verify(f'2{i:09d}', '00') for i in range(n_sqlite)], repeat=3)
+    print(f"  SQLiteOTPStore: {n_sqlite / put_ms * 1000:,.0f} puts/s, {n_sqlite / verify_ms * 1000:,.0f} verifies/s")
+
+# =====================================
+# TOKEN CACHE
+# =====================================
+
+def bench_token_cache(n_tokens=100, requests_per_token=100):
+    """require_auth overhead per request: jwt.decode every time vs verified-token cache"""
+    import auth
+    from flask import Flask
+
+    print(f"\n📊 Token cache: {n_tokens} sessions x {requests_per_token} authenticated requests")
+    scratch_database('tokens')
+    database.seed_data()
+    tokens = []
+    for i in range(n_tokens):
+        token = auth.generate_jwt_token(i % 7 + 1, f'bench-{i}', 'user')
+        database.create_session(i % 7 + 1, token, '127.0.0.1', 'bench', 'Riyadh', tenant_id=1)
+        tokens.append(token)
+
+    app = Flask('bench')
+    endpoint = auth.require_auth(lambda: 'ok')
+    contexts = [app.test_request_context(headers={'Authorization': f'Bearer {token}'}) for token in tokens]
+
+    def run():
+        for _ in range(requests_per_token):
+            for ctx in contexts:
+                with ctx:
+                    assert endpoint() == 'ok'
+
+    enabled = auth.TOKEN_CACHE_ENABLED
+    try:
+        auth.TOKEN_CACHE_ENABLED = False
+        baseline_ms, _ = timed(run, repeat=5)
+        auth.TOKEN_CACHE_ENABLED = True
+        auth._token_cache.clear()
+        optimized_ms, _ = timed(run, repeat=5)
+    finally:
+        auth.TOKEN_CACHE_ENABLED = enabled
+    n_requests = n_tokens * requests_per_token
+    report(f"{n_requests} require_auth calls", baseline_ms, optimized_ms)
+    print(f"  per request: {baseline_ms * 1000 / n_requests:.1f} us -> {optimized_ms * 1000 / n_requests:.1f} us")
+    print(f"  cache: {auth.get_token_cache_stats()}")
+
+# =====================================
+# AUTH CONTEXT
+# =====================================
+
+def bench_auth_context(n_sessions=1000, lookups=20000):
+    """/api/auth/me identity: session lookup + get_user_by_id query vs one cached auth context"""
+    print(f"\n📊 Auth context: {lookups} authenticated requests over {n_sessions} sessions")
+    scratch_database('auth_context')
+    database.seed_data()
+    tokens = [f'bench-token-{i}' for i in range(n_sessions)]
+    for i, token in enumerate(tokens):
+        database.create_session(i % 7 + 1, token, '127.0.0.1', 'bench', 'Riyadh', tenant_id=1)
+    rng = random.Random(42)
+    sample = [rng.choice(tokens) for _ in range(lookups)]
+
+    def baseline():
+        for token in sample:
+            session = database.get_session_by_token(token)
+            database.get_user_by_id(session['user_id'])
+
+    def optimized():
+        for token in sample:
+            database.get_auth_context(token)
+
+    baseline_ms, _ = timed(baseline, repeat=5)
+    optimized_ms, _ = timed(optimized, repeat=5)
+    report(f"{lookups} session + user loads", baseline_ms, optimized_ms)
+
+# =====================================
+# LOGIN UNIT OF WORK
+# =====================================
+
+def bench_login_throughput(logins=2000, threads=8, synchronous=('NORMAL', 'FULL')):
+    """/api/auth/verify success path: one connection + commit per step vs one login transaction"""
+    import auth
+    import uba_service
+    from otp_store import get_otp_store
+
+    store = get_otp_store()
+
+    def baseline_login(national_id, user_id, tenant_id):
+        store.put(national_id, '42', user_id, tenant_id)
+        store.verify(national_id, '42')
+        user = database.get_user_by_national_id(national_id)
+        token = auth.generate_jwt_token(user['id'], national_id, user['role_name'])
+        session_id = database.create_session(user['id'], token, '127.0.0.1', 'bench', 'riyadh', 0, False,
+                                             user.get('tenant_id'))
+        database.log_activity(user['id'], session_id, 'login',
+                              {'method': 'nafath', 'location': 'riyadh', 'device': 'bench'}, tenant_id=user.get('tenant_id'))
+        user = database.get_user_by_national_id(national_id)
+        database.update_user_last_login(user['id'])
+        uba_service.analyze_login(user['id'], session_id, 10, 'riyadh', 0, False, tenant_id=user['tenant_id'])
+
+    def optimized_login(national_id, user_id, tenant_id):
+        store.put(national_id, '42', user_id, tenant_id)
+        assert auth.verify_nafath_otp(national_id, '42', 'bench', '127.0.0.1', 'riyadh')['success']
+
+    def run(login, users):
+        start = time.perf_counter()
+        for i in range(logins):
+            login(*users[i % len(users)])
+        sequential = logins / (time.perf_counter() - start)
+
+        def worker(offset):
+            for i in range(offset, logins, threads):
+                login(*users[i % len(users)])
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        return sequential, logins / (time.perf_counter() - start)
+
+    pragmas = database.CONNECTION_PRAGMAS
+    try:
+        for level in synchronous:
+            print(f"\n📊 Login throughput: {logins} logins, sequential and {threads} threads, synchronous = {level}")
+            database.CONNECTION_PRAGMAS = tuple(f'PRAGMA synchronous = {level}' if p.startswith('PRAGMA synchronous') else p
+                                                for p in pragmas)
+            results = {}
+            for mode, login in (('baseline', baseline_login), ('unit_of_work', optimized_login)):
+                scratch_database(f'logins_{level}_{mode}')
+                database.seed_data()
+                with database.read_db() as conn:
+                    users = [tuple(row) for row in conn.execute('SELECT national_id, id, tenant_id FROM users WHERE is_active = 1')]
+                results[mode] = run(login, users)
+                print(f"  {mode:<14} {results[mode][0]:8.0f} logins/s sequential  "
+                      f"{results[mode][1]:8.0f} logins/s with {threads} threads")
+            for label, index in (('sequential', 0), (f'{threads} threads', 1)):
+                report(f"1000 logins ({label})", 1e6 / results['baseline'][index], 1e6 / results['unit_of_work'][index])
+    finally:
+        database.close_pool()
+        database.CONNECTION_PRAGMAS = pragmas
+
+# =====================================
+# LOGIN THROTTLING
+# =====================================
+
+def bench_throttle(requests=20000, distinct_ips=300000):
+    """Brute-force requests: initiate_nafath_auth (user lookup + OTP) vs throttle rejection; memory under many IPs"""
+    import tracemalloc
+    import auth
+    from throttle import LoginThrottle
+
+    print(f"\n📊 Throttle: {requests} login attempts for a locked national ID")
+    scratch_database('throttle')
+    database.seed_data()
+    throttle = LoginThrottle()
+    national_id = '1055443322'
+    for _ in range(10):
+        throttle.record_failure(national_id, '10.0.0.1')
+
+    def baseline():
+        for _ in range(requests):
+            auth.initiate_nafath_auth(national_id)
+
+    def optimized():
+        for i in range(requests):
+            assert throttle.check_login(national_id, '10.0.0.2')
+
+    baseline_ms, _ = timed(baseline, repeat=3)
+    optimized_ms, _ = timed(optimized, repeat=3)
+    report(f"{requests} abusive /api/auth/login", baseline_ms, optimized_ms)
+    print(f"  rejection: {optimized_ms * 1000 / requests:.2f} us per request")
+
+    throttle = LoginThrottle(max_keys=100000)
+    tracemalloc.start()
+    start = time.perf_counter()
+    for i in range(distinct_ips):
+        throttle.check_verify(national_id, f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}-{i >> 24}')
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    stats = throttle.stats()
+    print(f"  {distinct_ips} distinct IPs: {elapsed * 1000:.0f} ms, peak {peak / 1e6:.1f} MB, "
+          f"tracked {stats['tracked_keys']['ip_requests']}, evictions {stats['evictions']}")
+
+BENCHMARKS = {
+    'tenants': bench_tenant_listing,
+    'single_writer': bench_single_writer,
+    'feature_store': bench_feature_store,
+    'detail_columns': bench_detail_columns,
+    'search': bench_search,
+    'serialization': bench_serialization,
+    'session_cache': bench_session_cache,
+    'config_cache': bench_config_cache,
+    'otp_store': bench_otp_store,
+    'token_cache': bench_token_cache,
+    'auth_context': bench_auth_context,
+    'login_throughput': bench_login_throughput,
+    'throttle': bench_throttle,
+}
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
+    database.close_pool()
@@ -0,0 +1,99 @@
+"""
+Bulk I/O
+========
+Streaming CSV / NDJSON readers for bulk uploads and writers for exports.
+
+Uploads are parsed one row at a time straight from the request stream,
+and exports are written one batch at a time, so neither is ever held in
+memory as a whole. List responses built from SQLite-serialized rows
+(database.JsonPage) are written out without decoding them.
+"""
+
+import io
+import csv
+import json
+
+FORMATS = ('csv', 'ndjson')
+
+def detect_format(content_type, requested=None):
+    """Pick 'csv' or 'ndjson' from an explicit ?format= or the Content-Type"""
+    if requested:
+        return requested.lower() if requested.lower() in FORMATS else None
+    content_type = (content_type or '').lower()
+    if 'csv' in content_type:
+        return 'csv'
+    if 'ndjson' in content_type or 'jsonl' in content_type or 'json' in content_type:
+        return 'ndjson'
+    return None
+
+def read_rows(stream, fmt):
+    """
+    Iterate (row_number, row) from a binary stream.
+
+    A row that cannot be parsed is yielded as (row_number, ValueError) so
+    the caller can report it and carry on with the rest of the upload.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            if None in row:
+                yield number, ValueError('Too many fields')
+            else:
+                yield number, {k.strip(): v.strip() if isinstance(v, str) else v for k, v in row.items()}
+        return
+
+    number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, ValueError('Invalid JSON')
+            continue
+        yield number, row if isinstance(row, dict) else ValueError('Row must be a JSON object')
+
+# =====================================
+# STREAMING WRITERS
+# =====================================
+
+def ndjson_chunks(batches, columns):
+    """One NDJSON chunk per batch of rows"""
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n' for row in rows)
+
+def csv_chunks(batches, columns):
+    """A header chunk, then one CSV chunk per batch of rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+def json_page_chunks(key, rows, count, meta, fields=None, batch_size=1000):
+    """
+    A list response written straight from pre-serialized JSON rows.
+
+    Produces {"success": true, "count": N, ["fields": [...],] key: [rows], **meta}
+    without ever parsing the rows back into Python objects.
+
+    Args:
+        key: Name of the rows array ('users', 'logs', ...)
+        rows: JSON texts, one per row
+        count: Number of rows
+        meta: Extra top-level members (e.g. pagination cursors)
+        fields: Column header for array rows
+    """
+    head = {'success': True, 'count': count}
+    if fields is not None:
+        head['fields'] = fields
+    yield json.dumps(head, ensure_ascii=False)[:-1] + f', {json.dumps(key)}: ['
+    for start in range(0, len(rows), batch_size):
+        yield (',' if start else '') + ','.join(rows[start:start + batch_size])
+    tail = json.dumps(meta, ensure_ascii=False)[1:]
+    yield '], ' + tail if meta else ']}'
@@ -0,0 +1,157 @@
+"""
+Configuration Cache
+===================
+In-process cache of rarely changing configuration: roles (with decoded
+permissions) and tenant settings.
+
+Every entry belongs to a version scope - a tenant id, or GLOBAL for
+cross-tenant data such as the full role list. A write bumps the versions
+of the scopes it touches and drops their entries; a read returns the
+cached value while its scope's version is unchanged and reloads it
+otherwise.
+
+Versions are also shared between worker processes through the
+config_versions table: triggers on roles and tenant_settings bump a
+scope's row in the same transaction as the write, and each cache
+compares those rows with the ones it last saw at most every
+check_interval seconds, bumping the scopes that moved.
+
+Values are frozen on the way in (dicts become FrozenDict, lists become
+tuples) so callers share one decoded copy and cannot mutate it.
+"""
+
+import time
+import threading
+
+GLOBAL = None    # Scope of cross-tenant entries
+GLOBAL_ROW = 0   # config_versions.scope of GLOBAL (tenant ids start at 1)
+
+# Tables whose writes bump config_versions; roles also bump GLOBAL (role list, role map)
+VERSIONED_TABLES = {'tenant_settings': False, 'roles': True}
+
+CONFIG_VERSIONS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS config_versions (
+        scope INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL
+    )
+'''
+
+def _version_bump(scope):
+    return f'''INSERT INTO config_versions (scope, version) VALUES ({scope}, 1)
+        ON CONFLICT(scope) DO UPDATE SET version = version + 1;'''
+
+def install_config_versions(conn):
+    """Create config_versions and the triggers that bump it on every configuration write"""
+    conn.execute(CONFIG_VERSIONS_TABLE)
+    for table, bumps_global in VERSIONED_TABLES.items():
+        for op, row in (('insert', 'NEW'), ('update', 'NEW'), ('delete', 'OLD')):
+            body = _version_bump(f'COALESCE({row}.tenant_id, {GLOBAL_ROW})')
+            if bumps_global:
+                body += ' ' + _version_bump(GLOBAL_ROW)
+            conn.execute(f'DROP TRIGGER IF EXISTS trg_config_{table}_{op}')
+            conn.execute(f'CREATE TRIGGER trg_config_{table}_{op} AFTER {op.upper()} ON {table} BEGIN {body} END')
+
+def read_config_versions(conn):
+    """Shared versions as {scope: version} (GLOBAL_ROW read back as GLOBAL)"""
+    return {scope if scope != GLOBAL_ROW else GLOBAL: version
+            for scope, version in conn.execute('SELECT scope, version FROM config_versions')}
+
+class FrozenDict(dict):
+    """A dict that refuses mutation (still a dict for json / jsonify); .copy() gives a mutable dict"""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('Cached configuration is read-only')
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+def freeze(value):
+    """Deep-freeze dicts and lists"""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+class ConfigCache:
+    """
+    Version-checked cache of frozen configuration values, one version counter per scope.
+
+    Args:
+        load_versions: Callable returning the shared {scope: version} (None: this process only)
+        check_interval: Seconds between shared version checks (0: on every read)
+    """
+
+    def __init__(self, load_versions=None, check_interval=0):
+        self.load_versions = load_versions
+        self.check_interval = check_interval
+        self._versions = {}
+        self._shared = {}      # scope -> shared version last seen
+        self._checked_at = None
+        self._entries = {}     # (kind, key) -> (scope, version, value)
+        self._epoch = 0        # Bumped by clear(); invalidates every scope at once
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'shared_checks': 0, 'shared_invalidations': 0}
+
+    def version(self, scope=GLOBAL):
+        return self._epoch, self._versions.get(scope, 0)
+
+    def get(self, kind, key, scope, loader):
+        """
+        Cached value of (kind, key), loading and freezing loader() on a miss.
+
+        A value loaded while its scope was bumped is returned but not cached.
+        """
+        entry_key = (kind, key)
+        self._check_shared()
+        with self._lock:
+            version = (self._epoch, self._versions.get(scope, 0))
+            entry = self._entries.get(entry_key)
+            if entry is not None and entry[1] == version:
+                self._stats['hits'] += 1
+                return entry[2]
+            self._stats['misses'] += 1
+        value = freeze(loader())
+        with self._lock:
+            if (self._epoch, self._versions.get(scope, 0)) == version:
+                self._entries[entry_key] = (scope, version, value)
+        return value
+
+    def _check_shared(self):
+        """Bump the scopes whose shared version moved since the last check"""
+        if self.load_versions is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            self._stats['shared_checks'] += 1
+        shared = self.load_versions()
+        with self._lock:
+            moved = [scope for scope, version in shared.items() if self._shared.get(scope) != version]
+            self._shared = shared
+            if moved:
+                self._stats['shared_invalidations'] += len(moved)
+                self._bump(moved)
+
+    def bump(self, *scopes):
+        """Invalidate every entry of the given scopes (after a write)"""
+        with self._lock:
+            self._bump(scopes)
+
+    def _bump(self, scopes):
+        for scope in scopes:
+            self._versions[scope] = self._versions.get(scope, 0) + 1
+            self._stats['invalidations'] += 1
+        self._entries = {key: entry for key, entry in self._entries.items() if entry[0] not in scopes}
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._checked_at = None
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'entries': len(self._entries), 'scopes': len(self._versions)}
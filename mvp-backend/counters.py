@@ -0,0 +1,311 @@
+"""
+Dashboard Counters
+==================
+Incrementally maintained dashboard statistics.
+
+Counters live in dashboard_counters keyed by (tenant_id, counter, bucket)
+where tenant_id 0 is the platform-wide scope and bucket is '' for scalar
+counters or an ISO date for daily ones (logins). Triggers on the source
+tables keep them in sync inside the writing transaction, so reading the
+dashboard is a primary-key lookup instead of COUNT(*) scans.
+
+Anomalies whose logs were moved to the cold archive (log_archive.py) are
+carried over into archived_anomaly_count when they leave the hot table,
+so the anomaly totals shown on the dashboard do not drop when archiving
+runs. That counter has no source table and is not reconciled.
+
+Per-tenant rolling 30-day login totals live in tenant_summary. Triggers on
+login_stats add rows that fall inside the current window; the window is
+rolled forward lazily by subtracting the days that dropped out of it.
+"""
+
+PLATFORM_SCOPE = 0
+
+COUNTERS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS dashboard_counters (
+        tenant_id INTEGER NOT NULL,
+        counter TEXT NOT NULL,
+        bucket TEXT NOT NULL DEFAULT '',
+        value INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (tenant_id, counter, bucket)
+    ) WITHOUT ROWID
+'''
+
+# counter -> (table, predicate over the row, per-row amount, bucket expression,
+#             columns whose update can change the counter)
+# Rows are counted for their tenant and for the platform scope.
+COUNTER_SOURCES = {
+    'active_tenants': ('tenants', '{row}.is_active = 1', '1', "''", 'is_active'),
+    'active_users': ('users', '{row}.is_active = 1', '1', "''", 'is_active, tenant_id'),
+    'active_sessions': ('sessions', '{row}.is_active = 1', '1', "''", 'is_active, tenant_id'),
+    'anomaly_count': ('activity_logs', '{row}.is_anomaly = 1', '1', "''", 'is_anomaly, tenant_id'),
+    'pending_alerts': ('security_alerts', '{row}.is_resolved = 0', '1', "''", 'is_resolved, tenant_id'),
+    'logins': ('login_stats', '1', 'COALESCE({row}.successful_logins, 0)', '{row}.date',
+               'successful_logins, tenant_id, date'),
+}
+
+# Carried-over totals of rows moved out of the source tables (see carry_archived_anomalies)
+ARCHIVED_ANOMALY_COUNTER = 'archived_anomaly_count'
+
+def _bump(counter, row, scope, predicate, amount, bucket, sign):
+    """One UPSERT statement adding sign * amount to a counter"""
+    scope_expr = str(PLATFORM_SCOPE) if scope == 'platform' else f'{row}.tenant_id'
+    amount = amount.format(row=row)
+    return f'''
+        INSERT INTO dashboard_counters (tenant_id, counter, bucket, value)
+        SELECT {scope_expr}, '{counter}', {bucket.format(row=row)}, {sign}{amount}
+        WHERE {predicate.format(row=row)} AND {scope_expr} IS NOT NULL
+        ON CONFLICT (tenant_id, counter, bucket) DO UPDATE SET value = value + excluded.value;
+    '''
+
+def _trigger_sql(counter, table, predicate, amount, bucket, columns):
+    # The tenants table is its own tenant scope: only the platform total applies
+    scopes = ('platform',) if table == 'tenants' else ('tenant', 'platform')
+
+    def body(row, sign):
+        return ''.join(_bump(counter, row, scope, predicate, amount, bucket, sign) for scope in scopes)
+
+    return [
+        f'DROP TRIGGER IF EXISTS trg_{counter}_insert',
+        f'DROP TRIGGER IF EXISTS trg_{counter}_update',
+        f'DROP TRIGGER IF EXISTS trg_{counter}_delete',
+        f'CREATE TRIGGER trg_{counter}_insert AFTER INSERT ON {table} BEGIN {body("NEW", "+")} END',
+        f'CREATE TRIGGER trg_{counter}_update AFTER UPDATE OF {columns} ON {table} BEGIN {body("OLD", "-")} {body("NEW", "+")} END',
+        f'CREATE TRIGGER trg_{counter}_delete AFTER DELETE ON {table} BEGIN {body("OLD", "-")} END',
+    ]
+
+def install_counters(conn):
+    """Create the counters table and its maintenance triggers, then fill it"""
+    conn.execute(COUNTERS_TABLE)
+    for counter, source in COUNTER_SOURCES.items():
+        for statement in _trigger_sql(counter, *source):
+            conn.execute(statement)
+    reconcile_counters(conn)
+
+def compute_counters(conn):
+    """Recompute every counter from the source tables"""
+    expected = {}
+    for counter, (table, predicate, amount, bucket, _) in COUNTER_SOURCES.items():
+        tenant_column = 'NULL' if table == 'tenants' else 'tenant_id'
+        rows = conn.execute(f'''
+            SELECT {tenant_column}, {bucket.format(row=table)}, SUM({amount.format(row=table)})
+            FROM {table}
+            WHERE {predicate.format(row=table)}
+            GROUP BY 1, 2
+        ''').fetchall()
+        for tenant_id, bucket_value, total in rows:
+            if not total:
+                continue
+            for scope in (tenant_id, PLATFORM_SCOPE):
+                if scope is None:
+                    continue
+                key = (scope, counter, bucket_value)
+                expected[key] = expected.get(key, 0) + total
+    return expected
+
+def reconcile_counters(conn, fix=True):
+    """
+    Compare stored counters with a full recomputation.
+
+    Args:
+        conn: Database connection
+        fix: Rewrite drifted counters with the recomputed values
+
+    Returns:
+        List of dicts describing each drifted counter
+    """
+    expected = compute_counters(conn)
+    stored = {
+        (row[0], row[1], row[2]): row[3]
+        for row in conn.execute(f'''
+            SELECT tenant_id, counter, bucket, value FROM dashboard_counters
+            WHERE counter IN ({', '.join('?' * len(COUNTER_SOURCES))})
+        ''', tuple(COUNTER_SOURCES))
+    }
+
+    drift = []
+    for key in sorted(set(expected) | set(stored), key=str):
+        want = expected.get(key, 0)
+        have = stored.get(key, 0)
+        if want != have:
+            tenant_id, counter, bucket = key
+            drift.append({
+                'tenant_id': tenant_id,
+                'counter': counter,
+                'bucket': bucket,
+                'stored': have,
+                'actual': want,
+            })
+
+    if fix and drift:
+        conn.executemany('''
+            INSERT INTO dashboard_counters (tenant_id, counter, bucket, value) VALUES (?, ?, ?, ?)
+            ON CONFLICT (tenant_id, counter, bucket) DO UPDATE SET value = excluded.value
+        ''', [(d['tenant_id'], d['counter'], d['bucket'], d['actual']) for d in drift])
+        conn.execute('DELETE FROM dashboard_counters WHERE value = 0')
+    return drift
+
+def read_counters(conn, tenant_id=PLATFORM_SCOPE, since_date=None):
+    """
+    Read all counters for one scope; daily counters are summed from since_date.
+
+    Returns:
+        Dict of counter name -> value
+    """
+    rows = conn.execute('''
+        SELECT counter, SUM(value) FROM dashboard_counters
+        WHERE tenant_id = ? AND (bucket = '' OR bucket >= ?)
+        GROUP BY counter
+    ''', (tenant_id, since_date or '')).fetchall()
+    values = {counter: 0 for counter in COUNTER_SOURCES}
+    values[ARCHIVED_ANOMALY_COUNTER] = 0
+    values.update({row[0]: row[1] for row in rows})
+    return values
+
+def carry_archived_anomalies(conn, where, params):
+    """
+    Add the anomalies among activity_logs rows about to be archived to
+    archived_anomaly_count (per tenant and platform). Call in the
+    transaction that deletes them; the delete trigger then takes them off
+    anomaly_count.
+
+    Args:
+        where: SQL condition selecting the rows (over activity_logs)
+    """
+    for scope in ('tenant_id', str(PLATFORM_SCOPE)):
+        conn.execute(f'''
+            INSERT INTO dashboard_counters (tenant_id, counter, bucket, value)
+            SELECT {scope}, '{ARCHIVED_ANOMALY_COUNTER}', '', COUNT(*) FROM activity_logs
+            WHERE ({where}) AND is_anomaly = 1 AND tenant_id IS NOT NULL
+            GROUP BY 1
+            ON CONFLICT (tenant_id, counter, bucket) DO UPDATE SET value = value + excluded.value
+        ''', params)
+
+# =====================================
+# TENANT SUMMARIES
+# =====================================
+
+TENANT_SUMMARY_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS tenant_summary (
+        tenant_id INTEGER PRIMARY KEY,
+        monthly_logins INTEGER NOT NULL DEFAULT 0,
+        monthly_failures INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS tenant_summary_window (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        window_start TEXT NOT NULL
+    )
+    ''',
+]
+
+def _summary_delta(row, sign):
+    return f'''
+        INSERT INTO tenant_summary (tenant_id, monthly_logins, monthly_failures)
+        SELECT {row}.tenant_id, {sign}COALESCE({row}.successful_logins, 0), {sign}COALESCE({row}.failed_logins, 0)
+        WHERE {row}.tenant_id IS NOT NULL
+          AND {row}.date >= (SELECT window_start FROM tenant_summary_window WHERE id = 1)
+        ON CONFLICT (tenant_id) DO UPDATE SET
+            monthly_logins = monthly_logins + excluded.monthly_logins,
+            monthly_failures = monthly_failures + excluded.monthly_failures;
+    '''
+
+TENANT_SUMMARY_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS trg_tenant_summary_insert',
+    'DROP TRIGGER IF EXISTS trg_tenant_summary_update',
+    'DROP TRIGGER IF EXISTS trg_tenant_summary_delete',
+    f'CREATE TRIGGER trg_tenant_summary_insert AFTER INSERT ON login_stats BEGIN {_summary_delta("NEW", "+")} END',
+    f'''CREATE TRIGGER trg_tenant_summary_update
+       AFTER UPDATE OF successful_logins, failed_logins, tenant_id, date ON login_stats
+       BEGIN {_summary_delta("OLD", "-")} {_summary_delta("NEW", "+")} END''',
+    f'CREATE TRIGGER trg_tenant_summary_delete AFTER DELETE ON login_stats BEGIN {_summary_delta("OLD", "-")} END',
+]
+
+def install_tenant_summaries(conn, window_start='0000-00-00'):
+    """Create tenant_summary and its triggers, then build it for window_start"""
+    for statement in TENANT_SUMMARY_TABLES + TENANT_SUMMARY_TRIGGERS:
+        conn.execute(statement)
+    rebuild_tenant_summaries(conn, window_start)
+
+def compute_tenant_summaries(conn, window_start):
+    """Recompute per-tenant login totals for dates >= window_start"""
+    return {
+        row[0]: (row[1], row[2])
+        for row in conn.execute('''
+            SELECT tenant_id, COALESCE(SUM(successful_logins), 0), COALESCE(SUM(failed_logins), 0)
+            FROM login_stats
+            WHERE tenant_id IS NOT NULL AND date >= ?
+            GROUP BY tenant_id
+        ''', (window_start,))
+    }
+
+def rebuild_tenant_summaries(conn, window_start):
+    """Replace tenant_summary with a full recomputation for window_start"""
+    conn.execute('DELETE FROM tenant_summary')
+    conn.executemany(
+        'INSERT INTO tenant_summary (tenant_id, monthly_logins, monthly_failures) VALUES (?, ?, ?)',
+        [(tenant_id, logins, failures) for tenant_id, (logins, failures) in compute_tenant_summaries(conn, window_start).items()]
+    )
+    conn.execute('''
+        INSERT INTO tenant_summary_window (id, window_start) VALUES (1, ?)
+        ON CONFLICT (id) DO UPDATE SET window_start = excluded.window_start
+    ''', (window_start,))
+
+def roll_tenant_summaries(conn, window_start):
+    """
+    Move the summary window forward to window_start.
+
+    Subtracts only the days that left the window, so the cost is
+    proportional to one day of login_stats, not the whole history.
+    Must run inside a write transaction.
+    """
+    row = conn.execute('SELECT window_start FROM tenant_summary_window WHERE id = 1').fetchone()
+    current = row[0] if row else None
+    if current == window_start:
+        return
+    if current is None or current > window_start:
+        rebuild_tenant_summaries(conn, window_start)
+        return
+    expired = conn.execute('''
+        SELECT tenant_id, COALESCE(SUM(successful_logins), 0), COALESCE(SUM(failed_logins), 0)
+        FROM login_stats
+        WHERE tenant_id IS NOT NULL AND date >= ? AND date < ?
+        GROUP BY tenant_id
+    ''', (current, window_start)).fetchall()
+    conn.executemany('''
+        UPDATE tenant_summary SET monthly_logins = monthly_logins - ?, monthly_failures = monthly_failures - ?
+        WHERE tenant_id = ?
+    ''', [(logins, failures, tenant_id) for tenant_id, logins, failures in expired])
+    conn.execute('UPDATE tenant_summary_window SET window_start = ? WHERE id = 1', (window_start,))
+
+def reconcile_tenant_summaries(conn, fix=True):
+    """Compare tenant_summary with a recomputation for its current window"""
+    row = conn.execute('SELECT window_start FROM tenant_summary_window WHERE id = 1').fetchone()
+    if not row:
+        return []
+    window_start = row[0]
+    expected = compute_tenant_summaries(conn, window_start)
+    stored = {
+        r[0]: (r[1], r[2])
+        for r in conn.execute('SELECT tenant_id, monthly_logins, monthly_failures FROM tenant_summary')
+    }
+
+    drift = []
+    for tenant_id in sorted(set(expected) | set(stored)):
+        want = expected.get(tenant_id, (0, 0))
+        have = stored.get(tenant_id, (0, 0))
+        for counter, want_value, have_value in zip(('monthly_logins', 'monthly_failures'), want, have):
+            if want_value != have_value:
+                drift.append({
+                    'tenant_id': tenant_id,
+                    'counter': counter,
+                    'bucket': window_start,
+                    'stored': have_value,
+                    'actual': want_value,
+                })
+
+    if fix and drift:
+        rebuild_tenant_summaries(conn, window_start)
+    return drift
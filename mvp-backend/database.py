@@ -4,23 +4,351 @@ Extended Database Layer
 Adds tenants, contracts, integrations, and comprehensive stats.
 """
 
+import os
 import sqlite3
 import json
+import base64
+import queue
+import atexit
+import threading
+import time
 from datetime import datetime, timedelta
+from concurrent.futures import Future
 from contextlib import contextmanager
 import random
 
+from migrations import apply_migrations
+from counters import (
+    read_counters, reconcile_counters as _reconcile_counters, PLATFORM_SCOPE, ARCHIVED_ANOMALY_COUNTER,
+    roll_tenant_summaries, reconcile_tenant_summaries
+)
+from write_behind import WriteBehindQueue
+from db_writer import DatabaseWriter
+from log_archive import archive_cold_partitions, query_partitions, stream_partitions, HOT_RETENTION_DAYS
+from activity_details import DETAIL_COLUMN_NAMES, split_details
+from search import FTS5_AVAILABLE, ensure_search, match_query
+from session_cache import SessionCache, read_session_ends, prune_session_ends
+from config_cache import ConfigCache, GLOBAL, read_config_versions
+
 DATABASE_PATH = 'nafath_sso.db'
 
+# Connection pool configuration
+POOL_SIZE = 8                  # Max open connections (Flask threaded=True workers share these)
+POOL_TIMEOUT_SECONDS = 10      # Max wait for a free connection before raising
+HEALTH_CHECK_IDLE_SECONDS = 30 # Idle connections older than this are pinged before reuse
+BUSY_TIMEOUT_MS = 5000
+
+# Single-writer mode: one writer connection owns all writes, reads use
+# a read-only pool (off by default)
+SINGLE_WRITER_ENABLED = False
+SINGLE_WRITER_MAX_BATCH = 256        # Max write jobs committed together
+
+# Write-behind mode for activity logs and alerts (off by default)
+WRITE_BEHIND_ENABLED = False
+WRITE_BEHIND_FLUSH_INTERVAL = 0.05   # seconds
+WRITE_BEHIND_BATCH_SIZE = 500
+WRITE_BEHIND_MAX_QUEUE = 10000
+
+# Bulk user provisioning
+BULK_CHUNK_SIZE = 500                # Rows per insert transaction
+BULK_MAX_ERRORS = 1000               # Per-row errors returned in the report
+
+# Streaming exports
+EXPORT_BATCH_SIZE = 1000             # Rows fetched from the cursor per batch
+
+# Activity log partitioning
+ACTIVITY_LOG_HOT_DAYS = HOT_RETENTION_DAYS   # Older months move to log_archive/
+
+# Session cache (require_auth lookups; see session_cache.py)
+SESSION_CACHE_TTL_SECONDS = 300
+SESSION_CACHE_MAX_BYTES = 16 * 1024 * 1024
+SESSION_CACHE_CHECK_SECONDS = 1.0    # How long a session ended by another worker can still authenticate here
+
+# Config cache (roles, tenant settings; see config_cache.py)
+CONFIG_CACHE_CHECK_SECONDS = 1.0     # How stale another worker's settings / role change can be
+
+# Annual contract price per tier (SAR)
+PLAN_PRICING = {'enterprise': 150000, 'professional': 75000, 'starter': 25000}
+
+# Applied once per connection, when it is opened
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -16000',      # ~16 MB page cache per connection
+    'PRAGMA mmap_size = 268435456',    # 256 MB memory-mapped I/O
+    'PRAGMA temp_store = MEMORY',
+    f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}',
+)
+
+# =====================================
+# CONNECTION POOL
+# =====================================
+
+def _connect(path, uri=False):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False, uri=uri)
+    conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+class ConnectionPool:
+    """
+    Bounded pool of long-lived SQLite connections.
+    
+    Connections are opened lazily up to `size`, configured once with
+    CONNECTION_PRAGMAS and handed out to one thread at a time. A
+    read_only pool opens them with a mode=ro URI.
+    """
+    
+    def __init__(self, path, size=POOL_SIZE, timeout=POOL_TIMEOUT_SECONDS, read_only=False):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.read_only = read_only
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        self._stats = {
+            'acquired': 0,
+            'created': 0,
+            'discarded': 0,
+            'waits': 0,
+            'total_wait_ms': 0.0,
+            'max_wait_ms': 0.0,
+        }
+    
+    def _connect(self):
+        if self.read_only:
+            return _connect(f'file:{os.path.abspath(self.path)}?mode=ro', uri=True)
+        return _connect(self.path)
+    
+    def _is_healthy(self, conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+    
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+            self._stats['discarded'] += 1
+    
+    def acquire(self):
+        """Check a connection out of the pool, opening a new one if allowed"""
+        start = time.perf_counter()
+        while True:
+            try:
+                conn, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                conn = None
+                with self._lock:
+                    if self._created < self.size:
+                        self._created += 1
+                        self._stats['created'] += 1
+                        create = True
+                    else:
+                        create = False
+                if create:
+                    try:
+                        conn = self._connect()
+                    except sqlite3.Error:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                    released_at = time.monotonic()
+                else:
+                    remaining = self.timeout - (time.perf_counter() - start)
+                    if remaining <= 0:
+                        raise sqlite3.OperationalError('Timed out waiting for a database connection')
+                    try:
+                        conn, released_at = self._idle.get(timeout=remaining)
+                    except queue.Empty:
+                        raise sqlite3.OperationalError('Timed out waiting for a database connection')
+            
+            if time.monotonic() - released_at > HEALTH_CHECK_IDLE_SECONDS and not self._is_healthy(conn):
+                self._discard(conn)
+                continue
+            break
+        
+        wait_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._stats['acquired'] += 1
+            if wait_ms >= 1:
+                self._stats['waits'] += 1
+            self._stats['total_wait_ms'] += wait_ms
+            self._stats['max_wait_ms'] = max(self._stats['max_wait_ms'], wait_ms)
+        return conn
+    
+    def release(self, conn):
+        """Return a connection; uncommitted work is rolled back like the old close()"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        if self._closed:
+            self._discard(conn)
+            return
+        self._idle.put((conn, time.monotonic()))
+    
+    def close(self):
+        """Close all idle connections; checked-out ones are closed on release"""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+    
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['open'] = self._created
+        stats['idle'] = self._idle.qsize()
+        stats['in_use'] = stats['open'] - stats['idle']
+        stats['avg_wait_ms'] = round(stats['total_wait_ms'] / max(stats['acquired'], 1), 3)
+        stats['total_wait_ms'] = round(stats['total_wait_ms'], 3)
+        stats['max_wait_ms'] = round(stats['max_wait_ms'], 3)
+        return stats
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Get the connection pool for the current DATABASE_PATH"""
+    global _pool
+    pool = _pool
+    if pool is None or pool.path != DATABASE_PATH:
+        with _pool_lock:
+            if _pool is None or _pool.path != DATABASE_PATH:
+                if _pool is not None:
+                    _pool.close()
+                _pool = ConnectionPool(DATABASE_PATH)
+            pool = _pool
+    return pool
+
+def close_pool():
+    """Close all pooled connections (e.g. on shutdown)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+    _session_cache.clear()
+    _config_cache.clear()
+
+def get_pool_stats():
+    """Get connection pool size and wait-time statistics"""
+    return get_pool().stats()
+
 @contextmanager
 def get_db():
-    """Database connection context manager"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
+    """Database connection context manager (pooled)"""
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+# =====================================
+# SINGLE WRITER
+# =====================================
+
+_writer = None
+_read_pool = None
+
+def start_single_writer(max_batch=SINGLE_WRITER_MAX_BATCH):
+    """
+    Route all writes through one dedicated writer connection and serve
+    reads from a pool of read-only connections.
+    
+    Call after init_database(); the read-only pool needs the schema (and
+    the WAL files) to exist.
+    """
+    global _writer, _read_pool
+    if _writer is not None:
+        return _writer
+    _read_pool = ConnectionPool(DATABASE_PATH, read_only=True)
+    _writer = DatabaseWriter(lambda: _connect(DATABASE_PATH), max_batch=max_batch)
+    _writer.start()
+    return _writer
+
+def stop_single_writer():
+    """Finish queued writes and return to the shared read-write pool"""
+    global _writer, _read_pool
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+    if _read_pool is not None:
+        _read_pool.close()
+        _read_pool = None
+
+atexit.register(stop_single_writer)
+
+def get_writer_stats():
+    """Get writer queue and batch commit metrics"""
+    if _writer is None:
+        return {'running': False}
+    stats = _writer.stats()
+    stats['read_pool'] = _read_pool.stats()
+    return stats
+
+@contextmanager
+def read_db():
+    """Connection for reads: read-only pool in single-writer mode, else get_db()"""
+    if _read_pool is None:
+        with get_db() as conn:
+            yield conn
+        return
+    conn = _read_pool.acquire()
     try:
         yield conn
     finally:
-        conn.close()
+        _read_pool.release(conn)
+
+@contextmanager
+def write_db():
+    """
+    Connection for callers that run their own write transaction: the
+    writer connection (held exclusively) in single-writer mode, else get_db().
+    """
+    if _writer is None:
+        with get_db() as conn:
+            yield conn
+        return
+    with _writer.connection() as conn:
+        yield conn
+
+def submit_write(job):
+    """
+    Run job(conn) as a write and return a Future with its result.
+    
+    In single-writer mode the job is queued for the writer thread and
+    committed together with other queued jobs; otherwise it runs inline
+    on a pooled connection. Jobs must not commit themselves.
+    """
+    if _writer is not None:
+        return _writer.submit(job)
+    future = Future()
+    try:
+        with get_db() as conn:
+            result = job(conn)
+            conn.commit()
+    except Exception as e:
+        future.set_exception(e)
+    else:
+        future.set_result(result)
+    return future
 
 def init_database():
     """Initialize database with all tables"""
@@ -181,6 +509,13 @@ def init_database():
         
         conn.commit()
         print("✓ Database tables created successfully")
+        
+        apply_migrations(conn)
+        
+        # Databases migrated on an SQLite build without FTS5
+        if ensure_search(conn):
+            conn.commit()
+            print("✓ Full-text search indexes installed")
 
 def seed_data():
     """Seed database with comprehensive demo data"""
@@ -202,6 +537,14 @@ def seed_data():
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (code, name, name_ar, emoji, color, tier, start, end))
         
+        # Tables without a natural unique key are only seeded once
+        def is_empty(table):
+            return cursor.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone() is None
+        seed_roles = is_empty('roles')
+        seed_integrations = is_empty('integrations')
+        seed_logs = is_empty('activity_logs')
+        seed_alerts = is_empty('security_alerts')
+        
         # Seed roles (per tenant)
         roles_data = [
             (1, 'diplomat', 'دبلوماسي', ['view_classified', 'send_diplomatic_messages', 'access_embassy_data', 'view_reports', 'manage_contacts', 'approve_requests']),
@@ -213,7 +556,7 @@ def seed_data():
             (3, 'nurse', 'ممرض', ['view_patient_info', 'update_records']),
         ]
         
-        for tenant_id, name, name_ar, permissions in roles_data:
+        for tenant_id, name, name_ar, permissions in (roles_data if seed_roles else []):
             cursor.execute('''
                 INSERT OR IGNORE INTO roles (tenant_id, name, name_ar, permissions)
                 VALUES (?, ?, ?, ?)
@@ -249,7 +592,7 @@ def seed_data():
             ('Slack', 'Slack', 'notification', 'fa-slack', '#3f51b5', False),
         ]
         
-        for tenant_id in range(1, 6):
+        for tenant_id in (range(1, 6) if seed_integrations else []):
             for name, name_ar, type_, icon, color, connected in integration_types:
                 # Enterprise tenants get more integrations connected
                 is_connected = connected if tenant_id <= 2 else (connected and name == 'Nafath SSO')
@@ -283,7 +626,7 @@ def seed_data():
         
         # Seed some activity logs
         actions = ['login', 'view_document', 'edit_document', 'send_message', 'view_report', 'export_data']
-        for user_id in range(1, 8):
+        for user_id in (range(1, 8) if seed_logs else []):
             for _ in range(random.randint(10, 30)):
                 action = random.choice(actions)
                 risk = random.randint(0, 25) if action != 'export_data' else random.randint(20, 50)
@@ -299,7 +642,7 @@ def seed_data():
             ('suspicious_behavior', 'warning', 'Multiple failed login attempts'),
             ('new_device_login', 'info', 'Login from new device'),
         ]
-        for tenant_id in range(1, 4):
+        for tenant_id in (range(1, 4) if seed_alerts else []):
             for _ in range(random.randint(2, 5)):
                 alert_type, severity, desc = random.choice(alert_types)
                 cursor.execute('''
@@ -308,7 +651,169 @@ def seed_data():
                 ''', (tenant_id, alert_type, severity, desc, random.choice([0, 0, 1]), f'-{random.randint(0, 168)} hours'))
         
         conn.commit()
-        print("✓ Demo data seeded successfully")
+    invalidate_config()
+    print("✓ Demo data seeded successfully")
+
+# =====================================
+# KEYSET PAGINATION
+# =====================================
+
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(sort_value, row_id):
+    """Encode a (sort_value, id) position as an opaque cursor string"""
+    raw = json.dumps([sort_value, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a cursor from encode_cursor(); raises ValueError if malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid pagination cursor')
+    if not isinstance(row_id, int):
+        raise ValueError('Invalid pagination cursor')
+    return sort_value, row_id
+
+def _keyset(sort_column, id_column, after=None, before=None):
+    """
+    Build the range condition and ordering for a newest-first keyset page.
+    
+    `after` continues towards older rows, `before` goes back towards newer
+    ones (fetched ascending, so the caller must reverse the rows).
+    
+    Returns:
+        (condition or None, params, order_by, reverse)
+    """
+    if after:
+        return (f'({sort_column}, {id_column}) < (?, ?)', list(decode_cursor(after)),
+                f'{sort_column} DESC, {id_column} DESC', False)
+    if before:
+        return (f'({sort_column}, {id_column}) > (?, ?)', list(decode_cursor(before)),
+                f'{sort_column} ASC, {id_column} ASC', True)
+    return None, [], f'{sort_column} DESC, {id_column} DESC', False
+
+def page_limit(limit):
+    """Requested page size clamped to 1..MAX_PAGE_SIZE (use it for the query and page_cursors alike)"""
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+def page_cursors(rows, limit, sort_key, after=None, before=None):
+    """
+    Get (next_cursor, prev_cursor) for a page returned by a keyset query.
+    
+    next_cursor is None once the oldest row has been reached, prev_cursor
+    is None on the newest page. rows may be a list of dicts or a JsonPage.
+    """
+    if not len(rows):
+        return (before, None) if before else (None, after)
+    full = len(rows) >= limit
+    if isinstance(rows, JsonPage):
+        first, last = rows.first, rows.last
+    else:
+        first, last = (rows[0][sort_key], rows[0]['id']), (rows[-1][sort_key], rows[-1]['id'])
+    next_cursor = encode_cursor(*last) if (full or before) else None
+    prev_cursor = encode_cursor(*first) if (after or (before and full)) else None
+    return next_cursor, prev_cursor
+
+def _fetch_page(cursor, reverse, fields=None, json_rows=None):
+    if json_rows:
+        cursor.row_factory = None
+        return _json_page(cursor.fetchall(), reverse, fields, json_rows)
+    rows = [dict(row) for row in cursor.fetchall()]
+    if reverse:
+        rows.reverse()
+    return rows
+
+# =====================================
+# LIST PROJECTIONS & JSON ROW PAGES
+# =====================================
+
+# Response fields of each list query: field -> SQL expression
+SESSION_FIELDS = {name: name for name in (
+    'id', 'user_id', 'tenant_id', 'token', 'login_time', 'logout_time', 'ip_address', 'device_info',
+    'location', 'location_id', 'is_new_device', 'is_active')}
+
+USER_FIELDS = {
+    **{name: f'u.{name}' for name in ('id', 'tenant_id', 'national_id', 'name', 'name_ar', 'email', 'role_id',
+                                      'is_active', 'last_login', 'created_at', 'updated_at')},
+    'role_name': 'r.name',
+    'role_name_ar': 'r.name_ar',
+}
+
+ALL_USER_FIELDS = {**USER_FIELDS, 'tenant_code': 't.code', 'tenant_name': 't.name_ar'}
+
+LOG_FIELDS = {
+    **{name: f'al.{name}' for name in ('id', 'user_id', 'tenant_id', 'session_id', 'action', 'details',
+                                       'risk_score', 'is_anomaly', 'timestamp') + DETAIL_COLUMN_NAMES},
+    'name': 'u.name',
+    'national_id': 'u.national_id',
+}
+
+ALERT_FIELDS = {
+    **{name: f'sa.{name}' for name in ('id', 'user_id', 'tenant_id', 'session_id', 'alert_type', 'severity',
+                                       'description', 'is_resolved', 'created_at', 'resolved_at')},
+    'name': 'u.name',
+    'national_id': 'u.national_id',
+    'tenant_name': 't.name_ar',
+}
+
+class JsonPage:
+    """
+    A page whose rows SQLite already serialized (one JSON text per row).
+    
+    rows are JSON objects, or JSON arrays in `fields` order when `arrays`
+    (json_rows='array'). first / last are the (sort value, id) of the
+    first and last row, for page_cursors().
+    """
+    __slots__ = ('fields', 'rows', 'first', 'last', 'arrays')
+
+    def __init__(self, fields, rows, first, last, arrays=False):
+        self.fields = fields
+        self.rows = rows
+        self.first = first
+        self.last = last
+        self.arrays = arrays
+
+    def __len__(self):
+        return len(self.rows)
+
+def _select(projection, fields, sort_column, id_column, json_rows=None):
+    """
+    SELECT list for a list query.
+    
+    Args:
+        projection: Field -> SQL expression map (e.g. USER_FIELDS)
+        fields: Subset of fields to return (all when None)
+        json_rows: None for dict rows; 'object' or 'array' to have SQLite
+                   build each row's JSON (json_object / json_array)
+    
+    Returns:
+        (select_sql, field names)
+    
+    Raises:
+        ValueError: Unknown field
+    """
+    names = list(fields) if fields else list(projection)
+    for name in names:
+        if name not in projection:
+            raise ValueError(f'Unknown field {name}')
+    if not json_rows:
+        return ', '.join(f'{projection[name]} AS {name}' for name in names), names
+    if json_rows == 'array':
+        body = 'json_array(' + ', '.join(projection[name] for name in names) + ')'
+    else:
+        body = 'json_object(' + ', '.join(f"'{name}', {projection[name]}" for name in names) + ')'
+    return f'{sort_column} AS _sort, {id_column} AS _id, {body} AS _json', names
+
+def _json_page(rows, reverse, fields, json_rows):
+    """JsonPage from (_sort, _id, _json) rows"""
+    if reverse:
+        rows = rows[::-1]
+    arrays = json_rows == 'array'
+    if not rows:
+        return JsonPage(fields, [], None, None, arrays)
+    return JsonPage(fields, [row[2] for row in rows], (rows[0][0], rows[0][1]), (rows[-1][0], rows[-1][1]), arrays)
 
 # =====================================
 # TENANT OPERATIONS
@@ -316,28 +821,70 @@ def seed_data():
 
 def get_all_tenants():
     """Get all tenants with stats"""
-    with get_db() as conn:
+    return get_tenants_with_revenue()[0]
+
+_summary_window = None
+
+def _monthly_window_start():
+    return (datetime.utcnow().date() - timedelta(days=30)).isoformat()
+
+def _ensure_summary_window():
+    """Roll tenant_summary forward once per day (cheap no-op otherwise)"""
+    global _summary_window
+    window_start = _monthly_window_start()
+    if _summary_window == (DATABASE_PATH, window_start):
+        return
+    with write_db() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            roll_tenant_summaries(conn, window_start)
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+    _summary_window = (DATABASE_PATH, window_start)
+
+def get_tenants_with_revenue():
+    """
+    Get all active tenants with stats plus total platform revenue.
+    
+    Stats are joined from the write-maintained dashboard counters and
+    tenant_summary tables, and revenue is derived from the same rows,
+    so this is a single query of O(tenants) primary-key lookups.
+    
+    Returns:
+        (tenants, total_revenue)
+    """
+    _ensure_summary_window()
+    with read_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT t.*,
-                   (SELECT COUNT(*) FROM users WHERE tenant_id = t.id AND is_active = 1) as user_count,
-                   (SELECT SUM(successful_logins) FROM login_stats WHERE tenant_id = t.id AND date >= date('now', '-30 days')) as monthly_logins,
-                   (SELECT SUM(failed_logins) FROM login_stats WHERE tenant_id = t.id AND date >= date('now', '-30 days')) as monthly_failures
+                   COALESCE(c.value, 0) as user_count,
+                   s.monthly_logins,
+                   s.monthly_failures
             FROM tenants t
+            LEFT JOIN dashboard_counters c
+                   ON c.tenant_id = t.id AND c.counter = 'active_users' AND c.bucket = ''
+            LEFT JOIN tenant_summary s ON s.tenant_id = t.id
             WHERE t.is_active = 1
             ORDER BY t.id
         ''')
-        return [dict(row) for row in cursor.fetchall()]
+        tenants = [dict(row) for row in cursor.fetchall()]
+    revenue = sum(PLAN_PRICING.get(t['contract_tier'], 0) for t in tenants)
+    return tenants, revenue
 
 def get_tenant_by_id(tenant_id):
     """Get tenant by ID with full details"""
-    with get_db() as conn:
+    with read_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT t.*,
-                   (SELECT COUNT(*) FROM users WHERE tenant_id = t.id AND is_active = 1) as user_count,
+                   COALESCE(c.value, 0) as user_count,
                    (SELECT COUNT(*) FROM roles WHERE tenant_id = t.id) as role_count
             FROM tenants t
+            LEFT JOIN dashboard_counters c
+                   ON c.tenant_id = t.id AND c.counter = 'active_users' AND c.bucket = ''
             WHERE t.id = ?
         ''', (tenant_id,))
         row = cursor.fetchone()
@@ -345,7 +892,7 @@ def get_tenant_by_id(tenant_id):
 
 def get_tenant_by_code(code):
     """Get tenant by code"""
-    with get_db() as conn:
+    with read_db() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM tenants WHERE code = ?', (code,))
         row = cursor.fetchone()
@@ -355,210 +902,881 @@ def get_tenant_by_code(code):
 # USER OPERATIONS
 # =====================================
 
+def _with_role(row):
+    """User row plus role_name, role_name_ar and decoded permissions from the config cache"""
+    if not row:
+        return None
+    user = dict(row)
+    role = _roles_by_id().get(user.get('role_id'))
+    user['role_name'] = role['name'] if role else None
+    user['role_name_ar'] = role['name_ar'] if role else None
+    user['permissions'] = role['permissions'] if role else ()
+    return user
+
 def get_user_by_national_id(national_id):
-    """Get user by national ID"""
-    with get_db() as conn:
+    """Get user by national ID (permissions are a decoded tuple)"""
+    with read_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT u.*, r.name as role_name, r.name_ar as role_name_ar, r.permissions,
-                   t.code as tenant_code, t.name_ar as tenant_name
+            SELECT u.*, t.code as tenant_code, t.name_ar as tenant_name
             FROM users u
-            LEFT JOIN roles r ON u.role_id = r.id
             LEFT JOIN tenants t ON u.tenant_id = t.id
             WHERE u.national_id = ?
         ''', (national_id,))
-        row = cursor.fetchone()
-        return dict(row) if row else None
+        return _with_role(cursor.fetchone())
 
 def get_user_by_id(user_id):
-    """Get user by ID"""
-    with get_db() as conn:
+    """Get user by ID (permissions are a decoded tuple)"""
+    with read_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT u.*, r.name as role_name, r.name_ar as role_name_ar, r.permissions,
-                   t.code as tenant_code, t.name_ar as tenant_name
+            SELECT u.*, t.code as tenant_code, t.name_ar as tenant_name
             FROM users u
-            LEFT JOIN roles r ON u.role_id = r.id
             LEFT JOIN tenants t ON u.tenant_id = t.id
             WHERE u.id = ?
         ''', (user_id,))
-        row = cursor.fetchone()
-        return dict(row) if row else None
+        return _with_role(cursor.fetchone())
 
-def get_users_by_tenant(tenant_id):
-    """Get all users for a tenant"""
-    with get_db() as conn:
+def get_users_by_tenant(tenant_id, limit=None, after=None, before=None, fields=None, json_rows=None):
+    """
+    Get users for a tenant, newest first (paged when limit is given).
+    
+    fields / json_rows select a projection of USER_FIELDS and SQLite-side
+    JSON rows (see _select); with json_rows a JsonPage is returned.
+    """
+    condition, params, order_by, reverse = _keyset('u.created_at', 'u.id', after, before)
+    select, fields = _select(USER_FIELDS, fields, 'u.created_at', 'u.id', json_rows)
+    query = f'''
+        SELECT {select}
+        FROM users u
+        LEFT JOIN roles r ON u.role_id = r.id
+        WHERE u.tenant_id = ?
+    '''
+    params = [tenant_id] + params
+    if condition:
+        query += ' AND ' + condition
+    query += ' ORDER BY ' + order_by
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(page_limit(limit))
+    
+    with read_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT u.*, r.name as role_name, r.name_ar as role_name_ar
-            FROM users u
-            LEFT JOIN roles r ON u.role_id = r.id
-            WHERE u.tenant_id = ?
-            ORDER BY u.created_at DESC
-        ''', (tenant_id,))
-        return [dict(row) for row in cursor.fetchall()]
+        cursor.execute(query, params)
+        return _fetch_page(cursor, reverse, fields, json_rows)
 
-def get_all_users():
-    """Get all users"""
-    with get_db() as conn:
+def get_all_users(limit=None, after=None, before=None, fields=None, json_rows=None):
+    """Get all users, newest first (paged when limit is given; fields / json_rows as in get_users_by_tenant)"""
+    condition, params, order_by, reverse = _keyset('u.created_at', 'u.id', after, before)
+    select, fields = _select(ALL_USER_FIELDS, fields, 'u.created_at', 'u.id', json_rows)
+    query = f'''
+        SELECT {select}
+        FROM users u
+        LEFT JOIN roles r ON u.role_id = r.id
+        LEFT JOIN tenants t ON u.tenant_id = t.id
+    '''
+    if condition:
+        query += ' WHERE ' + condition
+    query += ' ORDER BY ' + order_by
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(page_limit(limit))
+    
+    with read_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT u.*, r.name as role_name, r.name_ar as role_name_ar,
-                   t.code as tenant_code, t.name_ar as tenant_name
-            FROM users u
-            LEFT JOIN roles r ON u.role_id = r.id
-            LEFT JOIN tenants t ON u.tenant_id = t.id
-            ORDER BY u.created_at DESC
-        ''')
-        return [dict(row) for row in cursor.fetchall()]
+        cursor.execute(query, params)
+        return _fetch_page(cursor, reverse, fields, json_rows)
 
 def create_user(tenant_id, national_id, name, name_ar, email, role_id):
     """Create a new user"""
-    with get_db() as conn:
+    def insert(conn):
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO users (tenant_id, national_id, name, name_ar, email, role_id)
             VALUES (?, ?, ?, ?, ?, ?)
         ''', (tenant_id, national_id, name, name_ar, email, role_id))
-        conn.commit()
         return cursor.lastrowid
+    return submit_write(insert).result()
+
+def _load_provisioning_maps(conn):
+    """Tenant code -> id and per-tenant role lookups for bulk validation"""
+    tenants = {row['code']: row['id'] for row in conn.execute('SELECT id, code FROM tenants')}
+    role_tenants = {}
+    role_names = {}
+    for row in conn.execute('SELECT id, tenant_id, name FROM roles ORDER BY id'):
+        role_tenants[row['id']] = row['tenant_id']
+        role_names.setdefault((row['tenant_id'], row['name'].lower()), row['id'])
+    return tenants, role_tenants, role_names
+
+def _validate_user_row(row, default_tenant_id, tenants, tenant_ids, role_tenants, role_names):
+    """Return (params, None) for a valid row or (None, error)"""
+    tenant_id = row.get('tenant_id') or default_tenant_id
+    if not tenant_id and row.get('tenant_code'):
+        tenant_id = tenants.get(row['tenant_code'])
+        if tenant_id is None:
+            return None, f"Unknown tenant_code {row['tenant_code']}"
+    try:
+        tenant_id = int(tenant_id)
+    except (TypeError, ValueError):
+        return None, 'tenant_id or tenant_code is required'
+    if tenant_id not in tenant_ids:
+        return None, f'Unknown tenant_id {tenant_id}'
+    
+    national_id = str(row.get('national_id') or '').strip()
+    if len(national_id) != 10 or not national_id.isdigit():
+        return None, 'national_id must be 10 digits'
+    name = str(row.get('name') or '').strip()
+    if not name:
+        return None, 'name is required'
+    
+    role_id = row.get('role_id')
+    if role_id:
+        try:
+            role_id = int(role_id)
+        except (TypeError, ValueError):
+            return None, 'role_id must be an integer'
+        if role_tenants.get(role_id) != tenant_id:
+            return None, f'Role {role_id} does not belong to tenant {tenant_id}'
+    elif row.get('role'):
+        role_id = role_names.get((tenant_id, str(row['role']).lower()))
+        if role_id is None:
+            return None, f"Unknown role {row['role']} for tenant {tenant_id}"
+    else:
+        return None, 'role_id or role is required'
+    
+    return (tenant_id, national_id, name, row.get('name_ar') or name, row.get('email') or None, role_id), None
+
+def create_users_bulk(rows, default_tenant_id=None, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Provision users from an iterable of (row_number, row) pairs.
+    
+    Rows are validated against tenant and role maps loaded once up front
+    and inserted in chunks of chunk_size, one transaction per chunk. A bad
+    row (validation error, duplicate national ID) is reported and skipped
+    without affecting the rest of the batch. Rows may be ValueError
+    instances for input that failed to parse.
+    
+    Args:
+        rows: Iterable of (row_number, dict) - e.g. from bulk_io.read_rows()
+        default_tenant_id: Tenant for rows that do not name one
+        chunk_size: Rows per insert transaction
+    
+    Returns:
+        Dict with created / failed counts and per-row errors
+    """
+    with read_db() as conn:
+        tenants, role_tenants, role_names = _load_provisioning_maps(conn)
+    tenant_ids = set(tenants.values())
+    
+    report = {'created': 0, 'failed': 0, 'errors': []}
+    def fail(number, national_id, error):
+        report['failed'] += 1
+        if len(report['errors']) < BULK_MAX_ERRORS:
+            report['errors'].append({'row': number, 'national_id': national_id, 'error': error})
+    
+    def insert_chunk(chunk):
+        def insert(conn):
+            ids = [params[1] for _, params in chunk]
+            placeholders = ', '.join('?' * len(ids))
+            existing = {row[0] for row in conn.execute(
+                f'SELECT national_id FROM users WHERE national_id IN ({placeholders})', ids)}
+            fresh = [(number, params) for number, params in chunk if params[1] not in existing]
+            conn.executemany('''
+                INSERT INTO users (tenant_id, national_id, name, name_ar, email, role_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [params for _, params in fresh])
+            return existing, len(fresh)
+        existing, created = submit_write(insert).result()
+        for number, params in chunk:
+            if params[1] in existing:
+                fail(number, params[1], 'national_id already exists')
+        report['created'] += created
+    
+    seen = set()
+    chunk = []
+    for number, row in rows:
+        if isinstance(row, Exception):
+            fail(number, None, str(row))
+            continue
+        params, error = _validate_user_row(row, default_tenant_id, tenants, tenant_ids, role_tenants, role_names)
+        if error:
+            fail(number, row.get('national_id'), error)
+            continue
+        if params[1] in seen:
+            fail(number, params[1], 'Duplicate national_id in upload')
+            continue
+        seen.add(params[1])
+        chunk.append((number, params))
+        if len(chunk) >= chunk_size:
+            insert_chunk(chunk)
+            chunk = []
+    if chunk:
+        insert_chunk(chunk)
+    report['errors'].sort(key=lambda e: e['row'])
+    return report
 
 def update_user_last_login(user_id):
     """Update user's last login time"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?', (user_id,))
-        conn.commit()
+    def update(conn):
+        conn.execute('UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?', (user_id,))
+    submit_write(update).result()
 
 # =====================================
 # SESSION OPERATIONS
 # =====================================
 
+def _load_session_ends(after_seq):
+    with read_db() as conn:
+        return read_session_ends(conn, after_seq)
+
+_session_cache = SessionCache(SESSION_CACHE_TTL_SECONDS, SESSION_CACHE_MAX_BYTES,
+                              _load_session_ends, SESSION_CACHE_CHECK_SECONDS)
+
+AUTH_SESSION_COLUMNS = tuple(SESSION_FIELDS)
+AUTH_USER_COLUMNS = tuple(name for name, expr in USER_FIELDS.items() if expr.startswith('u.')) + ('tenant_code', 'tenant_name')
+
+_AUTH_CONTEXT_QUERY = f'''
+    SELECT {', '.join(f's.{name}' for name in AUTH_SESSION_COLUMNS)},
+           {', '.join(f'u.{name}' for name in AUTH_USER_COLUMNS[:-2])},
+           t.code, t.name_ar
+    FROM sessions s
+    LEFT JOIN users u ON u.id = s.user_id
+    LEFT JOIN tenants t ON u.tenant_id = t.id
+'''
+
+def _auth_context_row(conn, where, param):
+    """(session tuple, user tuple or None) of one active session, in one query"""
+    row = conn.execute(f'{_AUTH_CONTEXT_QUERY} WHERE {where} AND s.is_active = 1', (param,)).fetchone()
+    if not row:
+        return None
+    row = tuple(row)
+    split = len(AUTH_SESSION_COLUMNS)
+    return row[:split], (row[split:] if row[split] is not None else None)
+
+def _cache_auth_rows(token, rows, generation):
+    _session_cache.put(token, rows, generation, session_id=rows[0][0])
+
+def _auth_rows(token):
+    """Cached (session tuple, user tuple) for an active token, or None"""
+    rows = _session_cache.get(token)
+    if rows is None:
+        generation = _session_cache.generation
+        with read_db() as conn:
+            rows = _auth_context_row(conn, 's.token = ?', token)
+        if rows is None:
+            return None
+        _cache_auth_rows(token, rows, generation)
+    return rows
+
 def create_session(user_id, token, ip_address, device_info, location, location_id=0, is_new_device=False, tenant_id=None):
-    """Create a new session"""
-    with get_db() as conn:
+    """Create a new session (and cache its auth context for require_auth)"""
+    def insert(conn):
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO sessions (user_id, tenant_id, token, ip_address, device_info, location, location_id, is_new_device)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         ''', (user_id, tenant_id, token, ip_address, device_info, location, location_id, is_new_device))
-        conn.commit()
-        return cursor.lastrowid
+        return _auth_context_row(conn, 's.id = ?', cursor.lastrowid)
+    generation = _session_cache.generation
+    rows = submit_write(insert).result()
+    _cache_auth_rows(token, rows, generation)
+    return dict(zip(AUTH_SESSION_COLUMNS, rows[0]))['id']
+
+def get_auth_context(token):
+    """
+    Everything require_auth needs about a token, from the session cache or one joined query.
+
+    Returns:
+        None if the session is not active, else {'session': session row,
+        'user': user row with tenant_code / tenant_name and role_name,
+        role_name_ar and decoded permissions (None if the user is gone)}.
+        Roles come from the config cache, so role changes apply at once;
+        other user columns may be up to SESSION_CACHE_TTL_SECONDS old.
+    """
+    rows = _auth_rows(token)
+    if rows is None:
+        return None
+    session, user = rows
+    return {'session': dict(zip(AUTH_SESSION_COLUMNS, session)),
+            'user': _with_role(dict(zip(AUTH_USER_COLUMNS, user))) if user else None}
 
 def get_session_by_token(token):
-    """Get session by token"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM sessions WHERE token = ? AND is_active = 1', (token,))
-        row = cursor.fetchone()
-        return dict(row) if row else None
+    """Get an active session by token (served from the session cache when possible)"""
+    rows = _auth_rows(token)
+    return dict(zip(AUTH_SESSION_COLUMNS, rows[0])) if rows else None
 
 def end_session(token):
-    """End a session"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+    """End a session; it stops authenticating immediately"""
+    def update(conn):
+        conn.execute('''
             UPDATE sessions SET is_active = 0, logout_time = CURRENT_TIMESTAMP
             WHERE token = ?
         ''', (token,))
-        conn.commit()
+    _session_cache.invalidate(token)
+    try:
+        submit_write(update).result()
+    finally:
+        # Again after commit: a lookup racing the update may have re-read the row
+        _session_cache.invalidate(token)
 
-def get_user_sessions(user_id, limit=10):
-    """Get user's recent sessions"""
-    with get_db() as conn:
+def expire_sessions(max_minutes, batch_size=1000):
+    """
+    Deactivate one batch of sessions older than their tenant's
+    session_timeout_minutes (capped at max_minutes, the token lifetime).
+    
+    logout_time is set to the moment each session expired. The scan is a
+    range on idx_sessions_active_login up to the shortest timeout of any
+    tenant, so only active sessions that may have expired are read.
+    
+    Returns:
+        Number of sessions expired (less than batch_size once caught up)
+    """
+    timeout = 'MIN(COALESCE((SELECT session_timeout_minutes FROM tenant_settings ts WHERE ts.tenant_id = {s}.tenant_id), :max), :max)'
+    def update(conn):
+        rows = conn.execute(f'''
+            UPDATE sessions
+            SET is_active = 0,
+                logout_time = datetime(login_time, '+' || {timeout.format(s='sessions')} || ' minutes')
+            WHERE id IN (
+                SELECT s.id FROM sessions s
+                WHERE s.is_active = 1
+                  AND s.login_time < datetime('now', '-' || (
+                      SELECT MIN(COALESCE(MIN(session_timeout_minutes), :max), :max) FROM tenant_settings
+                  ) || ' minutes')
+                  AND s.login_time < datetime('now', '-' || {timeout.format(s='s')} || ' minutes')
+                LIMIT :batch
+            )
+            RETURNING token
+        ''', {'max': max_minutes, 'batch': batch_size}).fetchall()
+        prune_session_ends(conn, SESSION_CACHE_TTL_SECONDS)
+        return [row[0] for row in rows]
+    tokens = submit_write(update).result()
+    for token in tokens:
+        _session_cache.invalidate(token)
+    return len(tokens)
+
+def get_session_cache_stats():
+    """Get session cache hit/miss, eviction and memory statistics"""
+    return _session_cache.stats()
+
+def get_user_sessions(user_id, limit=10, after=None, before=None, fields=None, json_rows=None):
+    """Get user's recent sessions (fields / json_rows as in get_users_by_tenant)"""
+    condition, params, order_by, reverse = _keyset('login_time', 'id', after, before)
+    select, fields = _select(SESSION_FIELDS, fields, 'login_time', 'id', json_rows)
+    query = f'SELECT {select} FROM sessions WHERE user_id = ?'
+    if condition:
+        query += ' AND ' + condition
+    query += f' ORDER BY {order_by} LIMIT ?'
+    
+    with read_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM sessions WHERE user_id = ?
-            ORDER BY login_time DESC LIMIT ?
-        ''', (user_id, limit))
-        return [dict(row) for row in cursor.fetchall()]
+        cursor.execute(query, [user_id] + params + [page_limit(limit)])
+        return _fetch_page(cursor, reverse, fields, json_rows)
+
+# =====================================
+# WRITE-BEHIND
+# =====================================
+
+_write_behind = None
+_id_allocators = {}
+_id_lock = threading.Lock()
+
+def start_write_behind(flush_interval=WRITE_BEHIND_FLUSH_INTERVAL, batch_size=WRITE_BEHIND_BATCH_SIZE,
+                       max_queue=WRITE_BEHIND_MAX_QUEUE):
+    """
+    Route log_activity() and create_alert() through a group-commit queue.
+    
+    Row ids are allocated up front so callers still get them immediately.
+    While enabled, this process must be the only writer to activity_logs
+    and security_alerts, and reads may lag writes by up to flush_interval.
+    """
+    global _write_behind
+    if _write_behind is not None:
+        return _write_behind
+    with _id_lock:
+        _id_allocators.clear()
+    _write_behind = WriteBehindQueue(write_db, flush_interval, batch_size, max_queue)
+    _write_behind.start()
+    return _write_behind
+
+def stop_write_behind():
+    """Flush pending writes and return to synchronous inserts"""
+    global _write_behind
+    if _write_behind is not None:
+        _write_behind.stop()
+        _write_behind = None
+    with _id_lock:
+        _id_allocators.clear()
+
+def flush_write_behind():
+    """Block until all queued writes are committed"""
+    if _write_behind is not None:
+        _write_behind.flush()
+
+def get_write_behind_stats():
+    """Get queue depth and flush latency metrics"""
+    if _write_behind is None:
+        return {'running': False}
+    return _write_behind.stats()
+
+atexit.register(stop_write_behind)
+
+def _allocate_id(table):
+    """Hand out the next row id for a write-behind table"""
+    with _id_lock:
+        if table not in _id_allocators:
+            with read_db() as conn:
+                seq = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+                max_id = conn.execute(f'SELECT MAX(id) FROM {table}').fetchone()[0]
+            _id_allocators[table] = max(seq[0] if seq else 0, max_id or 0)
+        _id_allocators[table] += 1
+        return _id_allocators[table]
 
 # =====================================
 # ACTIVITY & LOGS
 # =====================================
 
+_LOG_COLUMNS = ('user_id', 'tenant_id', 'session_id', 'action', 'details', 'risk_score', 'is_anomaly') + DETAIL_COLUMN_NAMES
+_LOG_INSERT = f'''
+    INSERT INTO activity_logs ({', '.join(_LOG_COLUMNS)})
+    VALUES ({', '.join('?' * len(_LOG_COLUMNS))})
+'''
+_LOG_INSERT_WITH_ID = f'''
+    INSERT INTO activity_logs (id, {', '.join(_LOG_COLUMNS)})
+    VALUES (?, {', '.join('?' * len(_LOG_COLUMNS))})
+'''
+
 def log_activity(user_id, session_id, action, details=None, risk_score=0, is_anomaly=False, tenant_id=None):
-    """Log user activity"""
-    with get_db() as conn:
+    """
+    Log user activity.
+    
+    Promoted details keys (method, location, device, status, behaviour
+    features) are stored in their own columns; only the rest is kept as
+    details JSON (see activity_details.py).
+    """
+    values, rest = split_details(details, risk_score)
+    params = (user_id, tenant_id, session_id, action, rest, risk_score, is_anomaly) + values
+    if _write_behind is not None:
+        log_id = _allocate_id('activity_logs')
+        _write_behind.enqueue(_LOG_INSERT_WITH_ID, (log_id,) + params)
+        return log_id
+    
+    def insert(conn):
         cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO activity_logs (user_id, tenant_id, session_id, action, details, risk_score, is_anomaly)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, tenant_id, session_id, action, json.dumps(details) if details else None, risk_score, is_anomaly))
-        conn.commit()
+        cursor.execute(_LOG_INSERT, params)
         return cursor.lastrowid
+    return submit_write(insert).result()
 
-def get_activity_logs(user_id=None, tenant_id=None, limit=50):
-    """Get activity logs"""
-    with get_db() as conn:
+def get_activity_logs(user_id=None, tenant_id=None, limit=50, after=None, before=None, include_archived=False,
+                      fields=None, json_rows=None):
+    """
+    Get activity logs, newest first.
+    
+    Only the hot partition is read unless include_archived is set, in
+    which case archived months are attached and read as needed to fill
+    the page. fields / json_rows as in get_users_by_tenant (LOG_FIELDS).
+    """
+    condition, keyset_params, order_by, reverse = _keyset('al.timestamp', 'al.id', after, before)
+    table = 'activity_logs_all' if include_archived else 'activity_logs'
+    select, fields = _select(LOG_FIELDS, fields, 'al.timestamp', 'al.id', json_rows)
+    query = f'''
+        SELECT {select}
+        FROM {table} al
+        LEFT JOIN users u ON al.user_id = u.id
+    '''
+    conditions = []
+    params = []
+    
+    if user_id:
+        conditions.append('al.user_id = ?')
+        params.append(user_id)
+    elif tenant_id:
+        conditions.append('al.tenant_id = ?')
+        params.append(tenant_id)
+    if condition:
+        conditions.append(condition)
+        params.extend(keyset_params)
+    
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += f' ORDER BY {order_by} LIMIT ?'
+    
+    if include_archived:
+        cursor_time = decode_cursor(after or before)[0] if (after or before) else None
+        rows = query_partitions(DATABASE_PATH, query, params, page_limit(limit),
+                                descending=not reverse, cursor_time=cursor_time)
+        if json_rows:
+            return _json_page([(row['_sort'], row['_id'], row['_json']) for row in rows], reverse, fields, json_rows)
+        return rows[::-1] if reverse else rows
+    
+    params.append(page_limit(limit))
+    with read_db() as conn:
         cursor = conn.cursor()
-        if user_id:
-            cursor.execute('''
-                SELECT al.*, u.name, u.national_id
-                FROM activity_logs al
-                LEFT JOIN users u ON al.user_id = u.id
-                WHERE al.user_id = ?
-                ORDER BY al.timestamp DESC LIMIT ?
-            ''', (user_id, limit))
-        elif tenant_id:
-            cursor.execute('''
-                SELECT al.*, u.name, u.national_id
-                FROM activity_logs al
-                LEFT JOIN users u ON al.user_id = u.id
-                WHERE al.tenant_id = ?
-                ORDER BY al.timestamp DESC LIMIT ?
-            ''', (tenant_id, limit))
-        else:
-            cursor.execute('''
-                SELECT al.*, u.name, u.national_id
-                FROM activity_logs al
-                LEFT JOIN users u ON al.user_id = u.id
-                ORDER BY al.timestamp DESC LIMIT ?
-            ''', (limit,))
-        return [dict(row) for row in cursor.fetchall()]
+        cursor.execute(query, params)
+        return _fetch_page(cursor, reverse, fields, json_rows)
+
+def archive_activity_logs(hot_days=ACTIVITY_LOG_HOT_DAYS):
+    """
+    Move activity log months older than hot_days into compressed,
+    read-only monthly archives (see log_archive.py).
+    
+    Returns:
+        List of (month, rows_moved)
+    """
+    flush_write_behind()
+    return archive_cold_partitions(DATABASE_PATH, write_db, hot_days)
+
+LOG_QUERY_COLUMNS = DETAIL_COLUMN_NAMES + ('risk_score', 'is_anomaly')
+
+LOG_QUERY_OPERATORS = {'eq': '=', 'ne': '!=', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+def query_activity_logs(where=None, since=None, until=None, tenant_id=None, user_id=None, action=None,
+                        limit=50, after=None, before=None, fields=None, json_rows=None):
+    """
+    Filter activity logs on the promoted detail columns, newest first.
+    
+    e.g. logins from an unknown location on a new device this week:
+        query_activity_logs({'location_id': {'gte': 3}, 'is_new_device': 1},
+                            since='2026-10-12', action='behavior_check')
+    
+    Args:
+        where: {column: value} or {column: {op: value}} over LOG_QUERY_COLUMNS,
+               op in eq, ne, gt, gte, lt, lte, in
+        since / until: Time range [since, until)
+        tenant_id / user_id / action: Optional equality filters
+        limit / after / before: Keyset pagination as in get_activity_logs()
+        fields / json_rows: Projection of LOG_FIELDS and JSON rows (see _select)
+    
+    Returns:
+        Rows as dicts, or a JsonPage
+    
+    Raises:
+        ValueError: Unknown column or operator
+    """
+    conditions = []
+    params = []
+    for column, condition in (where or {}).items():
+        if column not in LOG_QUERY_COLUMNS:
+            raise ValueError(f'Unknown column {column}')
+        if not isinstance(condition, dict):
+            condition = {'eq': condition}
+        for op, value in condition.items():
+            if op == 'in':
+                values = list(value) if isinstance(value, (list, tuple)) else [value]
+                if not values:
+                    raise ValueError(f'Empty list for {column}')
+                conditions.append(f'al.{column} IN ({", ".join("?" * len(values))})')
+                params.extend(values)
+            elif op in LOG_QUERY_OPERATORS:
+                conditions.append(f'al.{column} {LOG_QUERY_OPERATORS[op]} ?')
+                params.append(value)
+            else:
+                raise ValueError(f'Unknown operator {op}')
+    for column, value in (('al.tenant_id', tenant_id), ('al.user_id', user_id), ('al.action', action)):
+        if value is not None:
+            conditions.append(f'{column} = ?')
+            params.append(value)
+    if since:
+        conditions.append('al.timestamp >= ?')
+        params.append(since)
+    if until:
+        conditions.append('al.timestamp < ?')
+        params.append(until)
+    
+    condition, keyset_params, order_by, reverse = _keyset('al.timestamp', 'al.id', after, before)
+    if condition:
+        conditions.append(condition)
+        params.extend(keyset_params)
+    
+    select, fields = _select(LOG_FIELDS, fields, 'al.timestamp', 'al.id', json_rows)
+    query = f'''
+        SELECT {select}
+        FROM activity_logs al
+        LEFT JOIN users u ON al.user_id = u.id
+    '''
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += f' ORDER BY {order_by} LIMIT ?'
+    params.append(page_limit(limit))
+    
+    with read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        return _fetch_page(cursor, reverse, fields, json_rows)
 
 # =====================================
 # SECURITY ALERTS
 # =====================================
 
+_ALERT_INSERT = '''
+    INSERT INTO security_alerts (user_id, tenant_id, session_id, alert_type, severity, description)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+_ALERT_INSERT_WITH_ID = '''
+    INSERT INTO security_alerts (id, user_id, tenant_id, session_id, alert_type, severity, description)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
 def create_alert(user_id, session_id, alert_type, severity, description, tenant_id=None):
     """Create a security alert"""
-    with get_db() as conn:
+    params = (user_id, tenant_id, session_id, alert_type, severity, description)
+    if _write_behind is not None:
+        alert_id = _allocate_id('security_alerts')
+        _write_behind.enqueue(_ALERT_INSERT_WITH_ID, (alert_id,) + params)
+        return alert_id
+    
+    def insert(conn):
         cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO security_alerts (user_id, tenant_id, session_id, alert_type, severity, description)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (user_id, tenant_id, session_id, alert_type, severity, description))
-        conn.commit()
+        cursor.execute(_ALERT_INSERT, params)
         return cursor.lastrowid
+    return submit_write(insert).result()
 
-def get_alerts(tenant_id=None, is_resolved=None, limit=50):
-    """Get security alerts"""
-    with get_db() as conn:
+# =====================================
+# LOGIN UNIT OF WORK
+# =====================================
+
+def _insert_in_transaction(conn, table, insert, insert_with_id, params):
+    """Insert a log / alert row inside the caller's transaction (ids allocated while write-behind is on)"""
+    if _write_behind is not None:
+        row_id = _allocate_id(table)
+        conn.execute(insert_with_id, (row_id,) + params)
+        return row_id
+    return conn.execute(insert, params).lastrowid
+
+def record_login(user_id, tenant_id, token, ip_address, device_info, location, location_id=0, is_new_device=False,
+                 login_details=None, uba_details=None, risk_score=0, is_anomaly=False, alert=None):
+    """
+    Persist a successful login as one unit of work.
+    
+    The session, users.last_login, the 'login' activity log, the UBA
+    check log and the optional alert are written in a single transaction
+    with one commit; the new session's auth context is cached.
+    
+    Args:
+        login_details: details of the 'login' log row
+        uba_details, risk_score, is_anomaly: the UBA check log row
+        alert: (alert_type, severity, description) or None
+    
+    Returns:
+        Dict with session_id, log_id, uba_log_id and alert_id
+    """
+    login_values, login_rest = split_details(login_details, 0)
+    uba_values, uba_rest = split_details(uba_details, risk_score)
+    
+    def unit(conn):
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO sessions (user_id, tenant_id, token, ip_address, device_info, location, location_id, is_new_device)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, tenant_id, token, ip_address, device_info, location, location_id, is_new_device))
+        session_id = cursor.lastrowid
+        cursor.execute('UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?', (user_id,))
+        ids = {
+            'session_id': session_id,
+            'log_id': _insert_in_transaction(conn, 'activity_logs', _LOG_INSERT, _LOG_INSERT_WITH_ID,
+                                             (user_id, tenant_id, session_id, 'login', login_rest, 0, False) + login_values),
+            'uba_log_id': _insert_in_transaction(conn, 'activity_logs', _LOG_INSERT, _LOG_INSERT_WITH_ID,
+                                                 (user_id, tenant_id, session_id, 'login', uba_rest, risk_score,
+                                                  is_anomaly) + uba_values),
+            'alert_id': None,
+        }
+        if alert:
+            ids['alert_id'] = _insert_in_transaction(conn, 'security_alerts', _ALERT_INSERT, _ALERT_INSERT_WITH_ID,
+                                                     (user_id, tenant_id, session_id) + tuple(alert))
+        return _auth_context_row(conn, 's.id = ?', session_id), ids
+    
+    generation = _session_cache.generation
+    rows, ids = submit_write(unit).result()
+    _cache_auth_rows(token, rows, generation)
+    return ids
+
+def get_alerts(tenant_id=None, is_resolved=None, limit=50, after=None, before=None, fields=None, json_rows=None):
+    """Get security alerts, newest first (fields / json_rows as in get_users_by_tenant)"""
+    condition, keyset_params, order_by, reverse = _keyset('sa.created_at', 'sa.id', after, before)
+    select, fields = _select(ALERT_FIELDS, fields, 'sa.created_at', 'sa.id', json_rows)
+    query = f'''
+        SELECT {select}
+        FROM security_alerts sa
+        LEFT JOIN users u ON sa.user_id = u.id
+        LEFT JOIN tenants t ON sa.tenant_id = t.id
+    '''
+    conditions = []
+    params = []
+    
+    if tenant_id:
+        conditions.append('sa.tenant_id = ?')
+        params.append(tenant_id)
+    if is_resolved is not None:
+        conditions.append('sa.is_resolved = ?')
+        params.append(is_resolved)
+    if condition:
+        conditions.append(condition)
+        params.extend(keyset_params)
+    
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += f' ORDER BY {order_by} LIMIT ?'
+    params.append(page_limit(limit))
+    
+    with read_db() as conn:
         cursor = conn.cursor()
-        query = '''
-            SELECT sa.*, u.name, u.national_id, t.name_ar as tenant_name
-            FROM security_alerts sa
-            LEFT JOIN users u ON sa.user_id = u.id
-            LEFT JOIN tenants t ON sa.tenant_id = t.id
-        '''
-        conditions = []
-        params = []
-        
-        if tenant_id:
-            conditions.append('sa.tenant_id = ?')
-            params.append(tenant_id)
-        if is_resolved is not None:
-            conditions.append('sa.is_resolved = ?')
-            params.append(is_resolved)
-        
-        if conditions:
-            query += ' WHERE ' + ' AND '.join(conditions)
-        query += ' ORDER BY sa.created_at DESC LIMIT ?'
-        params.append(limit)
-        
         cursor.execute(query, params)
-        return [dict(row) for row in cursor.fetchall()]
+        return _fetch_page(cursor, reverse, fields, json_rows)
+
+# =====================================
+# FULL-TEXT SEARCH
+# =====================================
+
+SEARCH_SOURCES = {
+    'alerts': ('alerts_fts', '''
+        SELECT sa.*, u.name, u.national_id, t.name_ar as tenant_name,
+               f.rank AS rank, snippet(alerts_fts, -1, '[', ']', '…', 12) AS snippet
+        FROM alerts_fts f
+        JOIN security_alerts sa ON sa.id = f.rowid
+        LEFT JOIN users u ON sa.user_id = u.id
+        LEFT JOIN tenants t ON sa.tenant_id = t.id
+    ''', 'sa'),
+    'logs': ('activity_logs_fts', '''
+        SELECT al.*, u.name, u.national_id,
+               f.rank AS rank, snippet(activity_logs_fts, -1, '[', ']', '…', 12) AS snippet
+        FROM activity_logs_fts f
+        JOIN activity_logs al ON al.id = f.rowid
+        LEFT JOIN users u ON al.user_id = u.id
+    ''', 'al'),
+}
+
+def search(source, text, tenant_id=None, limit=20, after=None, before=None):
+    """
+    Full-text search over alerts or activity logs, best match first.
+    
+    Every word must match; 'word*' matches a prefix. Pages are keyed on
+    (rank, id), so use page_cursors(rows, limit, 'rank', ...). Ranks shift
+    slightly as the index grows, so deep pages are approximate.
+    
+    Args:
+        source: 'alerts' or 'logs'
+        text: Search words
+        tenant_id: Restrict results to one tenant
+    
+    Returns:
+        Rows as dicts with 'rank' (bm25, lower is better) and 'snippet'
+    
+    Raises:
+        ValueError: Unknown source or empty query
+        RuntimeError: FTS5 not available
+    """
+    if source not in SEARCH_SOURCES:
+        raise ValueError(f'Unknown search source {source}')
+    if not FTS5_AVAILABLE:
+        raise RuntimeError('Full-text search not available (SQLite built without FTS5)')
+    index, query, alias = SEARCH_SOURCES[source]
+    conditions = [f'{index} MATCH ?']
+    params = [match_query(text)]
+    reverse = False
+    order_by = 'f.rank, f.rowid'
+    
+    if tenant_id:
+        conditions.append(f'{alias}.tenant_id = ?')
+        params.append(tenant_id)
+    if after:
+        conditions.append('(f.rank, f.rowid) > (?, ?)')
+        params.extend(decode_cursor(after))
+    elif before:
+        conditions.append('(f.rank, f.rowid) < (?, ?)')
+        params.extend(decode_cursor(before))
+        order_by = 'f.rank DESC, f.rowid DESC'
+        reverse = True
+    
+    query += ' WHERE ' + ' AND '.join(conditions) + f' ORDER BY {order_by} LIMIT ?'
+    params.append(page_limit(limit))
+    
+    with read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        return _fetch_page(cursor, reverse)
+
+# =====================================
+# STREAMING EXPORT
+# =====================================
+
+LOG_EXPORT_COLUMNS = ('id', 'timestamp', 'tenant_id', 'user_id', 'session_id', 'action',
+                      'risk_score', 'is_anomaly') + DETAIL_COLUMN_NAMES + ('details',)
+ALERT_EXPORT_COLUMNS = ('id', 'created_at', 'tenant_id', 'user_id', 'session_id', 'alert_type',
+                        'severity', 'description', 'is_resolved', 'resolved_at')
+
+def _export_query(table, columns, time_column, filters, since, until, after):
+    """Ascending (time, id) range query with equality filters and keyset resume"""
+    conditions = []
+    params = []
+    for column, value in filters:
+        if value is not None:
+            conditions.append(f'{column} = ?')
+            params.append(value)
+    if since:
+        conditions.append(f'{time_column} >= ?')
+        params.append(since)
+    if until:
+        conditions.append(f'{time_column} < ?')
+        params.append(until)
+    if after:
+        sort_value, row_id = decode_cursor(after)
+        conditions.append(f'({time_column}, id) > (?, ?)')
+        params.extend([sort_value, row_id])
+    query = f'SELECT {", ".join(columns)} FROM {table}'
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += f' ORDER BY {time_column}, id'
+    return query, params
+
+def _stream_rows(query, params):
+    with read_db() as conn:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            yield rows
+
+def iter_activity_logs(since=None, until=None, tenant_id=None, user_id=None, action=None,
+                       after=None, include_archived=False):
+    """
+    Stream activity logs oldest first, in batches, for bulk export.
+    
+    Rows come from a server-side cursor EXPORT_BATCH_SIZE at a time, so
+    memory stays flat whatever the range. Resume an interrupted export
+    with after=encode_cursor(last_row['timestamp'], last_row['id']).
+    
+    Args:
+        since / until: Time range [since, until) ('YYYY-MM-DD[ HH:MM:SS]')
+        tenant_id / user_id / action: Optional equality filters
+        after: Keyset cursor to resume from
+        include_archived: Also read archived months overlapping the range
+    
+    Yields:
+        Lists of sqlite3.Row with LOG_EXPORT_COLUMNS
+    """
+    filters = [('tenant_id', tenant_id), ('user_id', user_id), ('action', action)]
+    table = 'activity_logs_all' if include_archived else 'activity_logs'
+    query, params = _export_query(table, LOG_EXPORT_COLUMNS, 'timestamp', filters, since, until, after)
+    if not include_archived:
+        return _stream_rows(query, params)
+    if after:
+        since = max(since or '', decode_cursor(after)[0])
+    return stream_partitions(DATABASE_PATH, query, params, since=since, until=until,
+                             batch_size=EXPORT_BATCH_SIZE)
+
+def iter_alerts(since=None, until=None, tenant_id=None, user_id=None, alert_type=None, after=None):
+    """
+    Stream security alerts oldest first, in batches, for bulk export.
+    
+    Same contract as iter_activity_logs(), keyed on created_at.
+    
+    Yields:
+        Lists of sqlite3.Row with ALERT_EXPORT_COLUMNS
+    """
+    filters = [('tenant_id', tenant_id), ('user_id', user_id), ('alert_type', alert_type)]
+    query, params = _export_query('security_alerts', ALERT_EXPORT_COLUMNS, 'created_at', filters, since, until, after)
+    return _stream_rows(query, params)
 
 # =====================================
 # INTEGRATIONS
@@ -566,65 +1784,89 @@ def get_alerts(tenant_id=None, is_resolved=None, limit=50):
 
 def get_tenant_integrations(tenant_id):
     """Get all integrations for a tenant"""
-    with get_db() as conn:
+    with read_db() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM integrations WHERE tenant_id = ?', (tenant_id,))
         return [dict(row) for row in cursor.fetchall()]
 
 def update_integration(integration_id, is_connected, config=None):
     """Update integration status"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+    def update(conn):
+        conn.execute('''
             UPDATE integrations SET is_connected = ?, config = ?, last_sync = CURRENT_TIMESTAMP
             WHERE id = ?
         ''', (is_connected, json.dumps(config) if config else None, integration_id))
-        conn.commit()
+    submit_write(update).result()
+
+# =====================================
+# CONFIGURATION CACHE
+# =====================================
+
+# Roles and tenant settings, decoded once and shared read-only (see config_cache.py)
+def _load_config_versions():
+    with read_db() as conn:
+        return read_config_versions(conn)
+
+_config_cache = ConfigCache(_load_config_versions, CONFIG_CACHE_CHECK_SECONDS)
+
+def invalidate_config(tenant_id=None):
+    """
+    Drop cached roles / settings after writing those tables directly
+    (seeding, imports). A tenant id drops that tenant's entries and the
+    cross-tenant role list; None drops everything.
+    """
+    if tenant_id is None:
+        _config_cache.clear()
+    else:
+        _config_cache.bump(tenant_id, GLOBAL)
+
+def get_config_cache_stats():
+    """Get config cache hit/miss and invalidation statistics"""
+    return _config_cache.stats()
 
 # =====================================
 # TENANT SETTINGS
 # =====================================
 
 def get_tenant_settings(tenant_id):
-    """Get tenant settings"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM tenant_settings WHERE tenant_id = ?', (tenant_id,))
-        row = cursor.fetchone()
-        return dict(row) if row else None
+    """Get tenant settings (cached, read-only; None if the tenant has none)"""
+    def load():
+        with read_db() as conn:
+            row = conn.execute('SELECT * FROM tenant_settings WHERE tenant_id = ?', (tenant_id,)).fetchone()
+            return dict(row) if row else None
+    return _config_cache.get('settings', tenant_id, tenant_id, load)
 
 def update_tenant_settings(tenant_id, settings):
     """Update tenant settings"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        columns = ', '.join(f'{k} = ?' for k in settings.keys())
-        values = list(settings.values()) + [tenant_id]
-        cursor.execute(f'UPDATE tenant_settings SET {columns} WHERE tenant_id = ?', values)
-        conn.commit()
+    columns = ', '.join(f'{k} = ?' for k in settings.keys())
+    values = list(settings.values()) + [tenant_id]
+    def update(conn):
+        conn.execute(f'UPDATE tenant_settings SET {columns} WHERE tenant_id = ?', values)
+    submit_write(update).result()
+    _config_cache.bump(tenant_id)
 
 # =====================================
 # ROLES
 # =====================================
 
+def _load_roles(where='', params=()):
+    with read_db() as conn:
+        roles = [dict(row) for row in conn.execute('SELECT * FROM roles ' + where, params)]
+    for role in roles:
+        role['permissions'] = json.loads(role['permissions']) if role.get('permissions') else []
+    return roles
+
 def get_all_roles():
-    """Get all roles"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM roles')
-        roles = [dict(row) for row in cursor.fetchall()]
-        for role in roles:
-            role['permissions'] = json.loads(role['permissions']) if role.get('permissions') else []
-        return roles
+    """Get all roles (cached, read-only; permissions decoded)"""
+    return _config_cache.get('roles', 'all', GLOBAL, _load_roles)
 
 def get_roles_by_tenant(tenant_id):
-    """Get roles for a tenant"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM roles WHERE tenant_id = ?', (tenant_id,))
-        roles = [dict(row) for row in cursor.fetchall()]
-        for role in roles:
-            role['permissions'] = json.loads(role['permissions']) if role.get('permissions') else []
-        return roles
+    """Get roles for a tenant (cached, read-only; permissions decoded)"""
+    return _config_cache.get('roles', tenant_id, tenant_id,
+                             lambda: _load_roles('WHERE tenant_id = ?', (tenant_id,)))
+
+def _roles_by_id():
+    return _config_cache.get('role_map', 'all', GLOBAL, lambda: {role['id']: role for role in get_all_roles()})
 
 # =====================================
 # STATISTICS
@@ -632,7 +1874,7 @@ def get_roles_by_tenant(tenant_id):
 
 def get_login_stats(tenant_id=None, days=7):
     """Get login statistics"""
-    with get_db() as conn:
+    with read_db() as conn:
         cursor = conn.cursor()
         if tenant_id:
             cursor.execute('''
@@ -654,76 +1896,45 @@ def get_login_stats(tenant_id=None, days=7):
         return [dict(row) for row in cursor.fetchall()]
 
 def get_dashboard_stats(tenant_id=None):
-    """Get dashboard statistics"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        if tenant_id:
-            # Tenant-specific stats
-            cursor.execute('SELECT COUNT(*) FROM users WHERE tenant_id = ? AND is_active = 1', (tenant_id,))
-            total_users = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT COUNT(*) FROM sessions WHERE tenant_id = ? AND is_active = 1', (tenant_id,))
-            active_sessions = cursor.fetchone()[0]
-            
-            cursor.execute('''
-                SELECT COALESCE(SUM(successful_logins), 0) FROM login_stats 
-                WHERE tenant_id = ? AND date >= date('now', '-30 days')
-            ''', (tenant_id,))
-            monthly_logins = cursor.fetchone()[0]
-            
-            cursor.execute('''
-                SELECT COUNT(*) FROM activity_logs WHERE tenant_id = ? AND is_anomaly = 1
-            ''', (tenant_id,))
-            blocked_attempts = cursor.fetchone()[0]
-        else:
-            # Platform-wide stats
-            cursor.execute('SELECT COUNT(*) FROM tenants WHERE is_active = 1')
-            total_tenants = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT COUNT(*) FROM users WHERE is_active = 1')
-            total_users = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT COUNT(*) FROM sessions WHERE is_active = 1')
-            active_sessions = cursor.fetchone()[0]
-            
-            cursor.execute('''
-                SELECT COALESCE(SUM(successful_logins), 0) FROM login_stats 
-                WHERE date >= date('now', '-30 days')
-            ''')
-            monthly_logins = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT COUNT(*) FROM activity_logs WHERE is_anomaly = 1')
-            blocked_attempts = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT COUNT(*) FROM security_alerts WHERE is_resolved = 0')
-            pending_alerts = cursor.fetchone()[0]
-            
-            return {
-                'total_tenants': total_tenants,
-                'total_users': total_users,
-                'active_sessions': active_sessions,
-                'monthly_logins': monthly_logins,
-                'blocked_attempts': blocked_attempts,
-                'pending_alerts': pending_alerts
-            }
-        
-        return {
-            'total_users': total_users,
-            'active_sessions': active_sessions,
-            'monthly_logins': monthly_logins,
-            'blocked_attempts': blocked_attempts
-        }
+    """Get dashboard statistics (from the maintained counters)"""
+    since = (datetime.utcnow().date() - timedelta(days=30)).isoformat()
+    with read_db() as conn:
+        counters = read_counters(conn, tenant_id or PLATFORM_SCOPE, since_date=since)
+    
+    stats = {
+        'total_users': counters['active_users'],
+        'active_sessions': counters['active_sessions'],
+        'monthly_logins': counters['logins'],
+        'blocked_attempts': counters['anomaly_count'] + counters[ARCHIVED_ANOMALY_COUNTER]
+    }
+    if not tenant_id:
+        stats['total_tenants'] = counters['active_tenants']
+        stats['pending_alerts'] = counters['pending_alerts']
+    return stats
+
+def reconcile_counters(fix=True):
+    """
+    Recompute dashboard counters from the source tables and report drift.
+    
+    Returns:
+        List of drifted counters (stored vs actual); fixed in place if fix=True
+    """
+    _ensure_summary_window()
+    with write_db() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        drift = _reconcile_counters(conn, fix=fix)
+        drift += reconcile_tenant_summaries(conn, fix=fix)
+        conn.commit()
+    return drift
 
 def get_platform_revenue():
     """Calculate total platform revenue"""
-    pricing = {'enterprise': 150000, 'professional': 75000, 'starter': 25000}
-    with get_db() as conn:
+    with read_db() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT contract_tier, COUNT(*) as count FROM tenants WHERE is_active = 1 GROUP BY contract_tier')
         total = 0
         for row in cursor.fetchall():
-            total += pricing.get(row['contract_tier'], 0) * row['count']
+            total += PLAN_PRICING.get(row['contract_tier'], 0) * row['count']
         return total
 
 
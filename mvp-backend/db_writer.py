@@ -0,0 +1,172 @@
+"""
+Single Database Writer
+======================
+One dedicated connection that owns all INSERT/UPDATE work.
+
+Request threads submit write jobs - callables taking the connection - and
+get a Future back. The writer thread runs queued jobs back to back in one
+transaction, each inside its own savepoint, so a failing job is rolled
+back alone and N concurrent writes cost one commit. SQLite never sees two
+writers, so there is no lock contention to wait out.
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+_STOP = object()
+
+class DatabaseWriter:
+    """
+    Writer thread plus the single read-write connection it owns.
+
+    Args:
+        connect: Callable returning a new read-write connection
+        max_batch: Max jobs committed together
+    """
+
+    def __init__(self, connect, max_batch=256):
+        self.connect = connect
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._conn = None
+        self._conn_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        self._stats = {
+            'jobs': 0,
+            'failed': 0,
+            'batches': 0,
+            'max_batch': 0,
+            'total_commit_ms': 0.0,
+            'max_commit_ms': 0.0,
+        }
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            if self._conn is None:
+                self._conn = self.connect()
+            self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10):
+        """Finish queued jobs, stop the thread and close the connection"""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(self, job):
+        """Queue job(conn) for the writer; returns a Future with its result"""
+        future = Future()
+        self._queue.put((job, future))
+        return future
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow the writer connection exclusively, for callers that manage
+        their own transaction (maintenance, write-behind batches).
+        """
+        with self._conn_lock:
+            try:
+                yield self._conn
+            finally:
+                if self._conn.in_transaction:
+                    self._conn.rollback()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            item = self._queue.get()
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if stopping:
+                # Run whatever was queued behind the stop marker
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+
+            if batch:
+                self._execute(batch)
+
+    def _execute(self, batch):
+        results = []
+        start = time.perf_counter()
+        with self._conn_lock:
+            conn = self._conn
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                for job, future in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    conn.execute('SAVEPOINT job')
+                    try:
+                        result = job(conn)
+                    except Exception as e:
+                        conn.execute('ROLLBACK TO job')
+                        conn.execute('RELEASE job')
+                        future.set_exception(e)
+                        continue
+                    conn.execute('RELEASE job')
+                    results.append((future, result))
+                conn.commit()
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                for future, _ in results:
+                    future.set_exception(e)
+                for job, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                results = []
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        # Resolve futures only once the batch is durable
+        for future, result in results:
+            future.set_result(result)
+
+        with self._stats_lock:
+            self._stats['jobs'] += len(batch)
+            self._stats['failed'] += len(batch) - len(results)
+            self._stats['batches'] += 1
+            self._stats['max_batch'] = max(self._stats['max_batch'], len(batch))
+            self._stats['total_commit_ms'] += elapsed_ms
+            self._stats['max_commit_ms'] = max(self._stats['max_commit_ms'], elapsed_ms)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['running'] = self.running
+        stats['avg_batch'] = round(stats['jobs'] / max(stats['batches'], 1), 2)
+        stats['avg_commit_ms'] = round(stats['total_commit_ms'] / max(stats['batches'], 1), 3)
+        for key in ('total_commit_ms', 'max_commit_ms'):
+            stats[key] = round(stats[key], 3)
+        return stats
@@ -0,0 +1,326 @@
+"""
+UBA Feature Store
+=================
+Append-only columnar store of UBA feature vectors for threat hunting.
+
+Every behaviour check appends one row: the eight model features plus
+log id, user, tenant, timestamp and risk score. Each column is a
+fixed-width numpy array in its own file, memory-mapped from disk, so hunts
+run as vectorized filters and aggregations over the whole history without
+touching SQLite or parsing JSON.
+
+Layout (feature_store/ next to the database):
+    count           int64 - number of committed rows
+    <column>.bin    one fixed-width array per column, grown by doubling
+    lock            flock()ed by appends, so worker processes can share a store
+
+Usage: python feature_store.py rebuild   (backfill from activity_logs)
+"""
+
+import os
+import sys
+import time
+import atexit
+import calendar
+import threading
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:              # Not on Windows: one process per store
+    fcntl = None
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    print("Warning: numpy not available. UBA feature store disabled.")
+
+STORE_DIR_NAME = 'feature_store'
+INITIAL_CAPACITY = 1 << 16       # Rows; files double when full
+FLUSH_EVERY_ROWS = 1000          # Appended rows between flushes to disk
+FLUSH_INTERVAL_SECONDS = 5       # ...or seconds, whichever comes first
+
+FEATURES = ('login_hour', 'location_id', 'is_new_device', 'actions_count',
+            'files_accessed', 'session_duration', 'failed_logins', 'sensitive_access')
+
+# Column -> numpy dtype
+COLUMNS = {
+    'log_id': 'int64',
+    'timestamp': 'int64',        # Unix seconds (UTC)
+    'user_id': 'int32',
+    'tenant_id': 'int32',        # 0 when unknown
+    'risk_score': 'int16',
+    'login_hour': 'int8',
+    'location_id': 'int16',
+    'is_new_device': 'int8',
+    'actions_count': 'int32',
+    'files_accessed': 'int32',
+    'session_duration': 'float32',
+    'failed_logins': 'int16',
+    'sensitive_access': 'int16',
+}
+
+OPERATORS = {
+    'eq': lambda col, v: col == v,
+    'ne': lambda col, v: col != v,
+    'gt': lambda col, v: col > v,
+    'gte': lambda col, v: col >= v,
+    'lt': lambda col, v: col < v,
+    'lte': lambda col, v: col <= v,
+    'in': lambda col, v: np.isin(col, list(v)),
+}
+
+class FeatureStore:
+    """
+    Memory-mapped column files with a single committed row count.
+
+    Appends write every column first and bump the count last, so a crash
+    mid-append leaves at most an uncommitted row that readers ignore.
+    Threads are serialized by a lock and processes by an flock on the
+    store's lock file, held across the read and bump of the count.
+    Appends are flushed every FLUSH_EVERY_ROWS rows or
+    FLUSH_INTERVAL_SECONDS.
+    """
+
+    def __init__(self, path, initial_capacity=INITIAL_CAPACITY):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._lock_file = open(os.path.join(path, 'lock'), 'a+b')
+        self._unflushed = 0
+        self._flushed_at = time.monotonic()
+        count_file = os.path.join(path, 'count')
+        self._count = np.memmap(count_file, dtype='int64', mode='r+' if os.path.exists(count_file) else 'w+', shape=(1,))
+        self._capacity = 0
+        self._columns = {}
+        self._open(max(initial_capacity, self._file_capacity()))
+
+    def _column_file(self, name):
+        return os.path.join(self.path, f'{name}.bin')
+
+    def _file_capacity(self):
+        sizes = [os.path.getsize(self._column_file(name)) // np.dtype(dtype).itemsize
+                 for name, dtype in COLUMNS.items() if os.path.exists(self._column_file(name))]
+        return min(sizes) if sizes else 0
+
+    def _open(self, capacity):
+        """(Re)map every column file at the given capacity, growing files as needed"""
+        for name, dtype in COLUMNS.items():
+            filename = self._column_file(name)
+            size = capacity * np.dtype(dtype).itemsize
+            with open(filename, 'ab') as f:
+                if f.tell() < size:
+                    f.truncate(size)
+            self._columns[name] = np.memmap(filename, dtype=dtype, mode='r+', shape=(capacity,))
+        self._capacity = capacity
+
+    def __len__(self):
+        return int(self._count[0])
+
+    def append(self, row):
+        """Append one feature vector (dict with COLUMNS keys; missing -> 0)"""
+        self.append_many([row])
+
+    def append_many(self, rows):
+        """Append feature vectors in one go"""
+        if not rows:
+            return
+        with self._lock:
+            self._flock(fcntl.LOCK_EX if fcntl else None)
+            try:
+                start = int(self._count[0])
+                end = start + len(rows)
+                if end > self._capacity:
+                    # Another process may already have grown the files
+                    capacity = max(self._capacity, self._file_capacity())
+                    while capacity < end:
+                        capacity *= 2
+                    self.flush()
+                    self._open(capacity)
+                for name in COLUMNS:
+                    self._columns[name][start:end] = [row.get(name) or 0 for row in rows]
+                self._count[0] = end
+            finally:
+                self._flock(fcntl.LOCK_UN if fcntl else None)
+            self._unflushed += len(rows)
+            if self._unflushed >= FLUSH_EVERY_ROWS or time.monotonic() - self._flushed_at >= FLUSH_INTERVAL_SECONDS:
+                self.flush()
+
+    def _flock(self, operation):
+        if operation is not None:
+            fcntl.flock(self._lock_file, operation)
+
+    def flush(self):
+        for column in self._columns.values():
+            column.flush()
+        self._count.flush()
+        self._unflushed = 0
+        self._flushed_at = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self._lock_file.close()
+
+    def columns(self):
+        """Read-only views of all committed rows, column by column"""
+        with self._lock:
+            count = int(self._count[0])
+            if count > self._capacity:
+                # Grown by another process
+                self._open(self._file_capacity())
+            return {name: column[:count] for name, column in self._columns.items()}
+
+    def hunt(self, where=None, since=None, until=None, group_by=None, limit=100):
+        """
+        Vectorized filter (and optional aggregation) over all vectors.
+
+        Args:
+            where: {column: value} or {column: {op: value}} with op in
+                   eq, ne, gt, gte, lt, lte, in
+            since / until: datetime, ISO string or Unix seconds bounding timestamp
+            group_by: Column to aggregate matches by (count, avg/max risk)
+            limit: Max groups (largest first) or rows (newest first) returned
+
+        Returns:
+            Dict with matched count and either groups or rows
+        """
+        columns = self.columns()
+        mask = np.ones(len(columns['log_id']), dtype=bool)
+        for column, condition in (where or {}).items():
+            if column not in columns:
+                raise ValueError(f'Unknown column {column}')
+            if not isinstance(condition, dict):
+                condition = {'eq': condition}
+            for op, value in condition.items():
+                if op not in OPERATORS:
+                    raise ValueError(f'Unknown operator {op}')
+                mask &= OPERATORS[op](columns[column], value)
+        if since is not None:
+            mask &= columns['timestamp'] >= _unix(since)
+        if until is not None:
+            mask &= columns['timestamp'] < _unix(until)
+
+        matched = np.flatnonzero(mask)
+        result = {'matched': int(matched.size), 'scanned': int(mask.size)}
+
+        if group_by:
+            if group_by not in columns:
+                raise ValueError(f'Unknown column {group_by}')
+            keys, inverse = np.unique(columns[group_by][matched], return_inverse=True)
+            risk = columns['risk_score'][matched].astype('int64')
+            counts = np.bincount(inverse, minlength=keys.size)
+            risk_sum = np.bincount(inverse, weights=risk, minlength=keys.size)
+            risk_max = np.full(keys.size, -1, dtype='int64')
+            np.maximum.at(risk_max, inverse, risk)
+            top = np.argsort(-counts, kind='stable')[:limit]
+            result['groups'] = [{
+                group_by: keys[i].item(),
+                'count': int(counts[i]),
+                'avg_risk_score': round(float(risk_sum[i] / counts[i]), 2),
+                'max_risk_score': int(risk_max[i]),
+            } for i in top]
+        else:
+            newest = matched[::-1][:limit]
+            result['rows'] = [{name: columns[name][i].item() for name in COLUMNS} for i in newest]
+        return result
+
+def _unix(value):
+    """Unix seconds from a naive-UTC datetime, ISO string or number"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        return calendar.timegm(value.utctimetuple())
+    return int(value)
+
+# =====================================
+# MODULE STORE
+# =====================================
+
+_store = None
+_store_lock = threading.Lock()
+
+def _flush_store():
+    if _store is not None:
+        _store.flush()
+
+atexit.register(_flush_store)
+
+def store_path():
+    from database import DATABASE_PATH
+    return os.path.join(os.path.dirname(os.path.abspath(DATABASE_PATH)), STORE_DIR_NAME)
+
+def get_feature_store():
+    """Feature store next to the current database (None without numpy)"""
+    global _store
+    if not NUMPY_AVAILABLE:
+        return None
+    path = store_path()
+    with _store_lock:
+        if _store is None or _store.path != path:
+            if _store is not None:
+                _store.close()
+            _store = FeatureStore(path)
+        return _store
+
+def record_features(log_id, user_id, tenant_id, risk_score, behavior, timestamp=None):
+    """Append one UBA check to the feature store (no-op without numpy)"""
+    store = get_feature_store()
+    if store is None:
+        return
+    row = dict(behavior)
+    row.update({
+        'log_id': log_id,
+        'timestamp': _unix(timestamp) if timestamp is not None else int(time.time()),
+        'user_id': user_id,
+        'tenant_id': tenant_id,
+        'risk_score': risk_score,
+    })
+    store.append(row)
+
+def rebuild_feature_store(batch_size=10000):
+    """
+    Backfill the store from activity_logs rows carrying behaviour features
+    (the promoted detail columns, see activity_details.py).
+
+    The existing store files are replaced.
+
+    Returns:
+        Number of vectors written
+    """
+    global _store
+    from database import read_db
+    import shutil
+
+    path = store_path()
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+        _store = None
+        shutil.rmtree(path, ignore_errors=True)
+    store = get_feature_store()
+
+    written = 0
+    with read_db() as conn:
+        cursor = conn.execute(f'''
+            SELECT al.id AS log_id, al.user_id, COALESCE(al.tenant_id, u.tenant_id) AS tenant_id, al.risk_score,
+                   CAST(strftime('%s', al.timestamp) AS INTEGER) AS timestamp, {', '.join(f'al.{name}' for name in FEATURES)}
+            FROM activity_logs al LEFT JOIN users u ON al.user_id = u.id
+            WHERE al.login_hour IS NOT NULL
+            ORDER BY al.timestamp, al.id
+        ''')
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            store.append_many([dict(row) for row in batch])
+            written += len(batch)
+    store.flush()
+    return written
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 2 and sys.argv[1] == 'rebuild':
+        print(f"✓ Rebuilt feature store with {rebuild_feature_store()} vectors")
+    else:
+        print(__doc__)
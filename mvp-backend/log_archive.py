@@ -0,0 +1,336 @@
+"""
+Activity Log Archive
+====================
+Hot table plus monthly cold archives for activity_logs.
+
+This is not time partitioning of the live table: activity_logs in the
+main database stays one table and only holds recent months. Older months
+are moved out into one SQLite file per month
+(log_archive/activity_logs_YYYY-MM.db.gz), vacuumed and gzipped. Archives
+are decompressed on demand into a local cache, attached read-only and
+queried through a temporary union view (activity_logs_all).
+
+Usage: python log_archive.py archive [hot_days]   (move cold months out)
+       python log_archive.py list
+"""
+
+import os
+import re
+import sys
+import gzip
+import shutil
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from counters import carry_archived_anomalies
+from activity_details import DETAIL_COLUMNS, DETAIL_COLUMN_NAMES, add_detail_columns, backfill_detail_columns
+
+HOT_RETENTION_DAYS = 90         # Months entirely older than this are archived
+ARCHIVE_DIR_NAME = 'log_archive'
+MAX_ATTACHED_ARCHIVES = 8       # SQLite attaches at most 10 databases by default
+CACHE_DIR = os.path.join(tempfile.gettempdir(), 'nafath_log_archive')
+CACHE_MAX_BYTES = 1024 ** 3     # Decompressed archives kept; least recently used go first
+
+ARCHIVE_FILE = re.compile(r'^activity_logs_(\d{4}-\d{2})\.db\.gz$')
+
+BASE_COLUMNS = ('id', 'user_id', 'tenant_id', 'session_id', 'action', 'details', 'risk_score', 'is_anomaly', 'timestamp')
+COLUMNS = ', '.join(BASE_COLUMNS + DETAIL_COLUMN_NAMES)
+
+ARCHIVE_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS {schema}.activity_logs (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER,
+        tenant_id INTEGER,
+        session_id INTEGER,
+        action TEXT NOT NULL,
+        details TEXT,
+        risk_score INTEGER DEFAULT 0,
+        is_anomaly BOOLEAN DEFAULT 0,
+        timestamp TIMESTAMP,
+        ''' + ',\n        '.join(f'{name} {sql_type}' for name, sql_type, _ in DETAIL_COLUMNS) + '''
+    )''',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_activity_logs_user_time ON activity_logs(user_id, timestamp)',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_activity_logs_tenant_time ON activity_logs(tenant_id, timestamp)',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_activity_logs_time ON activity_logs(timestamp)',
+)
+
+_cache_lock = threading.Lock()
+
+# =====================================
+# PARTITION LAYOUT
+# =====================================
+
+def archive_dir(db_path):
+    """Archive directory for a database (next to the database file)"""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), ARCHIVE_DIR_NAME)
+
+def archive_path(db_path, month):
+    return os.path.join(archive_dir(db_path), f'activity_logs_{month}.db.gz')
+
+def list_archive_months(db_path):
+    """Archived months ('YYYY-MM'), oldest first"""
+    directory = archive_dir(db_path)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(m.group(1) for m in map(ARCHIVE_FILE.match, os.listdir(directory)) if m)
+
+def month_bounds(month):
+    """Timestamp range [start, end) covered by a 'YYYY-MM' partition"""
+    year, mon = map(int, month.split('-'))
+    end = f'{year + 1}-01' if mon == 12 else f'{year}-{mon + 1:02d}'
+    return f'{month}-01', f'{end}-01'
+
+def _cutoff_month(hot_days):
+    return (datetime.utcnow() - timedelta(days=hot_days)).strftime('%Y-%m')
+
+# =====================================
+# ARCHIVAL
+# =====================================
+
+def archive_cold_partitions(db_path, write_db, hot_days=HOT_RETENTION_DAYS):
+    """
+    Move every month entirely older than hot_days into its archive file.
+
+    Per month: rows are copied into the (possibly existing) archive with
+    INSERT OR IGNORE, the archive is vacuumed and gzipped atomically, and
+    only then are the rows found in the archive deleted from the hot
+    table - a row written to the month in between stays hot until the
+    next run. Their anomalies move to the archived_anomaly_count counter
+    in the same transaction. An interrupted run is safe to repeat. The main database is only written through
+    write_db, and only while copying and deleting, so other writes are
+    not held up while an archive is compressed.
+
+    Args:
+        db_path: Main database path
+        write_db: Context manager yielding a write connection (database.write_db)
+        hot_days: Retention window of the hot partition
+
+    Returns:
+        List of (month, rows_moved)
+    """
+    os.makedirs(archive_dir(db_path), exist_ok=True)
+    with write_db() as conn:
+        months = [row[0] for row in conn.execute('''
+            SELECT DISTINCT substr(timestamp, 1, 7) FROM activity_logs
+            WHERE timestamp < ?
+        ''', (month_bounds(_cutoff_month(hot_days))[0],))]
+
+    moved = []
+    for month in sorted(months):
+        moved.append((month, _archive_month(write_db, db_path, month)))
+    return moved
+
+def _archive_month(write_db, db_path, month):
+    start, end = month_bounds(month)
+    target = archive_path(db_path, month)
+    work = target[:-len('.gz')] + '.tmp'
+
+    # Append to the existing archive for this month, if any
+    if os.path.exists(target):
+        with gzip.open(target, 'rb') as src, open(work, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+    elif os.path.exists(work):
+        os.remove(work)
+
+    with write_db() as conn:
+        conn.execute('ATTACH DATABASE ? AS cold', (work,))
+        try:
+            for statement in ARCHIVE_SCHEMA:
+                conn.execute(statement.format(schema='cold'))
+            # Archives written before the detail columns existed
+            add_detail_columns(conn, 'cold')
+            backfill_detail_columns(conn, 'cold')
+            conn.execute(f'''
+                INSERT OR IGNORE INTO cold.activity_logs ({COLUMNS})
+                SELECT {COLUMNS} FROM main.activity_logs
+                WHERE timestamp >= ? AND timestamp < ?
+            ''', (start, end))
+            conn.commit()
+        finally:
+            conn.execute('DETACH DATABASE cold')
+
+    vacuum = sqlite3.connect(work)
+    vacuum.execute('VACUUM')
+    vacuum.close()
+    with open(work, 'rb') as src, gzip.open(target + '.tmp', 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(target + '.tmp', target)
+    os.chmod(target, 0o444)
+
+    # Delete only what the archive now holds
+    archived = 'timestamp >= ? AND timestamp < ? AND id IN (SELECT id FROM cold.activity_logs)'
+    with write_db() as conn:
+        conn.execute('ATTACH DATABASE ? AS cold', (work,))
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            carry_archived_anomalies(conn, archived, (start, end))
+            cursor = conn.execute(f'DELETE FROM main.activity_logs WHERE {archived}', (start, end))
+            conn.commit()
+        finally:
+            conn.rollback()
+            conn.execute('DETACH DATABASE cold')
+    os.remove(work)
+    return cursor.rowcount
+
+# =====================================
+# QUERYING
+# =====================================
+
+def _archive_select(conn, schema):
+    """
+    SELECT of COLUMNS from an attached archive. Archives older than the
+    detail columns (and never appended to since) read them from details.
+    """
+    existing = {row[1] for row in conn.execute(f'PRAGMA {schema}.table_info(activity_logs)')}
+    columns = [name if name in existing else f"json_extract(details, '{path}') AS {name}"
+               for name, _, path in DETAIL_COLUMNS]
+    return f'SELECT {", ".join(BASE_COLUMNS + tuple(columns))} FROM {schema}.activity_logs'
+
+def _extracted(db_path, month):
+    """
+    Decompressed copy of an archive in the local cache (reused while unchanged).
+
+    Copies are named by the archive's mtime and size; writing a new copy
+    removes the older copies of the same month and trims the cache to
+    CACHE_MAX_BYTES. Copies still attached elsewhere stay readable until
+    closed.
+    """
+    source = archive_path(db_path, month)
+    stat = os.stat(source)
+    prefix = os.path.basename(source)[:-3]
+    cached = os.path.join(CACHE_DIR, f'{prefix}.{stat.st_mtime_ns}.{stat.st_size}')
+    with _cache_lock:
+        if os.path.exists(cached):
+            os.utime(cached)
+            return cached
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with gzip.open(source, 'rb') as src, open(cached + '.tmp', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(cached + '.tmp', cached)
+        for name in os.listdir(CACHE_DIR):
+            if name.startswith(prefix + '.') and os.path.join(CACHE_DIR, name) != cached:
+                _remove_cached(name)
+        _trim_cache(keep=cached)
+    return cached
+
+def _remove_cached(name):
+    try:
+        os.remove(os.path.join(CACHE_DIR, name))
+    except FileNotFoundError:
+        pass
+
+def _trim_cache(keep):
+    """Remove least recently used copies until the cache fits CACHE_MAX_BYTES"""
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, name)
+        if path != keep and not name.endswith('.tmp'):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+    total = os.path.getsize(keep) + sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= CACHE_MAX_BYTES:
+            break
+        _remove_cached(name)
+        total -= size
+
+@contextmanager
+def open_partitions(db_path, months, include_hot=True):
+    """
+    Read-only connection with activity_logs_all = hot table + given archives.
+
+    Args:
+        db_path: Main database path
+        months: Archived months to attach (at most MAX_ATTACHED_ARCHIVES)
+        include_hot: Include the hot activity_logs table in the view
+    """
+    if len(months) > MAX_ATTACHED_ARCHIVES:
+        raise ValueError(f'At most {MAX_ATTACHED_ARCHIVES} archives can be attached at once')
+    conn = sqlite3.connect(f'file:{os.path.abspath(db_path)}?mode=ro', uri=True, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        parts = [f'SELECT {COLUMNS} FROM main.activity_logs'] if include_hot else []
+        for i, month in enumerate(months):
+            conn.execute(f'ATTACH DATABASE ? AS archive_{i}', (f'file:{_extracted(db_path, month)}?mode=ro',))
+            parts.append(_archive_select(conn, f'archive_{i}'))
+        if not parts:
+            parts.append(f'SELECT {COLUMNS} FROM main.activity_logs WHERE 0')
+        conn.execute('CREATE TEMP VIEW activity_logs_all AS ' + ' UNION ALL '.join(parts))
+        yield conn
+    finally:
+        conn.close()
+
+def query_partitions(db_path, query, params, limit, descending=True, cursor_time=None):
+    """
+    Run a keyset page query across the hot table and the archives.
+
+    The query must read FROM activity_logs_all and end in 'LIMIT ?' (the
+    limit is appended to params). Partitions are visited newest first for
+    descending pages (oldest first otherwise), at most
+    MAX_ATTACHED_ARCHIVES at a time, until the page is full. Months on
+    the wrong side of the cursor are skipped.
+
+    Returns:
+        Rows as dicts, in query order
+    """
+    months = list_archive_months(db_path)
+    cursor_month = cursor_time[:7] if cursor_time else None
+    if descending:
+        months = [m for m in reversed(months) if cursor_month is None or m <= cursor_month]
+        partitions = [None] + months
+    else:
+        months = [m for m in months if cursor_month is None or m >= cursor_month]
+        partitions = months + [None]
+
+    rows = []
+    for i in range(0, len(partitions), MAX_ATTACHED_ARCHIVES):
+        chunk = partitions[i:i + MAX_ATTACHED_ARCHIVES]
+        archived = [m for m in chunk if m is not None]
+        with open_partitions(db_path, archived, include_hot=None in chunk) as conn:
+            rows.extend(dict(row) for row in conn.execute(query, list(params) + [limit - len(rows)]))
+        if len(rows) >= limit:
+            break
+    return rows
+
+def stream_partitions(db_path, query, params, since=None, until=None, batch_size=1000):
+    """
+    Stream an ascending query over activity_logs_all, oldest partition first.
+
+    Only archives overlapping [since, until) are attached, at most
+    MAX_ATTACHED_ARCHIVES at a time; rows are fetched batch_size at a time.
+
+    Yields:
+        Lists of rows (sqlite3.Row)
+    """
+    months = [m for m in list_archive_months(db_path)
+              if (since is None or month_bounds(m)[1] > since) and (until is None or month_bounds(m)[0] < until)]
+    partitions = months + [None]
+    for i in range(0, len(partitions), MAX_ATTACHED_ARCHIVES):
+        chunk = partitions[i:i + MAX_ATTACHED_ARCHIVES]
+        archived = [m for m in chunk if m is not None]
+        with open_partitions(db_path, archived, include_hot=None in chunk) as conn:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+if __name__ == '__main__':
+    from database import DATABASE_PATH as db_path, archive_activity_logs
+    if len(sys.argv) >= 2 and sys.argv[1] == 'archive':
+        hot_days = int(sys.argv[2]) if len(sys.argv) > 2 else HOT_RETENTION_DAYS
+        for month, count in archive_activity_logs(hot_days):
+            print(f"✓ Archived {count} activity logs for {month}")
+    elif len(sys.argv) >= 2 and sys.argv[1] == 'list':
+        for month in list_archive_months(db_path):
+            size = os.path.getsize(archive_path(db_path, month))
+            print(f"  {month}  {size / 1024:.1f} KB")
+    else:
+        print(__doc__)
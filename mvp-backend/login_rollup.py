@@ -0,0 +1,180 @@
+"""
+Login Stats Rollup
+==================
+Incremental aggregation of authentication events into login_stats.
+
+Auth code records each login success, failure and blocked attempt as it
+happens. Events are accumulated in memory per (tenant, day) and upserted
+into login_stats on a periodic flush, so dashboards read the rollups and
+never touch raw events. unique_users is recounted from sessions on each
+flush, so it stays exact across worker processes and restarts.
+
+Usage: python login_rollup.py backfill [days]   (rebuild from raw events)
+"""
+
+import sys
+import atexit
+import threading
+from datetime import datetime, timedelta
+
+from database import write_db
+
+FLUSH_INTERVAL_SECONDS = 10
+
+OUTCOMES = ('success', 'failed', 'blocked')
+
+UPSERT_SQL = '''
+    INSERT INTO login_stats (tenant_id, date, successful_logins, failed_logins, unique_users, blocked_attempts)
+    VALUES (:tenant_id, :day, :success, :failed, (
+        SELECT COUNT(DISTINCT user_id) FROM sessions
+        WHERE tenant_id = :tenant_id AND login_time >= :day AND login_time < date(:day, '+1 day')
+    ), :blocked)
+    ON CONFLICT (tenant_id, date) DO UPDATE SET
+        successful_logins = successful_logins + excluded.successful_logins,
+        failed_logins = failed_logins + excluded.failed_logins,
+        unique_users = excluded.unique_users,
+        blocked_attempts = blocked_attempts + excluded.blocked_attempts
+'''
+
+class LoginRollup:
+    """
+    Per-(tenant, day) login event accumulators with periodic flush.
+
+    Counts are deltas since the last flush; unique_users is recounted
+    from sessions for every (tenant, day) flushed.
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL_SECONDS):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {'events': 0, 'flushes': 0, 'rows_upserted': 0}
+
+    def record(self, tenant_id, user_id, outcome, when=None):
+        """Record one authentication event (outcome: success/failed/blocked)"""
+        if tenant_id is None or outcome not in OUTCOMES:
+            return
+        day = (when or datetime.utcnow()).date().isoformat()
+        key = (tenant_id, day)
+        with self._lock:
+            counts = self._pending.setdefault(key, {'success': 0, 'failed': 0, 'blocked': 0})
+            counts[outcome] += 1
+            self._stats['events'] += 1
+        self._ensure_started()
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stop.clear()
+                    self._thread = threading.Thread(target=self._run, name='login-rollup', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Login rollup flush failed: {e}")
+
+    def flush(self):
+        """Upsert accumulated deltas into login_stats"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            rows = [{'tenant_id': tenant_id, 'day': day, **c} for (tenant_id, day), c in pending.items()]
+        if not rows:
+            return 0
+
+        try:
+            with write_db() as conn:
+                conn.executemany(UPSERT_SQL, rows)
+                conn.commit()
+        except Exception:
+            # Put the deltas back so the next flush retries them
+            with self._lock:
+                for row in rows:
+                    counts = self._pending.setdefault((row['tenant_id'], row['day']), {'success': 0, 'failed': 0, 'blocked': 0})
+                    for outcome in OUTCOMES:
+                        counts[outcome] += row[outcome]
+            raise
+
+        with self._lock:
+            self._stats['flushes'] += 1
+            self._stats['rows_upserted'] += len(rows)
+        return len(rows)
+
+    def stop(self):
+        """Stop the flush thread and write out what is pending"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.flush_interval + 1)
+            self._thread = None
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending_keys'] = len(self._pending)
+        return stats
+
+rollup = LoginRollup()
+atexit.register(rollup.stop)
+
+def record_login_event(tenant_id, user_id, outcome):
+    """Record a login success, failure or blocked attempt"""
+    rollup.record(tenant_id, user_id, outcome)
+
+# =====================================
+# BACKFILL
+# =====================================
+
+def backfill_login_stats(days=None):
+    """
+    Rebuild login_stats from sessions and login activity logs.
+
+    Every login_stats row from the first day covered on is deleted and
+    rewritten from one grouped pass over the raw events, in one
+    transaction; days without events are left without a row. Successful
+    logins and unique users come from sessions; failures and blocks from
+    login_failed / login_blocked activity log entries.
+
+    Args:
+        days: Only rebuild the last N days (default: full history)
+
+    Returns:
+        Number of (tenant, day) rows written
+    """
+    since = (datetime.utcnow().date() - timedelta(days=days)).isoformat() if days else '0000-00-00'
+    with write_db() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('DELETE FROM login_stats WHERE date >= ?', (since,))
+        conn.execute('''
+            WITH events AS (
+                SELECT COALESCE(s.tenant_id, u.tenant_id) AS tenant_id, date(s.login_time) AS day,
+                       s.user_id, 1 AS success, 0 AS failed, 0 AS blocked
+                FROM sessions s LEFT JOIN users u ON s.user_id = u.id
+                WHERE s.login_time >= ?
+                UNION ALL
+                SELECT COALESCE(al.tenant_id, u.tenant_id), date(al.timestamp), NULL,
+                       0, al.action = 'login_failed', al.action = 'login_blocked'
+                FROM activity_logs al LEFT JOIN users u ON al.user_id = u.id
+                WHERE al.action IN ('login_failed', 'login_blocked') AND al.timestamp >= ?
+            )
+            INSERT INTO login_stats (tenant_id, date, successful_logins, failed_logins, unique_users, blocked_attempts)
+            SELECT tenant_id, day, SUM(success), SUM(failed), COUNT(DISTINCT user_id), SUM(blocked)
+            FROM events
+            WHERE tenant_id IS NOT NULL
+            GROUP BY tenant_id, day
+        ''', (since, since))
+        written = conn.execute('SELECT changes()').fetchone()[0]
+        conn.commit()
+    return written
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 2 and sys.argv[1] == 'backfill':
+        days = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        print(f"✓ Rebuilt {backfill_login_stats(days)} login_stats rows")
+    else:
+        print(__doc__)
@@ -0,0 +1,173 @@
+"""
+Schema Migrations
+=================
+Versioned, ordered schema changes applied on top of the base tables
+created by database.init_database().
+
+Each migration is (version, name, steps). A step is either an SQL string
+or a callable taking the connection. Steps must be idempotent so a
+migration interrupted mid-way can safely be re-run. Applied versions are
+recorded in the schema_version table.
+"""
+
+import sqlite3
+
+from counters import install_counters, install_tenant_summaries
+from activity_details import migrate_detail_columns
+from search import install_search
+from config_cache import install_config_versions
+from throttle import add_ip_limit_columns
+from session_cache import install_session_ends
+
+# =====================================
+# MIGRATIONS
+# =====================================
+
+MIGRATIONS = [
+    (1, 'hot_path_indexes', [
+        # get_activity_logs: filter by user or tenant, newest first
+        'CREATE INDEX IF NOT EXISTS idx_activity_logs_user_time ON activity_logs(user_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_activity_logs_tenant_time ON activity_logs(tenant_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_activity_logs_time ON activity_logs(timestamp)',
+        # get_dashboard_stats: anomaly counts per tenant / platform
+        'CREATE INDEX IF NOT EXISTS idx_activity_logs_anomaly ON activity_logs(tenant_id) WHERE is_anomaly = 1',
+
+        # get_alerts: tenant / resolved filters, newest first
+        'CREATE INDEX IF NOT EXISTS idx_alerts_tenant_resolved_time ON security_alerts(tenant_id, is_resolved, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_alerts_tenant_time ON security_alerts(tenant_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_alerts_resolved_time ON security_alerts(is_resolved, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_alerts_time ON security_alerts(created_at)',
+        # get_dashboard_stats: pending alert count
+        'CREATE INDEX IF NOT EXISTS idx_alerts_pending ON security_alerts(tenant_id) WHERE is_resolved = 0',
+
+        # get_user_sessions: user's sessions, newest first
+        'CREATE INDEX IF NOT EXISTS idx_sessions_user_time ON sessions(user_id, login_time)',
+        # get_dashboard_stats: active session counts
+        'CREATE INDEX IF NOT EXISTS idx_sessions_active ON sessions(tenant_id) WHERE is_active = 1',
+
+        # get_dashboard_stats / tenant listings: active user counts
+        'CREATE INDEX IF NOT EXISTS idx_users_active ON users(tenant_id) WHERE is_active = 1',
+        'CREATE INDEX IF NOT EXISTS idx_users_tenant_created ON users(tenant_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at)',
+
+        # get_platform_revenue / active tenant count
+        'CREATE INDEX IF NOT EXISTS idx_tenants_active_tier ON tenants(contract_tier) WHERE is_active = 1',
+
+        # get_login_stats / monthly login sums
+        'CREATE INDEX IF NOT EXISTS idx_login_stats_tenant_date ON login_stats(tenant_id, date)',
+        'CREATE INDEX IF NOT EXISTS idx_login_stats_date ON login_stats(date)',
+
+        'CREATE INDEX IF NOT EXISTS idx_roles_tenant ON roles(tenant_id)',
+        'CREATE INDEX IF NOT EXISTS idx_integrations_tenant ON integrations(tenant_id)',
+    ]),
+    (2, 'dashboard_counters', [
+        install_counters,
+    ]),
+    (3, 'tenant_summaries', [
+        install_tenant_summaries,
+    ]),
+    (4, 'login_stats_unique_day', [
+        # Merge duplicate (tenant, day) rollups into the oldest row, then enforce uniqueness
+        '''
+        UPDATE login_stats SET
+            successful_logins = (SELECT SUM(successful_logins) FROM login_stats d
+                                 WHERE d.tenant_id = login_stats.tenant_id AND d.date = login_stats.date),
+            failed_logins = (SELECT SUM(failed_logins) FROM login_stats d
+                             WHERE d.tenant_id = login_stats.tenant_id AND d.date = login_stats.date),
+            unique_users = (SELECT MAX(unique_users) FROM login_stats d
+                            WHERE d.tenant_id = login_stats.tenant_id AND d.date = login_stats.date),
+            blocked_attempts = (SELECT SUM(blocked_attempts) FROM login_stats d
+                                WHERE d.tenant_id = login_stats.tenant_id AND d.date = login_stats.date)
+        WHERE id IN (SELECT MIN(id) FROM login_stats GROUP BY tenant_id, date HAVING COUNT(*) > 1)
+        ''',
+        '''
+        DELETE FROM login_stats
+        WHERE tenant_id IS NOT NULL
+          AND id NOT IN (SELECT MIN(id) FROM login_stats GROUP BY tenant_id, date)
+        ''',
+        'DROP INDEX IF EXISTS idx_login_stats_tenant_date',
+        'CREATE UNIQUE INDEX IF NOT EXISTS ux_login_stats_tenant_date ON login_stats(tenant_id, date)',
+    ]),
+    (5, 'activity_detail_columns', [
+        # Promote method/location/device/status/behaviour features out of details JSON
+        migrate_detail_columns,
+    ]),
+    (6, 'full_text_search', [
+        # FTS5 indexes over alert and activity log text (no-op without FTS5)
+        install_search,
+    ]),
+    (7, 'session_expiry_index', [
+        # session_reaper: active sessions by age
+        'CREATE INDEX IF NOT EXISTS idx_sessions_active_login ON sessions(login_time) WHERE is_active = 1',
+    ]),
+    (8, 'config_versions', [
+        # config_cache: roles / tenant_settings writes bump a shared per-tenant version
+        install_config_versions,
+    ]),
+    (9, 'throttle_ip_limits', [
+        # Per-tenant overrides of the login throttle's IP limits (NULL: default, 0: off)
+        add_ip_limit_columns,
+    ]),
+    (10, 'sessions_tenant_login_index', [
+        # login_rollup: distinct users per (tenant, day) at flush time
+        'CREATE INDEX IF NOT EXISTS idx_sessions_tenant_login ON sessions(tenant_id, login_time)',
+    ]),
+    (11, 'session_ends', [
+        # session_cache: sessions ended by any worker, read by every worker's cache
+        install_session_ends,
+    ]),
+]
+
+# =====================================
+# RUNNER
+# =====================================
+
+def get_schema_version(conn):
+    """Get the highest applied migration version (0 if none)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+def apply_migrations(conn, migrations=None):
+    """
+    Apply all pending migrations in version order.
+
+    Each migration runs in its own transaction together with its
+    schema_version row, so it is either fully applied or not at all.
+
+    Returns:
+        List of applied version numbers
+    """
+    migrations = sorted(migrations or MIGRATIONS, key=lambda m: m[0])
+    current = get_schema_version(conn)
+    conn.commit()
+
+    applied = []
+    for version, name, steps in migrations:
+        if version <= current:
+            continue
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            # Another process may have migrated while we waited for the lock
+            if conn.execute('SELECT 1 FROM schema_version WHERE version = ?', (version,)).fetchone():
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)', (version, name))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        applied.append(version)
+        print(f"✓ Applied migration {version:03d}_{name}")
+    return applied
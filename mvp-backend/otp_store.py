@@ -0,0 +1,324 @@
+"""
+OTP Store
+=========
+Pending Nafath OTPs between login step 1 (initiate) and step 2 (verify).
+
+Two backends share one interface:
+
+    MemoryOTPStore   dict + expiry min-heap, for a single worker process
+    SQLiteOTPStore   small WAL database next to the main one, shared by
+                     every worker process on the host
+
+Both evict in expiry order, so abandoned logins are dropped as soon as
+their OTP expires. Both are also capped at max_entries: when full, the
+entry closest to expiry goes first. verify() checks the code and counts
+the attempt in one atomic step, so concurrent guesses cannot exceed
+max_attempts.
+
+Usage: python otp_store.py loadtest [logins]   (memory stays flat under abandoned logins)
+"""
+
+import os
+import sys
+import time
+import heapq
+import sqlite3
+import threading
+
+OTP_STORE_BACKEND = 'memory'     # 'memory' (one process) or 'sqlite' (shared across worker processes)
+OTP_TTL_SECONDS = 120
+OTP_MAX_ATTEMPTS = 3
+OTP_MAX_ENTRIES = 100000         # Pending logins kept at most (~40 MB in memory)
+OTP_STORE_FILE_SUFFIX = '.otp'   # SQLite backend: <database>.otp next to the main database
+
+# verify() outcomes
+OTP_OK = 'ok'
+OTP_MISSING = 'missing'
+OTP_EXPIRED = 'expired'
+OTP_INVALID = 'invalid'
+OTP_BLOCKED = 'blocked'
+
+class MemoryOTPStore:
+    """
+    Process-local OTP store: dict of pending logins plus a min-heap of
+    (expires_at, national_id, version) driving eviction.
+
+    Re-issuing an OTP leaves a stale heap item behind; the version tells
+    it apart, and the heap is compacted once stale items outnumber live ones.
+    """
+
+    def __init__(self, ttl_seconds=OTP_TTL_SECONDS, max_entries=OTP_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = {}     # national_id -> [otp, user_id, tenant_id, attempts, expires_at, version]
+        self._heap = []
+        self._version = 0
+        self._lock = threading.Lock()
+        self._stats = {'issued': 0, 'verified': 0, 'expired': 0, 'evicted': 0, 'blocked': 0}
+
+    def put(self, national_id, otp, user_id, tenant_id=None):
+        """Issue (or re-issue) the OTP for a login; attempts start at 0"""
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            if national_id not in self._entries and len(self._entries) >= self.max_entries:
+                self._evict_soonest()
+            self._version += 1
+            expires_at = now + self.ttl_seconds
+            self._entries[national_id] = [otp, user_id, tenant_id, 0, expires_at, self._version]
+            heapq.heappush(self._heap, (expires_at, national_id, self._version))
+            if len(self._heap) > 2 * len(self._entries) + 64:
+                self._heap = [(e[4], key, e[5]) for key, e in self._entries.items()]
+                heapq.heapify(self._heap)
+            self._stats['issued'] += 1
+
+    def verify(self, national_id, otp, max_attempts=OTP_MAX_ATTEMPTS):
+        """
+        Check an OTP and count the attempt atomically.
+
+        Returns:
+            (outcome, record) - outcome is OTP_OK / OTP_MISSING / OTP_EXPIRED /
+            OTP_INVALID / OTP_BLOCKED; record is a dict with otp, user_id,
+            tenant_id and attempts (None when missing)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(national_id)
+            if entry is None:
+                return OTP_MISSING, None
+            record = _record(entry)
+            if entry[4] <= now:
+                del self._entries[national_id]
+                self._stats['expired'] += 1
+                return OTP_EXPIRED, record
+            if entry[3] >= max_attempts:
+                del self._entries[national_id]
+                self._stats['blocked'] += 1
+                return OTP_BLOCKED, record
+            if otp != entry[0]:
+                entry[3] += 1
+                record['attempts'] = entry[3]
+                return OTP_INVALID, record
+            del self._entries[national_id]
+            self._stats['verified'] += 1
+            return OTP_OK, record
+
+    def discard(self, national_id):
+        with self._lock:
+            self._entries.pop(national_id, None)
+
+    def purge_expired(self):
+        """Drop every expired OTP; returns how many were dropped"""
+        with self._lock:
+            return self._purge(time.monotonic())
+
+    def _purge(self, now):
+        purged = 0
+        while self._heap and self._heap[0][0] <= now:
+            _, national_id, version = heapq.heappop(self._heap)
+            entry = self._entries.get(national_id)
+            if entry is not None and entry[5] == version:
+                del self._entries[national_id]
+                purged += 1
+        self._stats['expired'] += purged
+        return purged
+
+    def _evict_soonest(self):
+        while self._heap:
+            _, national_id, version = heapq.heappop(self._heap)
+            entry = self._entries.get(national_id)
+            if entry is not None and entry[5] == version:
+                del self._entries[national_id]
+                self._stats['evicted'] += 1
+                return
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'backend': 'memory', 'pending': len(self._entries), 'heap': len(self._heap)}
+
+def _record(entry):
+    return {'otp': entry[0], 'user_id': entry[1], 'tenant_id': entry[2], 'attempts': entry[3]}
+
+class SQLiteOTPStore:
+    """
+    Cross-process OTP store in its own small SQLite database (WAL mode).
+
+    Every operation is one short IMMEDIATE transaction, which serializes
+    verify() across processes. Expiry uses wall-clock time, which all
+    processes on the host share; an index on expires_at drives purges and
+    evictions. Each thread keeps its own connection.
+    """
+
+    CAP_CHECK_EVERY = 256    # Puts between max_entries checks (COUNT(*) is O(n))
+
+    def __init__(self, path, ttl_seconds=OTP_TTL_SECONDS, max_entries=OTP_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._stats = {'issued': 0, 'verified': 0, 'expired': 0, 'evicted': 0, 'blocked': 0}
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS pending_otps (
+                national_id TEXT PRIMARY KEY,
+                otp TEXT NOT NULL,
+                user_id INTEGER,
+                tenant_id INTEGER,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_pending_otps_expires ON pending_otps(expires_at)')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    def put(self, national_id, otp, user_id, tenant_id=None):
+        """Issue (or re-issue) the OTP for a login; attempts start at 0"""
+        now = time.time()
+        with self._lock:
+            self._puts += 1
+            check_cap = self._puts % self.CAP_CHECK_EVERY == 0
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            expired = conn.execute('DELETE FROM pending_otps WHERE expires_at <= ?', (now,)).rowcount
+            conn.execute('''
+                INSERT OR REPLACE INTO pending_otps (national_id, otp, user_id, tenant_id, attempts, expires_at)
+                VALUES (?, ?, ?, ?, 0, ?)
+            ''', (national_id, otp, user_id, tenant_id, now + self.ttl_seconds))
+            evicted = 0
+            if check_cap:
+                excess = conn.execute('SELECT COUNT(*) FROM pending_otps').fetchone()[0] - self.max_entries
+                if excess > 0:
+                    evicted = conn.execute('''
+                        DELETE FROM pending_otps WHERE national_id IN (
+                            SELECT national_id FROM pending_otps ORDER BY expires_at LIMIT ?
+                        )
+                    ''', (excess,)).rowcount
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        with self._lock:
+            self._stats['issued'] += 1
+            self._stats['expired'] += expired
+            self._stats['evicted'] += evicted
+
+    def verify(self, national_id, otp, max_attempts=OTP_MAX_ATTEMPTS):
+        """Check an OTP and count the attempt atomically (see MemoryOTPStore.verify)"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('''
+                SELECT otp, user_id, tenant_id, attempts, expires_at FROM pending_otps WHERE national_id = ?
+            ''', (national_id,)).fetchone()
+            if row is None:
+                outcome, record = OTP_MISSING, None
+            else:
+                record = _record(row)
+                if row[4] <= time.time():
+                    outcome = OTP_EXPIRED
+                elif row[3] >= max_attempts:
+                    outcome = OTP_BLOCKED
+                elif otp != row[0]:
+                    outcome = OTP_INVALID
+                    record['attempts'] += 1
+                    conn.execute('UPDATE pending_otps SET attempts = attempts + 1 WHERE national_id = ?', (national_id,))
+                else:
+                    outcome = OTP_OK
+                if outcome != OTP_INVALID:
+                    conn.execute('DELETE FROM pending_otps WHERE national_id = ?', (national_id,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        if outcome in (OTP_OK, OTP_EXPIRED, OTP_BLOCKED):
+            self._count({OTP_OK: 'verified', OTP_EXPIRED: 'expired', OTP_BLOCKED: 'blocked'}[outcome])
+        return outcome, record
+
+    def discard(self, national_id):
+        self._conn().execute('DELETE FROM pending_otps WHERE national_id = ?', (national_id,))
+
+    def purge_expired(self):
+        """Drop every expired OTP; returns how many were dropped"""
+        purged = self._conn().execute('DELETE FROM pending_otps WHERE expires_at <= ?', (time.time(),)).rowcount
+        self._count('expired', purged)
+        return purged
+
+    def __len__(self):
+        return self._conn().execute('SELECT COUNT(*) FROM pending_otps').fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        return {**stats, 'backend': 'sqlite', 'pending': len(self)}
+
+# =====================================
+# MODULE STORE
+# =====================================
+
+_store = None
+_store_lock = threading.Lock()
+
+def store_path():
+    from database import DATABASE_PATH
+    return os.path.abspath(DATABASE_PATH) + OTP_STORE_FILE_SUFFIX
+
+def get_otp_store():
+    """The configured OTP store (the SQLite backend follows the current database)"""
+    global _store
+    with _store_lock:
+        if OTP_STORE_BACKEND == 'sqlite':
+            path = store_path()
+            if not isinstance(_store, SQLiteOTPStore) or _store.path != path:
+                _store = SQLiteOTPStore(path)
+        elif not isinstance(_store, MemoryOTPStore):
+            _store = MemoryOTPStore()
+        return _store
+
+# =====================================
+# LOAD TEST
+# =====================================
+
+def load_test(logins=2000000, ttl_seconds=0.5, max_entries=50000):
+    """
+    Issue OTPs that are never verified (abandoned logins) and sample the
+    store size and traced Python memory as they go.
+    """
+    import tracemalloc
+
+    store = MemoryOTPStore(ttl_seconds=ttl_seconds, max_entries=max_entries)
+    tracemalloc.start()
+    start = time.perf_counter()
+    print(f"📊 {logins} abandoned logins, TTL {ttl_seconds}s, cap {max_entries}")
+    for i in range(logins):
+        store.put(f'1{i:09d}', '42', i, 1)
+        if (i + 1) % (logins // 10) == 0:
+            current, peak = tracemalloc.get_traced_memory()
+            print(f"  {i + 1:>9} issued  pending {len(store):>6}  heap {len(store._heap):>6}  "
+                  f"memory {current / 1e6:6.1f} MB (peak {peak / 1e6:.1f} MB)")
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    print(f"  {logins / elapsed:,.0f} puts/s  {store.stats()}")
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 2 and sys.argv[1] == 'loadtest':
+        load_test(int(sys.argv[2]) if len(sys.argv) > 2 else 2000000)
+    else:
+        print(__doc__)
@@ -0,0 +1,112 @@
+"""
+Full-Text Search
+================
+SQLite FTS5 indexes over security alerts and activity logs.
+
+alerts_fts indexes security_alerts.alert_type/description and
+activity_logs_fts indexes the text columns of activity_logs (action,
+method, location, device, status, leftover details). Both are external
+content tables - the text is not stored twice - kept in sync by triggers
+inside the writing transaction. Logs moved to the archive leave the index
+with them, so only the hot partition is searchable.
+
+Results are ranked by bm25 and paged with a (rank, id) keyset cursor.
+"""
+
+import sqlite3
+
+def _probe_fts5():
+    conn = sqlite3.connect(':memory:')
+    try:
+        conn.execute('CREATE VIRTUAL TABLE probe USING fts5(x)')
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+FTS5_AVAILABLE = _probe_fts5()
+if not FTS5_AVAILABLE:
+    print("Warning: SQLite FTS5 not available. Full-text search disabled.")
+
+# Arabic and Latin text; diacritics (incl. Arabic harakat) are ignored
+TOKENIZER = 'unicode61 remove_diacritics 2'
+
+# index -> (source table, indexed columns, columns whose update changes the index)
+SEARCH_INDEXES = {
+    'alerts_fts': ('security_alerts', ('alert_type', 'description'), 'alert_type, description'),
+    'activity_logs_fts': ('activity_logs', ('action', 'method', 'location', 'device', 'status', 'details'),
+                          'action, method, location, device, status, details'),
+}
+
+def _index_sql(index, table, columns, update_columns):
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f'NEW.{c}' for c in columns)
+    old_values = ', '.join(f'OLD.{c}' for c in columns)
+    insert = f'INSERT INTO {index} (rowid, {column_list}) VALUES (NEW.id, {new_values});'
+    delete = f"INSERT INTO {index} ({index}, rowid, {column_list}) VALUES ('delete', OLD.id, {old_values});"
+    return [
+        f'''CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5(
+            {column_list}, content='{table}', content_rowid='id', tokenize='{TOKENIZER}'
+        )''',
+        f'DROP TRIGGER IF EXISTS trg_{index}_insert',
+        f'DROP TRIGGER IF EXISTS trg_{index}_update',
+        f'DROP TRIGGER IF EXISTS trg_{index}_delete',
+        f'CREATE TRIGGER trg_{index}_insert AFTER INSERT ON {table} BEGIN {insert} END',
+        f'CREATE TRIGGER trg_{index}_update AFTER UPDATE OF {update_columns} ON {table} BEGIN {delete} {insert} END',
+        f'CREATE TRIGGER trg_{index}_delete AFTER DELETE ON {table} BEGIN {delete} END',
+    ]
+
+def install_search(conn):
+    """Create the FTS5 indexes and their sync triggers, then build them"""
+    if not FTS5_AVAILABLE:
+        return
+    for index, (table, columns, update_columns) in SEARCH_INDEXES.items():
+        for statement in _index_sql(index, table, columns, update_columns):
+            conn.execute(statement)
+    rebuild_search(conn)
+
+def ensure_search(conn):
+    """
+    Install the search indexes if FTS5 is available but they are missing.
+
+    Migration 006 is a no-op on an SQLite build without FTS5 and is still
+    recorded as applied, so a database migrated there never gets its
+    indexes from the migration once FTS5 is available.
+
+    Returns:
+        True if the indexes were installed
+    """
+    if not FTS5_AVAILABLE:
+        return False
+    existing = {row[0] for row in conn.execute(
+        f"SELECT name FROM sqlite_master WHERE name IN ({', '.join('?' * len(SEARCH_INDEXES))})", tuple(SEARCH_INDEXES))}
+    if existing == set(SEARCH_INDEXES):
+        return False
+    install_search(conn)
+    return True
+
+def rebuild_search(conn):
+    """Rebuild every FTS5 index from its source table (after bulk loads)"""
+    for index in SEARCH_INDEXES:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (index,)).fetchone():
+            conn.execute(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
+
+def match_query(text):
+    """
+    Turn free text into a safe FTS5 query: every word must match, and a
+    trailing * makes a word a prefix search. FTS5 syntax is never passed
+    through, so user input cannot cause a query syntax error.
+
+    Raises:
+        ValueError: No searchable words
+    """
+    terms = []
+    for word in (text or '').split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*').replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ('*' if prefix else ''))
+    if not terms:
+        raise ValueError('Empty search query')
+    return ' '.join(terms)
@@ -0,0 +1,400 @@
+"""
+Load-Test Seeder
+================
+Deterministic, production-sized synthetic data for load testing.
+
+Scale 1.0 is 200 tenants, 1M users, 5M sessions, 50M activity log rows and
+500k security alerts over the last 90 days; --scale multiplies all of them.
+The same --seed produces the same rows on a given day (timestamps are
+relative to midnight UTC).
+
+Behavior features come from the UBA model's own generators
+(uba-model/behavior_generators.py), so normal and anomalous activity has
+the distributions the model was trained on.
+
+Secondary indexes and triggers are dropped during the load and rebuilt
+afterwards, rows go in with executemany in large transactions, and the
+dashboard counters, tenant summaries and full-text indexes are rebuilt
+once at the end.
+
+Usage: python seeder.py [--scale 0.01] [--seed 42] [--db nafath_load.db] [--overwrite]
+"""
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'uba-model'))
+
+from behavior_generators import normal_behavior, anomalous_behavior
+import database
+from activity_details import BEHAVIOR_COLUMNS
+from counters import reconcile_counters, rebuild_tenant_summaries
+from search import rebuild_search
+
+# Row counts at scale 1.0
+SCALE_1 = {
+    'tenants': 200,
+    'users': 1_000_000,
+    'sessions': 5_000_000,
+    'activity_logs': 50_000_000,
+    'security_alerts': 500_000,
+}
+
+HISTORY_DAYS = 90
+BATCH_ROWS = 100_000         # Rows generated and inserted per executemany
+COMMIT_ROWS = 2_000_000      # Rows per transaction
+ANOMALY_RATE = 0.02          # Share of sessions with anomalous behavior
+RISK_MEDIUM = 60             # Same thresholds as uba_service
+RISK_HIGH = 80
+
+BULK_PRAGMAS = (
+    'PRAGMA journal_mode = OFF',
+    'PRAGMA synchronous = OFF',
+    'PRAGMA locking_mode = EXCLUSIVE',
+    'PRAGMA cache_size = -262144',     # 256 MB
+    'PRAGMA temp_store = MEMORY',
+)
+
+SEEDED_TABLES = ('tenants', 'roles', 'users', 'sessions', 'activity_logs', 'security_alerts',
+                 'integrations', 'tenant_settings', 'login_stats')
+
+ROLE_TEMPLATES = [
+    ('director', 'مدير', '["view_reports", "approve_requests", "manage_users"]'),
+    ('analyst', 'محلل', '["view_reports", "export_data"]'),
+    ('employee', 'موظف', '["view_documents", "send_messages"]'),
+    ('admin_staff', 'موظف إداري', '["view_reports", "manage_users", "view_logs"]'),
+]
+
+ACTIONS = ['behavior_check', 'view_document', 'edit_document', 'send_message', 'view_report', 'export_data']
+ACTION_WEIGHTS = [0.30, 0.30, 0.12, 0.15, 0.10, 0.03]
+
+LOCATIONS = ['الرياض', 'جدة', 'الدمام', 'Unknown', 'Foreign', 'Foreign']
+DEVICES = ['Chrome / Windows', 'Safari / macOS', 'Edge / Windows', 'Safari / iOS', 'Chrome / Android']
+TIERS = ['enterprise', 'professional', 'starter']
+COLORS = ['#00965e', '#1976d2', '#e65100', '#7b1fa2', '#00838f', '#c2185b']
+
+# =====================================
+# HELPERS
+# =====================================
+
+def _history_end():
+    """Midnight (UTC) today; generated history covers the HISTORY_DAYS before it"""
+    return int(time.time()) // 86400 * 86400
+
+def _timestamps(epochs):
+    """Unix seconds -> 'YYYY-MM-DD HH:MM:SS' strings, vectorized"""
+    return np.char.replace(np.asarray(epochs, dtype='int64').astype('datetime64[s]').astype(str), 'T', ' ')
+
+def _insert(conn, sql, rows, progress):
+    conn.executemany(sql, rows)
+    progress['rows'] += len(rows)
+    if progress['rows'] - progress['committed'] >= COMMIT_ROWS:
+        conn.execute('COMMIT')
+        conn.execute('BEGIN')
+        progress['committed'] = progress['rows']
+
+def _behavior(rng, n, anomalous):
+    """Behavior feature arrays for n sessions, anomalous where the mask is set"""
+    normal = normal_behavior(n, rng)
+    features = {name: np.asarray(values, dtype='float64') for name, values in normal.items()}
+    count = int(anomalous.sum())
+    if count:
+        for name, values in anomalous_behavior(count, rng).items():
+            features[name][anomalous] = values
+    return {name: np.rint(values).astype('int64') for name, values in features.items()}
+
+def _risk(rng, anomalous):
+    return np.where(anomalous, rng.randint(RISK_MEDIUM, 101, anomalous.size), rng.randint(0, 30, anomalous.size))
+
+def _drop_indexes_and_triggers(conn):
+    """Drop secondary indexes and triggers on seeded tables; return their SQL"""
+    placeholders = ', '.join('?' * len(SEEDED_TABLES))
+    saved = conn.execute(f'''
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND sql IS NOT NULL AND tbl_name IN ({placeholders})
+    ''', SEEDED_TABLES).fetchall()
+    for kind, name, _ in saved:
+        conn.execute(f'DROP {kind.upper()} {name}')
+    return [sql for _, _, sql in saved]
+
+# =====================================
+# GENERATORS
+# =====================================
+
+def seed_tenants(conn, rng, counts, ids):
+    n = counts['tenants']
+    today = datetime.utcfromtimestamp(_history_end()).date()
+    rows = []
+    for i in range(n):
+        tenant_id = ids['tenants'] + i + 1
+        start = today - timedelta(days=int(rng.randint(30, 900)))
+        rows.append((tenant_id, f'T{tenant_id:04d}', f'Government Entity {tenant_id}', f'جهة حكومية {tenant_id}',
+                     '🏛️', COLORS[i % len(COLORS)], TIERS[rng.choice(3, p=[0.2, 0.3, 0.5])],
+                     start.isoformat(), (start + timedelta(days=365 * int(rng.randint(1, 4)))).isoformat()))
+    conn.executemany('''
+        INSERT INTO tenants (id, code, name, name_ar, logo_emoji, color, contract_tier, contract_start, contract_end)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    tenant_ids = np.arange(ids['tenants'] + 1, ids['tenants'] + n + 1)
+
+    conn.executemany('''
+        INSERT INTO roles (id, tenant_id, name, name_ar, permissions) VALUES (?, ?, ?, ?, ?)
+    ''', [(ids['roles'] + i * len(ROLE_TEMPLATES) + r + 1, int(tenant_id), name, name_ar, permissions)
+          for i, tenant_id in enumerate(tenant_ids) for r, (name, name_ar, permissions) in enumerate(ROLE_TEMPLATES)])
+    conn.executemany('''
+        INSERT INTO tenant_settings (tenant_id, nafath_sso_enabled, two_factor_required, audit_logging, siem_alerts, mdr_enabled)
+        VALUES (?, 1, 1, 1, ?, ?)
+    ''', [(int(t), int(rng.random_sample() < 0.6), int(rng.random_sample() < 0.3)) for t in tenant_ids])
+    conn.executemany('''
+        INSERT INTO integrations (tenant_id, name, name_ar, type, icon, color, is_connected) VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(int(t), name, name_ar, type_, icon, '#28a745', int(rng.random_sample() < 0.5))
+          for t in tenant_ids for name, name_ar, type_, icon in (
+              ('Nafath SSO', 'نفاذ SSO', 'sso', 'fa-fingerprint'),
+              ('SIEM', 'SIEM', 'security', 'fa-database'),
+              ('Email Alerts', 'تنبيهات البريد', 'notification', 'fa-envelope'))])
+    return tenant_ids
+
+def seed_users(conn, rng, counts, ids, tenant_ids, progress):
+    """Users are spread over tenants with a long-tail (Zipf-like) size distribution"""
+    n = counts['users']
+    weights = 1.0 / np.arange(1, tenant_ids.size + 1) ** 0.8
+    sizes = rng.multinomial(n, weights / weights.sum())
+    user_tenants = np.repeat(tenant_ids, sizes)
+    now = _history_end()
+
+    for start in range(0, n, BATCH_ROWS):
+        end = min(start + BATCH_ROWS, n)
+        size = end - start
+        user_ids = np.arange(ids['users'] + start + 1, ids['users'] + end + 1)
+        tenants = user_tenants[start:end]
+        roles = ids['roles'] + (tenants - tenant_ids[0]) * len(ROLE_TEMPLATES) + rng.randint(1, len(ROLE_TEMPLATES) + 1, size)
+        created = _timestamps(now - rng.randint(HISTORY_DAYS * 86400, 730 * 86400, size))
+        active = rng.random_sample(size) < 0.97
+        _insert(conn, '''
+            INSERT INTO users (id, tenant_id, national_id, name, name_ar, email, role_id, is_active, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(u, t, str(2000000000 + u), f'User {u}', f'مستخدم {u}', f'user{u}@t{t:04d}.gov.sa', r, a, c, c)
+              for u, t, r, a, c in zip(user_ids.tolist(), tenants.tolist(), roles.tolist(), active.tolist(), created.tolist())],
+              progress)
+    return user_tenants
+
+def seed_sessions(conn, rng, counts, ids, user_tenants, progress):
+    """
+    Sessions with login times on working-hour (or anomalous) patterns.
+
+    Returns per-session arrays (user, tenant, login epoch, duration,
+    anomalous) that the activity and alert generators sample from.
+    """
+    n = counts['sessions']
+    now = _history_end()
+    day0 = now - HISTORY_DAYS * 86400
+    sessions = {
+        'user': np.empty(n, dtype='int32'),
+        'tenant': np.empty(n, dtype='int32'),
+        'login': np.empty(n, dtype='int64'),
+        'duration': np.empty(n, dtype='int32'),
+        'anomalous': np.empty(n, dtype=bool),
+        'features': {},
+    }
+
+    for start in range(0, n, BATCH_ROWS):
+        end = min(start + BATCH_ROWS, n)
+        size = end - start
+        user_index = rng.randint(0, user_tenants.size, size)
+        anomalous = rng.random_sample(size) < ANOMALY_RATE
+        behavior = _behavior(rng, size, anomalous)
+        # Weekdays (Sun-Thu) carry most of the traffic
+        days = rng.randint(0, HISTORY_DAYS, size)
+        weekday = (day0 // 86400 + days + 3) % 7        # 0 = Monday
+        weekend = np.isin(weekday, (4, 5))               # Friday / Saturday
+        days = np.where(weekend & (rng.random_sample(size) < 0.7), rng.randint(0, HISTORY_DAYS, size), days)
+        login = day0 + days * 86400 + behavior['login_hour'] * 3600 + rng.randint(0, 3600, size)
+        duration = np.maximum(behavior['session_duration'], 1)
+        logout = login + duration * 60
+        active = logout > now
+
+        sessions['user'][start:end] = ids['users'] + user_index + 1
+        sessions['tenant'][start:end] = user_tenants[user_index]
+        sessions['login'][start:end] = login
+        sessions['duration'][start:end] = duration
+        sessions['anomalous'][start:end] = anomalous
+        for name, values in behavior.items():
+            sessions['features'].setdefault(name, np.empty(n, dtype='int32'))[start:end] = values
+
+        location = behavior['location_id'].clip(0, len(LOCATIONS) - 1)
+        logout_text = np.where(active, None, _timestamps(logout))
+        _insert(conn, '''
+            INSERT INTO sessions (id, user_id, tenant_id, token, login_time, logout_time, ip_address, device_info,
+                                  location, location_id, is_new_device, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(s, u, t, f'seed-{s}', li, lo, f'10.{s % 250}.{s // 250 % 250}.{s % 199 + 1}', DEVICES[s % len(DEVICES)],
+               LOCATIONS[loc], loc, nd, a)
+              for s, u, t, li, lo, loc, nd, a in zip(
+                  range(ids['sessions'] + start + 1, ids['sessions'] + end + 1),
+                  sessions['user'][start:end].tolist(), sessions['tenant'][start:end].tolist(),
+                  _timestamps(login).tolist(), logout_text.tolist(), location.tolist(),
+                  behavior['is_new_device'].tolist(), active.tolist())],
+              progress)
+    return sessions
+
+def seed_activity_logs(conn, rng, counts, ids, sessions, progress):
+    """Activity inside sessions; behavior checks carry the session's features"""
+    n = counts['activity_logs']
+    n_sessions = sessions['login'].size
+    features = sessions['features']
+    action_ids = np.arange(len(ACTIONS))
+    for start in range(0, n, BATCH_ROWS):
+        size = min(BATCH_ROWS, n - start)
+        index = rng.randint(0, n_sessions, size)
+        anomalous = sessions['anomalous'][index]
+        actions = rng.choice(action_ids, size, p=ACTION_WEIGHTS)
+        actions = np.where(anomalous & (rng.random_sample(size) < 0.3), ACTIONS.index('export_data'), actions)
+        risk = _risk(rng, anomalous)
+        stamp = sessions['login'][index] + (rng.random_sample(size) * sessions['duration'][index] * 60).astype('int64')
+        session_ids = ids['sessions'] + index + 1
+
+        # Promoted detail columns: set on behavior checks only
+        check = (actions == ACTIONS.index('behavior_check')).tolist()
+        status = np.where(risk >= RISK_HIGH, 'threat', np.where(risk >= RISK_MEDIUM, 'suspicious', 'normal'))
+        detail_columns = [[value if c else None for value, c in zip(values.tolist(), check)]
+                          for values in [status] + [features[name][index] for name in BEHAVIOR_COLUMNS]]
+
+        _insert(conn, f'''
+            INSERT INTO activity_logs (user_id, tenant_id, session_id, action, risk_score, is_anomaly, timestamp,
+                                       status, {', '.join(BEHAVIOR_COLUMNS)})
+            VALUES ({', '.join('?' * (8 + len(BEHAVIOR_COLUMNS)))})
+        ''', list(zip(sessions['user'][index].tolist(), sessions['tenant'][index].tolist(), session_ids.tolist(),
+                       [ACTIONS[a] for a in actions.tolist()], risk.tolist(), (risk >= RISK_MEDIUM).tolist(),
+                       _timestamps(stamp).tolist(), *detail_columns)), progress)
+
+def seed_alerts(conn, rng, counts, sessions, ids, progress):
+    """Alerts raised from (mostly anomalous) sessions"""
+    n = counts['security_alerts']
+    anomalous_sessions = np.flatnonzero(sessions['anomalous'])
+    now = _history_end()
+    for start in range(0, n, BATCH_ROWS):
+        size = min(BATCH_ROWS, n - start)
+        pick_anomalous = (rng.random_sample(size) < 0.8) & (anomalous_sessions.size > 0)
+        index = np.where(pick_anomalous,
+                         anomalous_sessions[rng.randint(0, max(anomalous_sessions.size, 1), size)],
+                         rng.randint(0, sessions['login'].size, size))
+        risk = np.where(pick_anomalous, rng.randint(RISK_MEDIUM, 101, size), rng.randint(RISK_MEDIUM, 90, size))
+        created = sessions['login'][index] + rng.randint(0, 600, size)
+        resolved = (rng.random_sample(size) < 0.6) & (created < now - 86400)
+        _insert(conn, '''
+            INSERT INTO security_alerts (user_id, tenant_id, session_id, alert_type, severity, description,
+                                         is_resolved, created_at, resolved_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(u, t, s, 'high_risk_behavior' if r >= RISK_HIGH else 'suspicious_behavior',
+               'critical' if r >= RISK_HIGH else 'warning', f'Risk score: {r}.', res, c, c if res else None)
+              for u, t, s, r, res, c in zip(sessions['user'][index].tolist(), sessions['tenant'][index].tolist(),
+                                            (ids['sessions'] + index + 1).tolist(), risk.tolist(), resolved.tolist(),
+                                            _timestamps(created).tolist())],
+              progress)
+
+def seed_login_stats(conn, rng, sessions):
+    """Daily per-tenant rollups computed from the generated sessions"""
+    day = sessions['login'] // 86400
+    first_day = int(day.min()) if day.size else 0
+    keys = np.unique(np.stack([sessions['tenant'], day - first_day, sessions['user']]), axis=1)
+    pair, logins = np.unique(np.stack([sessions['tenant'], day - first_day]), axis=1, return_counts=True)
+    _, unique_users = np.unique(keys[:2], axis=1, return_counts=True)
+    failed = rng.binomial(logins, 0.03)
+    dates = _timestamps((pair[1] + first_day) * 86400)
+    conn.executemany('''
+        INSERT INTO login_stats (tenant_id, date, successful_logins, failed_logins, unique_users, blocked_attempts)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(t, d[:10], s, f, u, f // 2) for t, d, s, f, u in zip(
+        pair[0].tolist(), dates.tolist(), logins.tolist(), failed.tolist(), unique_users.tolist())])
+
+# =====================================
+# ENTRY POINT
+# =====================================
+
+def seed_load_test(path, scale=0.01, seed=42, overwrite=False):
+    """
+    Build a load-test database at `path`.
+
+    Args:
+        path: Target database file (must not exist unless overwrite)
+        scale: Multiplier on SCALE_1 row counts
+        seed: Random seed; equal seeds give identical data
+
+    Returns:
+        Dict of table -> rows generated
+    """
+    if os.path.exists(path):
+        if not overwrite:
+            raise FileExistsError(f'{path} exists (use --overwrite)')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    counts = {table: max(1, int(round(rows * scale))) for table, rows in SCALE_1.items()}
+    rng = np.random.RandomState(seed)
+    started = time.perf_counter()
+
+    # Schema, migrations and the demo tenants/users (so demo logins work)
+    random.seed(seed)
+    database.close_pool()
+    database.DATABASE_PATH = path
+    database.init_database()
+    database.seed_data()
+    database.close_pool()
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    for pragma in BULK_PRAGMAS:
+        conn.execute(pragma)
+    ids = {table: conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}').fetchone()[0]
+           for table in ('tenants', 'roles', 'users', 'sessions')}
+    saved_sql = _drop_indexes_and_triggers(conn)
+    progress = {'rows': 0, 'committed': 0}
+
+    def step(label, fn, *args):
+        t = time.perf_counter()
+        result = fn(*args)
+        print(f"✓ {label:<16} {time.perf_counter() - t:7.1f}s")
+        return result
+
+    conn.execute('BEGIN')
+    tenant_ids = step('tenants', seed_tenants, conn, rng, counts, ids)
+    user_tenants = step('users', seed_users, conn, rng, counts, ids, tenant_ids, progress)
+    sessions = step('sessions', seed_sessions, conn, rng, counts, ids, user_tenants, progress)
+    step('activity_logs', seed_activity_logs, conn, rng, counts, ids, sessions, progress)
+    step('security_alerts', seed_alerts, conn, rng, counts, sessions, ids, progress)
+    step('login_stats', seed_login_stats, conn, rng, sessions)
+    conn.execute('COMMIT')
+
+    def rebuild():
+        conn.execute('BEGIN')
+        for sql in saved_sql:
+            conn.execute(sql)
+        reconcile_counters(conn, fix=True)
+        rebuild_search(conn)
+        rebuild_tenant_summaries(conn, database._monthly_window_start())
+        conn.execute('COMMIT')
+        conn.execute('ANALYZE')
+    step('indexes/counters', rebuild)
+
+    conn.execute('PRAGMA locking_mode = NORMAL')
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.close()
+    print(f"✅ Seeded {path} in {time.perf_counter() - started:.1f}s: "
+          + ', '.join(f'{count:,} {table}' for table, count in counts.items()))
+    return counts
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Seed a production-sized load-test database')
+    parser.add_argument('--scale', type=float, default=0.01, help='Multiplier on the scale-1.0 row counts')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', default='nafath_load.db')
+    parser.add_argument('--overwrite', action='store_true', help='Replace an existing database file')
+    args = parser.parse_args()
+    seed_load_test(args.db, scale=args.scale, seed=args.seed, overwrite=args.overwrite)
@@ -0,0 +1,212 @@
+"""
+Session Cache
+=============
+In-process TTL/LRU cache of active sessions for require_auth.
+
+Every authenticated request used to look its session up in SQLite. An
+entry holds the session's auth context - the session row and its user
+row as tuples (see database.get_auth_context). The cache is filled when a session
+is created (or on first lookup), and an entry is dropped the moment the
+session is ended in this process, so logout takes effect on the next
+request. Entries are keyed by the SHA-256 of the token, so raw
+bearer tokens are not kept as dictionary keys.
+
+Sessions ended by another worker process are picked up through the
+session_ends table: triggers on sessions append the id of every session
+that is deactivated or deleted, in the same transaction, and each cache
+reads the rows appended since its last look at most every check_interval
+seconds and drops those sessions. Rows older than the TTL are pruned
+(prune_session_ends); any entry they could still affect has expired.
+"""
+
+import sys
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+SESSION_ENDS_TABLES = (
+    '''CREATE TABLE IF NOT EXISTS session_ends (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        ended_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_session_ends_time ON session_ends(ended_at)',
+    'DROP TRIGGER IF EXISTS trg_session_ends_update',
+    'DROP TRIGGER IF EXISTS trg_session_ends_delete',
+    '''CREATE TRIGGER trg_session_ends_update AFTER UPDATE OF is_active ON sessions
+        WHEN OLD.is_active = 1 AND NEW.is_active = 0
+        BEGIN INSERT INTO session_ends (session_id) VALUES (NEW.id); END''',
+    '''CREATE TRIGGER trg_session_ends_delete AFTER DELETE ON sessions
+        WHEN OLD.is_active = 1
+        BEGIN INSERT INTO session_ends (session_id) VALUES (OLD.id); END''',
+)
+
+def install_session_ends(conn):
+    """Create session_ends and the triggers that append ended sessions to it"""
+    for statement in SESSION_ENDS_TABLES:
+        conn.execute(statement)
+
+def read_session_ends(conn, after_seq):
+    """
+    Returns:
+        (last seq, ids of sessions ended after after_seq); with after_seq
+        None only the last seq, to start from
+    """
+    if after_seq is None:
+        return conn.execute('SELECT COALESCE(MAX(seq), 0) FROM session_ends').fetchone()[0], []
+    rows = conn.execute('SELECT seq, session_id FROM session_ends WHERE seq > ? ORDER BY seq', (after_seq,)).fetchall()
+    return (rows[-1][0] if rows else after_seq), [row[1] for row in rows]
+
+def prune_session_ends(conn, ttl_seconds):
+    """Delete session_ends rows no cache entry can still need (older than the TTL, plus a minute)"""
+    conn.execute("DELETE FROM session_ends WHERE ended_at < datetime('now', ?)", (f'-{int(ttl_seconds) + 60} seconds',))
+
+def token_key(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _size(value):
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sys.getsizeof(k) + _size(v) for k, v in value.items())
+    if isinstance(value, tuple):
+        return sys.getsizeof(value) + sum(_size(item) for item in value)
+    return sys.getsizeof(value)
+
+def _entry_size(key, session):
+    """Approximate bytes held by one cached session (nested dicts / tuples included)"""
+    return sys.getsizeof(key) + _size(session)
+
+class SessionCache:
+    """
+    Thread-safe LRU of token hash -> session row with a TTL.
+
+    Args:
+        ttl_seconds: Max age of an entry before it is re-read from the database
+        max_bytes: Approximate memory budget; least recently used entries go first
+        load_ends: Callable(after_seq) -> (last seq, ended session ids) reading
+                   session_ends (None: sessions ended elsewhere wait for the TTL)
+        check_interval: Seconds between session_ends checks (0: on every read)
+    """
+
+    def __init__(self, ttl_seconds=300, max_bytes=16 * 1024 * 1024, load_ends=None, check_interval=0):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.load_ends = load_ends
+        self.check_interval = check_interval
+        self._entries = OrderedDict()    # key -> (expires_at, size, session, session_id)
+        self._keys = {}                  # session_id -> key
+        self._bytes = 0
+        self._generation = 0             # Bumped by every invalidation
+        self._seq = None                 # Last session_ends row seen
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0,
+                       'shared_checks': 0, 'shared_invalidations': 0}
+
+    def get(self, token):
+        """Cached session for token, or None (miss or expired)"""
+        key = token_key(token)
+        self._check_shared()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            session = entry[2]
+            return dict(session) if isinstance(session, dict) else session
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def _check_shared(self):
+        """Drop the sessions other processes ended since the last check"""
+        if self.load_ends is None:
+            return
+        now = time.monotonic()
+        checked_at = self._checked_at    # Unlocked read: the hot path only takes the lock when a check is due
+        if checked_at is not None and now - checked_at < self.check_interval:
+            return
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            self._stats['shared_checks'] += 1
+            after_seq = self._seq
+        seq, ended = self.load_ends(after_seq)
+        with self._lock:
+            if self._seq != after_seq:
+                return                   # Another thread checked meanwhile
+            self._seq = seq
+            if ended:
+                self._generation += 1
+            for session_id in ended:
+                key = self._keys.get(session_id)
+                if key is not None:
+                    self._remove(key)
+                    self._stats['shared_invalidations'] += 1
+
+    def put(self, token, session, generation=None, session_id=None):
+        """
+        Cache an active session (a copy is stored; tuples are stored as-is).
+
+        Pass the generation read before loading the session from the
+        database: if any session was invalidated since, the row may already
+        be stale and is not cached.
+        """
+        key = token_key(token)
+        session = dict(session) if isinstance(session, dict) else session
+        size = _entry_size(key, session)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, size, session, session_id)
+            if session_id is not None:
+                self._keys[session_id] = key
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def invalidate(self, token):
+        """Drop the session for token (logout / session end)"""
+        key = token_key(token)
+        with self._lock:
+            self._generation += 1
+            if key in self._entries:
+                self._remove(key)
+                self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._keys.clear()
+            self._bytes = 0
+            self._seq = self._checked_at = None
+
+    def _remove(self, key):
+        _, size, _, session_id = self._entries.pop(key)
+        self._bytes -= size
+        if session_id is not None:
+            self._keys.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,97 @@
+"""
+Session Reaper
+==============
+Periodic bulk expiry of sessions nobody logged out of.
+
+JWTs stop verifying after TOKEN_EXPIRY_HOURS, but their sessions rows
+stayed is_active = 1 forever, inflating active-session counts. The reaper
+deactivates every session older than its tenant's session_timeout_minutes
+(never longer than the token lifetime) with set-based UPDATEs in bounded
+batches, so a backlog never holds the write lock for long.
+
+Usage: python session_reaper.py   (reap once and exit)
+"""
+
+import atexit
+import threading
+import time
+
+from database import expire_sessions
+from auth import TOKEN_EXPIRY_HOURS
+
+REAP_INTERVAL_SECONDS = 60
+REAP_BATCH_SIZE = 1000
+
+class SessionReaper:
+    """
+    Background thread expiring stale sessions every interval.
+
+    Args:
+        interval: Seconds between reaps
+        batch_size: Max sessions expired per UPDATE (one write transaction)
+        max_minutes: Longest any session may live (token lifetime)
+    """
+
+    def __init__(self, interval=REAP_INTERVAL_SECONDS, batch_size=REAP_BATCH_SIZE,
+                 max_minutes=TOKEN_EXPIRY_HOURS * 60):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_minutes = max_minutes
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {'runs': 0, 'batches': 0, 'reaped': 0, 'last_reaped': 0, 'last_run': None}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='session-reaper', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"Session reap failed: {e}")
+
+    def reap(self):
+        """
+        Expire stale sessions batch by batch until none are left.
+
+        Returns:
+            Number of sessions expired
+        """
+        reaped = batches = 0
+        while True:
+            count = expire_sessions(self.max_minutes, self.batch_size)
+            reaped += count
+            batches += 1
+            if count < self.batch_size:
+                break
+        with self._lock:
+            self._stats['runs'] += 1
+            self._stats['batches'] += batches
+            self._stats['reaped'] += reaped
+            self._stats['last_reaped'] = reaped
+            self._stats['last_run'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        return reaped
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.interval + 1)
+            self._thread = None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['running'] = self._thread is not None and self._thread.is_alive()
+        return stats
+
+reaper = SessionReaper()
+atexit.register(reaper.stop)
+
+if __name__ == '__main__':
+    print(f"✓ Expired {reaper.reap()} stale sessions")
@@ -0,0 +1,259 @@
+"""
+Login Throttling
+================
+In-memory brute-force throttling for the Nafath login endpoints.
+
+Checks run before any database work: a rejected request costs a few
+dictionary lookups. Counters are sliding windows keyed by national ID,
+client IP and tenant:
+
+    national ID   OTP requests per minute; failed verifications per
+                  FAILURE_WINDOW_SECONDS, limited by the tenant's
+                  tenant_settings.max_failed_attempts
+    IP            requests per minute; failures (wrong OTPs, unknown
+                  national IDs) per FAILURE_WINDOW_SECONDS
+    tenant        login requests per minute across all its users
+
+The tenant of a national ID, and that tenant's limits, are learned when a
+login gets past the throttle and looks the user up, so the reject path
+never needs SQL. A settings change applies from the tenant's next login.
+
+The IP limits applied to a request are those of the tenant of its
+national ID: tenant_settings.ip_requests_per_minute and ip_failures_limit
+override REQUESTS_PER_IP and FAILURES_PER_IP (NULL keeps the default, 0
+turns the limit off), so a tenant whose users share a NAT address can
+raise or drop them. Requests under a disabled limit are not counted
+against the IP. The IP is request.remote_addr, which app.py resolves
+from X-Forwarded-For behind TRUSTED_PROXY_COUNT reverse proxies.
+
+Each counter family is an LRU capped at THROTTLE_MAX_KEYS keys; idle
+keys are evicted as new ones arrive. Counters are per process.
+"""
+
+import math
+import time
+import threading
+from collections import OrderedDict
+
+THROTTLE_ENABLED = True
+THROTTLE_MAX_KEYS = 100000            # Per counter family (~350 bytes per key)
+
+RATE_WINDOW_SECONDS = 60
+LOGIN_REQUESTS_PER_NATIONAL_ID = 5    # OTPs issued per national ID per minute
+REQUESTS_PER_IP = 60                  # Login + verify requests per IP per minute (None / 0: off)
+REQUESTS_PER_TENANT = 1200            # Login requests per tenant per minute
+
+FAILURE_WINDOW_SECONDS = 900
+DEFAULT_MAX_FAILED_ATTEMPTS = 3       # Until the tenant's own setting is known
+FAILURES_PER_IP = 20                  # None / 0: off
+
+# tenant_settings columns overriding the IP limits (NULL: default, 0: off)
+IP_LIMIT_COLUMNS = (('ip_requests_per_minute', 'INTEGER'), ('ip_failures_limit', 'INTEGER'))
+
+REJECTIONS = {
+    'national_id_locked': ('too_many_failed_attempts', 'تم تجاوز الحد الأقصى للمحاولات، حاول لاحقاً'),
+    'ip_locked': ('too_many_failed_attempts', 'تم تجاوز الحد الأقصى للمحاولات، حاول لاحقاً'),
+    'national_id_rate': ('too_many_requests', 'طلبات كثيرة، حاول لاحقاً'),
+    'ip_rate': ('too_many_requests', 'طلبات كثيرة، حاول لاحقاً'),
+    'tenant_rate': ('too_many_requests', 'طلبات كثيرة، حاول لاحقاً'),
+}
+
+class SlidingWindowCounter:
+    """
+    Sliding-window counts per key in O(1) memory per key.
+
+    Each key keeps the counts of the current and previous fixed window;
+    the sliding count weights the previous window by how much of it still
+    overlaps. Keys are kept in LRU order and evicted once idle for two
+    windows or when max_keys is exceeded.
+    """
+
+    def __init__(self, window_seconds, max_keys=THROTTLE_MAX_KEYS):
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self._entries = OrderedDict()    # key -> [window index, previous count, current count]
+        self.evictions = 0
+
+    def count(self, key, now):
+        """Sliding count for key (no entry is created)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return 0.0
+        index, offset = divmod(now, self.window_seconds)
+        previous, current = self._counts(entry, int(index))
+        return previous * (1 - offset / self.window_seconds) + current
+
+    def retry_after(self, now):
+        """Seconds until the current window ends (when counts next drop)"""
+        return max(1, math.ceil(self.window_seconds - now % self.window_seconds))
+
+    def hit(self, key, now, n=1):
+        index = int(now // self.window_seconds)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [index, 0, 0]
+        else:
+            entry[1], entry[2] = self._counts(entry, index)
+            entry[0] = index
+            self._entries.move_to_end(key)
+        entry[2] += n
+        self._evict(index)
+
+    def reset(self, key):
+        self._entries.pop(key, None)
+
+    @staticmethod
+    def _counts(entry, index):
+        if index == entry[0]:
+            return entry[1], entry[2]
+        if index == entry[0] + 1:
+            return entry[2], 0
+        return 0, 0
+
+    def _evict(self, index):
+        # Least recently used first: stop at the first key that is still live
+        for _ in range(8):
+            key, entry = next(iter(self._entries.items()))
+            if entry[0] >= index - 1:
+                break
+            del self._entries[key]
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+class LoginThrottle:
+    """Login and OTP verification throttling (see module docstring)"""
+
+    def __init__(self, max_keys=THROTTLE_MAX_KEYS):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._id_requests = SlidingWindowCounter(RATE_WINDOW_SECONDS, max_keys)
+        self._ip_requests = SlidingWindowCounter(RATE_WINDOW_SECONDS, max_keys)
+        self._tenant_requests = SlidingWindowCounter(RATE_WINDOW_SECONDS, max_keys)
+        self._id_failures = SlidingWindowCounter(FAILURE_WINDOW_SECONDS, max_keys)
+        self._ip_failures = SlidingWindowCounter(FAILURE_WINDOW_SECONDS, max_keys)
+        self._tenants = OrderedDict()     # national_id -> tenant_id
+        self._limits = {}                 # tenant_id -> (max_failed_attempts, requests per IP, failures per IP)
+        self._stats = {'checked': 0, 'allowed': 0, 'rejected': 0, 'failures': 0}
+        self._rejected_by_reason = dict.fromkeys(REJECTIONS, 0)
+        self._rejected_by_tenant = {}
+
+    def check_login(self, national_id, ip_address):
+        """Throttle /api/auth/login (issues an OTP); returns None or a rejection (see _reject)"""
+        return self._check(national_id, ip_address, login=True)
+
+    def check_verify(self, national_id, ip_address):
+        """Throttle /api/auth/verify; returns None or a rejection (see _reject)"""
+        return self._check(national_id, ip_address, login=False)
+
+    def _check(self, national_id, ip_address, login):
+        if not THROTTLE_ENABLED:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._stats['checked'] += 1
+            tenant_id = self._tenants.get(national_id)
+            max_failed, requests_per_ip, failures_per_ip = self._tenant_limits(tenant_id)
+            if self._id_failures.count(national_id, now) >= max_failed:
+                return self._reject('national_id_locked', self._id_failures, now, tenant_id)
+            if failures_per_ip and self._ip_failures.count(ip_address, now) >= failures_per_ip:
+                return self._reject('ip_locked', self._ip_failures, now, tenant_id)
+            if requests_per_ip and self._ip_requests.count(ip_address, now) >= requests_per_ip:
+                return self._reject('ip_rate', self._ip_requests, now, tenant_id)
+            if login:
+                if self._id_requests.count(national_id, now) >= LOGIN_REQUESTS_PER_NATIONAL_ID:
+                    return self._reject('national_id_rate', self._id_requests, now, tenant_id)
+                if tenant_id is not None and self._tenant_requests.count(tenant_id, now) >= REQUESTS_PER_TENANT:
+                    return self._reject('tenant_rate', self._tenant_requests, now, tenant_id)
+                self._id_requests.hit(national_id, now)
+                if tenant_id is not None:
+                    self._tenant_requests.hit(tenant_id, now)
+            if requests_per_ip:
+                self._ip_requests.hit(ip_address, now)
+            self._stats['allowed'] += 1
+            return None
+
+    def _tenant_limits(self, tenant_id):
+        """(max_failed_attempts, requests per IP, failures per IP) for a tenant (None: unknown)"""
+        max_failed, requests_per_ip, failures_per_ip = self._limits.get(tenant_id, (None, None, None))
+        return (max_failed or DEFAULT_MAX_FAILED_ATTEMPTS,
+                REQUESTS_PER_IP if requests_per_ip is None else requests_per_ip,
+                FAILURES_PER_IP if failures_per_ip is None else failures_per_ip)
+
+    def _reject(self, reason, counter, now, tenant_id):
+        """
+        Returns:
+            Dict with reason, error, error_ar and retry_after (seconds)
+        """
+        self._stats['rejected'] += 1
+        self._rejected_by_reason[reason] += 1
+        if tenant_id is not None:
+            self._rejected_by_tenant[tenant_id] = self._rejected_by_tenant.get(tenant_id, 0) + 1
+        error, error_ar = REJECTIONS[reason]
+        return {'reason': reason, 'error': error, 'error_ar': error_ar, 'retry_after': counter.retry_after(now)}
+
+    def learn(self, national_id, tenant_id, settings=None):
+        """
+        Remember a looked-up user's tenant and the tenant's limits.
+
+        Args:
+            settings: The tenant's tenant_settings row (max_failed_attempts
+                      and the IP_LIMIT_COLUMNS overrides), if it has one
+        """
+        with self._lock:
+            self._tenants[national_id] = tenant_id
+            self._tenants.move_to_end(national_id)
+            while len(self._tenants) > self.max_keys:
+                self._tenants.popitem(last=False)
+            if settings:
+                self._limits[tenant_id] = (settings.get('max_failed_attempts'),
+                                           settings.get('ip_requests_per_minute'),
+                                           settings.get('ip_failures_limit'))
+
+    def record_failure(self, national_id, ip_address):
+        """Count a failed attempt (wrong OTP, or unknown national ID when national_id is None)"""
+        now = time.monotonic()
+        with self._lock:
+            self._stats['failures'] += 1
+            failures_per_ip = self._tenant_limits(self._tenants.get(national_id))[2]
+            if national_id is not None:
+                self._id_failures.hit(national_id, now)
+            if failures_per_ip:
+                self._ip_failures.hit(ip_address, now)
+
+    def record_success(self, national_id):
+        """Clear a national ID's failures after a successful login"""
+        with self._lock:
+            self._id_failures.reset(national_id)
+
+    def stats(self):
+        with self._lock:
+            counters = {
+                'national_id_requests': self._id_requests,
+                'ip_requests': self._ip_requests,
+                'tenant_requests': self._tenant_requests,
+                'national_id_failures': self._id_failures,
+                'ip_failures': self._ip_failures,
+            }
+            return {
+                **self._stats,
+                'enabled': THROTTLE_ENABLED,
+                'ip_limits': {'requests_per_minute': REQUESTS_PER_IP, 'failures': FAILURES_PER_IP},
+                'rejected_by_reason': dict(self._rejected_by_reason),
+                'rejected_by_tenant': {str(tenant): n for tenant, n in self._rejected_by_tenant.items()},
+                'tracked_keys': {name: len(counter) for name, counter in counters.items()},
+                'evictions': sum(counter.evictions for counter in counters.values()),
+                'known_national_ids': len(self._tenants),
+            }
+
+def add_ip_limit_columns(conn):
+    """ALTER TABLE in any IP_LIMIT_COLUMNS tenant_settings is missing (idempotent)"""
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(tenant_settings)')}
+    for name, sql_type in IP_LIMIT_COLUMNS:
+        if name not in existing:
+            conn.execute(f'ALTER TABLE tenant_settings ADD COLUMN {name} {sql_type}')
+
+throttle = LoginThrottle()
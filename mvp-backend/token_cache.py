@@ -0,0 +1,87 @@
+"""
+Token Cache
+===========
+In-process cache of verified JWT payloads for require_auth.
+
+A session presents the same bearer token on every request, and each one
+used to pay for a full jwt.decode (base64, JSON parse, HMAC-SHA256). A
+token is verified once; its payload is then served from the cache until
+the token's own `exp`, until logout, or until it is pushed out by the
+least-recently-used bound. Entries are keyed by the SHA-256 of the token,
+so only a token that hashes to the same digest can hit an entry.
+
+The cache only replaces signature and expiry checks. require_auth still
+checks that the session is active, so a session ended elsewhere is
+refused even while its payload is cached.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+from session_cache import token_key
+
+class TokenCache:
+    """
+    Thread-safe LRU of token hash -> verified payload, each entry expiring at the payload's exp.
+
+    Args:
+        max_entries: Most payloads kept; least recently used entries go first
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()    # key -> (exp, payload)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0}
+
+    def get(self, token):
+        """Cached payload for token (a copy), or None (miss or past exp)"""
+        key = token_key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return dict(entry[1])
+
+    def put(self, token, payload):
+        """Cache a payload that jwt.decode has just verified (tokens without exp are not cached)"""
+        exp = payload.get('exp')
+        if not isinstance(exp, (int, float)):
+            return
+        key = token_key(token)
+        with self._lock:
+            self._entries[key] = (exp, dict(payload))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, token):
+        """Drop the payload for token (logout)"""
+        key = token_key(token)
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+            }
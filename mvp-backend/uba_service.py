@@ -20,23 +20,23 @@ except ImportError:
     print("Warning: UBA model not available. Using fallback scoring.")
 
 from database import log_activity, create_alert, get_user_sessions, get_activity_logs
+from feature_store import record_features
 
 # Risk thresholds
 RISK_LOW = 30
 RISK_MEDIUM = 60
 RISK_HIGH = 80
 
-def analyze_behavior(user_id, session_data, action_data=None):
+def score_behavior(session_data):
     """
-    Analyze user behavior and return risk score.
+    Score a session's behaviour without writing anything.
     
     Args:
-        user_id: User ID
         session_data: Dict with session info (login_hour, location, device, etc.)
-        action_data: Optional dict with current action details
     
     Returns:
-        Dict with risk_score, status, and recommendations
+        Dict with behavior (model features), risk_score, anomaly_score,
+        status, status_ar, is_anomaly and action
     """
     # Prepare features for the model
     behavior = {
@@ -79,54 +79,95 @@ def analyze_behavior(user_id, session_data, action_data=None):
         status_ar = 'سلوك مشبوه'
         alert_action = 'monitor'
     
+    return {
+        'behavior': behavior,
+        'risk_score': risk_score,
+        'anomaly_score': anomaly_score,
+        'status': status,
+        'status_ar': status_ar,
+        'is_anomaly': is_anomaly,
+        'action': alert_action
+    }
+
+def log_details(assessment):
+    """activity_logs details for a scored check"""
+    return {
+        'behavior': assessment['behavior'],
+        'risk_score': assessment['risk_score'],
+        'status': assessment['status']
+    }
+
+def alert_for(risk_score):
+    """(alert_type, severity, description) for a risk score, or None below RISK_MEDIUM"""
+    if risk_score >= RISK_HIGH:
+        return ('high_risk_behavior', 'critical',
+                f'Risk score: {risk_score}. Behavior flagged as potentially malicious.')
+    if risk_score >= RISK_MEDIUM:
+        return ('suspicious_behavior', 'warning',
+                f'Risk score: {risk_score}. Investigating unusual behavior.')
+    return None
+
+def analysis_result(assessment, log_id, alert_id):
+    """analyze_behavior() response for a scored and persisted check"""
+    return {
+        'risk_score': assessment['risk_score'],
+        'anomaly_score': assessment['anomaly_score'],
+        'status': assessment['status'],
+        'status_ar': assessment['status_ar'],
+        'is_anomaly': assessment['is_anomaly'],
+        'action': assessment['action'],
+        'log_id': log_id,
+        'alert_id': alert_id,
+        'features_analyzed': assessment['behavior'],
+        'model': 'Nafath-UBA-v2.1' if UBA_AVAILABLE else 'Fallback'
+    }
+
+def analyze_behavior(user_id, session_data, action_data=None):
+    """
+    Analyze user behavior and return risk score.
+    
+    Args:
+        user_id: User ID
+        session_data: Dict with session info (login_hour, location, device, etc.)
+        action_data: Optional dict with current action details
+    
+    Returns:
+        Dict with risk_score, status, and recommendations
+    """
+    assessment = score_behavior(session_data)
+    risk_score = assessment['risk_score']
+    
     # Log to database
     session_id = session_data.get('session_id')
+    tenant_id = session_data.get('tenant_id')
     action = action_data.get('action', 'behavior_check') if action_data else 'behavior_check'
     
     log_id = log_activity(
         user_id=user_id,
         session_id=session_id,
         action=action,
-        details={
-            'behavior': behavior,
-            'risk_score': risk_score,
-            'status': status
-        },
+        details=log_details(assessment),
         risk_score=risk_score,
-        is_anomaly=is_anomaly
+        is_anomaly=assessment['is_anomaly'],
+        tenant_id=tenant_id
     )
+    record_features(log_id, user_id, tenant_id, risk_score, assessment['behavior'])
     
     # Create security alert if needed
     alert_id = None
-    if risk_score >= RISK_HIGH:
+    alert = alert_for(risk_score)
+    if alert:
+        alert_type, severity, description = alert
         alert_id = create_alert(
             user_id=user_id,
             session_id=session_id,
-            alert_type='high_risk_behavior',
-            severity='critical',
-            description=f'Risk score: {risk_score}. Behavior flagged as potentially malicious.'
-        )
-    elif risk_score >= RISK_MEDIUM:
-        alert_id = create_alert(
-            user_id=user_id,
-            session_id=session_id,
-            alert_type='suspicious_behavior',
-            severity='warning',
-            description=f'Risk score: {risk_score}. Investigating unusual behavior.'
+            alert_type=alert_type,
+            severity=severity,
+            description=description,
+            tenant_id=tenant_id
         )
     
-    return {
-        'risk_score': risk_score,
-        'anomaly_score': anomaly_score,
-        'status': status,
-        'status_ar': status_ar,
-        'is_anomaly': is_anomaly,
-        'action': alert_action,
-        'log_id': log_id,
-        'alert_id': alert_id,
-        'features_analyzed': behavior,
-        'model': 'Nafath-UBA-v2.1' if UBA_AVAILABLE else 'Fallback'
-    }
+    return analysis_result(assessment, log_id, alert_id)
 
 def calculate_fallback_score(behavior):
     """
@@ -216,13 +257,25 @@ def get_user_risk_profile(user_id):
         'recent_logs_count': len(logs)
     }
 
-def analyze_login(user_id, session_id, login_hour, location, location_id, is_new_device, failed_attempts=0):
+def analyze_login(user_id, session_id, login_hour, location, location_id, is_new_device, failed_attempts=0,
+                  tenant_id=None):
     """
     Analyze login behavior specifically.
     Called when user logs in.
     """
-    session_data = {
-        'session_id': session_id,
+    session_data = login_session_data(login_hour, location_id, is_new_device, failed_attempts)
+    session_data.update({'session_id': session_id, 'tenant_id': tenant_id})
+    
+    action_data = {
+        'action': 'login',
+        'location': location
+    }
+    
+    return analyze_behavior(user_id, session_data, action_data)
+
+def login_session_data(login_hour, location_id, is_new_device, failed_attempts=0):
+    """UBA session data for a login (no actions yet)"""
+    return {
         'login_hour': login_hour,
         'location_id': location_id,
         'is_new_device': is_new_device,
@@ -232,10 +285,3 @@ def analyze_login(user_id, session_id, login_hour, location, location_id, is_new
         'failed_logins': failed_attempts,
         'sensitive_access': 0
     }
-    
-    action_data = {
-        'action': 'login',
-        'location': location
-    }
-    
-    return analyze_behavior(user_id, session_data, action_data)
@@ -0,0 +1,361 @@
+"""
+Query Plan Verification
+=======================
+Regression suite for the queries database.py issues. Every case runs a
+database.py function against a scratch database of realistic size,
+captures the SQL it sends and checks:
+
+  1. no statement falls back to a full table scan,
+  2. each EXPLAIN QUERY PLAN matches the expectation stored in
+     query_plans.json,
+  3. the median wall time stays within the recorded budget,
+  4. every public database.py function that queries is covered.
+
+Usage:
+    python verify_query_plans.py            (exit code 1 on any failure)
+    python verify_query_plans.py --update   (re-record plans and budgets after an intended change
+                                             or a SQLite upgrade; commit query_plans.json)
+    python verify_query_plans.py --scale 5  (5x the default data size; budgets only checked at the recorded scale)
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import inspect
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+
+EXPECTATIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'query_plans.json')
+
+TIMING_RUNS = 5               # Median of this many runs is compared to the budget
+BUDGET_HEADROOM = 3.0         # Recorded budget = measured median x headroom ...
+BUDGET_FLOOR_MS = 5.0         # ... but never below this (timer noise)
+
+# Rows per table at --scale 1
+DATA_SIZES = {'users': 2000, 'logs': 100000, 'alerts': 10000, 'sessions': 20000, 'login_days': 365}
+
+# A plan step like "SCAN al" reads the whole table; "SCAN x USING COVERING
+# INDEX idx" walks a (partial) index and is fine, as is an FTS5 table
+# driven by MATCH ("SCAN f VIRTUAL TABLE INDEX 0:M2").
+FULL_SCAN = re.compile(r'\bSCAN (\w+)(?!\w| USING| VIRTUAL TABLE INDEX \d+:M)')
+
+# Small tables some cases read whole by design (the result is the whole table)
+WHOLE_TABLE_READS = {
+    'get_all_tenants()': {'t'},
+    'get_tenants_with_revenue()': {'t'},
+    'get_all_roles()': {'roles'},                    # Loaded once into the config cache
+    'get_user_by_id(user_id)': {'roles'},            # Role map load on a config cache miss
+    'get_user_by_national_id(national_id)': {'roles'},
+}
+
+# Read whole by every config cache lookup that checks the shared versions (one row per tenant)
+SHARED_VERSION_TABLES = {'config_versions'}
+
+# Statements traced for plan checks (INSERTs have trivial plans)
+TRACED = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+# Public database.py functions with no query worth a plan check
+NOT_QUERIES = {
+    'get_pool', 'close_pool', 'get_pool_stats', 'get_db', 'read_db', 'write_db', 'submit_write',
+    'start_single_writer', 'stop_single_writer', 'get_writer_stats',
+    'start_write_behind', 'stop_write_behind', 'flush_write_behind', 'get_write_behind_stats',
+    'get_session_cache_stats', 'get_config_cache_stats', 'invalidate_config',
+    'init_database', 'seed_data', 'encode_cursor', 'decode_cursor', 'page_cursors', 'page_limit',
+    # Plain INSERTs
+    'create_user', 'create_users_bulk', 'create_session', 'record_login', 'log_activity', 'create_alert',
+    # Maintenance jobs, not request paths
+    'archive_activity_logs', 'reconcile_counters',
+}
+
+def populate(scale=1):
+    """Add enough rows that a table scan would be visibly wrong (deterministic)"""
+    rng = random.Random(42)
+    sizes = {name: int(count * scale) for name, count in DATA_SIZES.items()}
+    today = datetime.utcnow().date()
+    with database.get_db() as conn:
+        conn.executemany('''
+            INSERT INTO users (tenant_id, national_id, name, role_id, is_active) VALUES (?, ?, ?, ?, ?)
+        ''', [(rng.randint(1, 5), f'2{i:09d}', f'User {i}', rng.randint(1, 7), rng.random() < 0.95)
+              for i in range(sizes['users'])])
+        conn.executemany('''
+            INSERT INTO activity_logs (user_id, tenant_id, action, risk_score, is_anomaly, timestamp)
+            VALUES (?, ?, ?, ?, ?, datetime('now', ?))
+        ''', [(rng.randint(1, 7), rng.randint(1, 5), rng.choice(['view_document', 'login_success', 'logout']),
+               rng.randint(0, 100), rng.random() < 0.05, f'-{rng.randint(0, 43200)} minutes')
+              for _ in range(sizes['logs'])])
+        conn.executemany('''
+            INSERT INTO activity_logs (user_id, tenant_id, action, risk_score, timestamp,
+                                       status, location_id, is_new_device, failed_logins)
+            VALUES (?, ?, 'behavior_check', ?, datetime('now', ?), ?, ?, ?, ?)
+        ''', [(rng.randint(1, 7), rng.randint(1, 5), rng.randint(0, 100), f'-{rng.randint(0, 43200)} minutes',
+               rng.choice(['normal', 'normal', 'suspicious', 'threat']), rng.choice([0, 0, 1, 2, 3, 4]),
+               int(rng.random() < 0.05), rng.choice([0, 0, 1, 3])) for _ in range(sizes['logs'] // 4)])
+        conn.executemany('''
+            INSERT INTO security_alerts (user_id, tenant_id, alert_type, severity, description, is_resolved, created_at)
+            VALUES (?, ?, ?, 'warning', 'Risk score', ?, datetime('now', ?))
+        ''', [(rng.randint(1, 7), rng.randint(1, 5), rng.choice(['suspicious_behavior', 'high_risk_behavior']),
+               rng.choice([0, 1]), f'-{rng.randint(0, 720)} hours') for _ in range(sizes['alerts'])])
+        conn.executemany('''
+            INSERT INTO sessions (user_id, tenant_id, token, is_active, login_time)
+            VALUES (?, ?, ?, ?, datetime('now', ?))
+        ''', [(rng.randint(1, 7), rng.randint(1, 5), f'token-{i}', rng.random() < 0.1,
+               f'-{rng.randint(0, 720)} hours') for i in range(sizes['sessions'])])
+        conn.executemany('''
+            INSERT OR IGNORE INTO login_stats (tenant_id, date, successful_logins, failed_logins) VALUES (?, ?, ?, ?)
+        ''', [(t, (today - timedelta(days=d)).isoformat(), rng.randint(0, 200), rng.randint(0, 5))
+              for t in range(1, 6) for d in range(sizes['login_days'])])
+        conn.commit()
+        conn.execute('ANALYZE')
+
+@contextmanager
+def capture_queries(statements):
+    """Record every SELECT / UPDATE / DELETE that database.py issues while the block runs"""
+    original = database.get_db
+
+    @contextmanager
+    def traced_db():
+        with original() as conn:
+            conn.set_trace_callback(
+                lambda sql: statements.append(sql) if sql.lstrip().upper().startswith(TRACED) else None
+            )
+            try:
+                yield conn
+            finally:
+                conn.set_trace_callback(None)
+
+    database.get_db = traced_db
+    try:
+        yield
+    finally:
+        database.get_db = original
+
+def query_plan(sql):
+    """EXPLAIN QUERY PLAN as detail lines indented by depth"""
+    with database.get_db() as conn:
+        rows = conn.execute('EXPLAIN QUERY PLAN ' + sql).fetchall()
+    depth = {0: -1}
+    lines = []
+    for row in rows:
+        depth[row['id']] = depth.get(row['parent'], -1) + 1
+        lines.append('  ' * depth[row['id']] + row['detail'])
+    return lines
+
+def full_scans(plan):
+    """Return the tables a plan scans without an index"""
+    return [m.group(1) for line in plan for m in [FULL_SCAN.search(line)] if m]
+
+# Keyset cursor positioned mid-table (populate() spreads rows over the last 30 days)
+CURSOR = database.encode_cursor((datetime.utcnow() - timedelta(days=15)).strftime('%Y-%m-%d %H:%M:%S'), 1)
+SINCE = (datetime.utcnow() - timedelta(days=15)).strftime('%Y-%m-%d')
+
+def first_batch(batches):
+    return next(iter(batches), None)
+
+def uncached(fn, *args, **kwargs):
+    """Call a config-cached lookup with the cache emptied, so it queries"""
+    database.invalidate_config()
+    return fn(*args, **kwargs)
+
+QUERY_CASES = [
+    # Activity logs: every filter branch x keyset direction
+    ('get_activity_logs()', lambda: database.get_activity_logs()),
+    ('get_activity_logs(after)', lambda: database.get_activity_logs(after=CURSOR)),
+    ('get_activity_logs(user_id)', lambda: database.get_activity_logs(user_id=1)),
+    ('get_activity_logs(user_id, after)', lambda: database.get_activity_logs(user_id=1, after=CURSOR)),
+    ('get_activity_logs(user_id, before)', lambda: database.get_activity_logs(user_id=1, before=CURSOR)),
+    ('get_activity_logs(user_id, tenant_id)', lambda: database.get_activity_logs(user_id=1, tenant_id=1)),
+    ('get_activity_logs(tenant_id)', lambda: database.get_activity_logs(tenant_id=1)),
+    ('get_activity_logs(tenant_id, after)', lambda: database.get_activity_logs(tenant_id=1, after=CURSOR)),
+    ('get_activity_logs(tenant_id, before)', lambda: database.get_activity_logs(tenant_id=1, before=CURSOR)),
+    ('get_activity_logs(fields, json_rows)',
+     lambda: database.get_activity_logs(tenant_id=1, fields=['id', 'action'], json_rows='array')),
+    ('query_activity_logs(location_id, is_new_device, since)',
+     lambda: database.query_activity_logs({'location_id': {'gte': 3}, 'is_new_device': 1}, since=SINCE)),
+    ('query_activity_logs(status, tenant_id)', lambda: database.query_activity_logs({'status': 'threat'}, tenant_id=1)),
+    ('query_activity_logs(method)', lambda: database.query_activity_logs({'method': 'nafath'})),
+    ('query_activity_logs(failed_logins in, after)',
+     lambda: database.query_activity_logs({'failed_logins': {'in': [3, 4, 5]}}, after=CURSOR)),
+    ('iter_activity_logs(since)', lambda: first_batch(database.iter_activity_logs(since=SINCE))),
+    ('iter_activity_logs(tenant_id, after)',
+     lambda: first_batch(database.iter_activity_logs(tenant_id=1, after=CURSOR))),
+    ('iter_activity_logs(user_id, action)',
+     lambda: first_batch(database.iter_activity_logs(user_id=1, action='behavior_check'))),
+
+    # Alerts: every tenant / resolved combination x keyset direction
+    ('get_alerts()', lambda: database.get_alerts()),
+    ('get_alerts(after)', lambda: database.get_alerts(after=CURSOR)),
+    ('get_alerts(tenant_id)', lambda: database.get_alerts(tenant_id=1)),
+    ('get_alerts(tenant_id, before)', lambda: database.get_alerts(tenant_id=1, before=CURSOR)),
+    ('get_alerts(is_resolved)', lambda: database.get_alerts(is_resolved=0)),
+    ('get_alerts(is_resolved, after)', lambda: database.get_alerts(is_resolved=1, after=CURSOR)),
+    ('get_alerts(tenant_id, is_resolved)', lambda: database.get_alerts(tenant_id=1, is_resolved=0)),
+    ('get_alerts(tenant_id, is_resolved, after)',
+     lambda: database.get_alerts(tenant_id=1, is_resolved=0, after=CURSOR)),
+    ('iter_alerts(since)', lambda: first_batch(database.iter_alerts(since=SINCE))),
+    ('iter_alerts(tenant_id, alert_type)',
+     lambda: first_batch(database.iter_alerts(tenant_id=1, alert_type='suspicious_behavior'))),
+    ('search(alerts)', lambda: database.search('alerts', 'suspicious')),
+    ('search(alerts, tenant_id)', lambda: database.search('alerts', 'suspicious', tenant_id=1)),
+    ('search(logs, after)', lambda: database.search('logs', 'view*', after=database.encode_cursor(-1.0, 1))),
+
+    # Login statistics and dashboard
+    ('get_login_stats()', lambda: database.get_login_stats()),
+    ('get_login_stats(days)', lambda: database.get_login_stats(days=90)),
+    ('get_login_stats(tenant_id)', lambda: database.get_login_stats(tenant_id=1)),
+    ('get_login_stats(tenant_id, days)', lambda: database.get_login_stats(tenant_id=1, days=365)),
+    ('get_dashboard_stats()', lambda: database.get_dashboard_stats()),
+    ('get_dashboard_stats(tenant_id)', lambda: database.get_dashboard_stats(1)),
+
+    # Tenants, users, roles, settings
+    ('get_all_tenants()', lambda: database.get_all_tenants()),
+    ('get_tenants_with_revenue()', lambda: database.get_tenants_with_revenue()),
+    ('get_platform_revenue()', lambda: database.get_platform_revenue()),
+    ('get_tenant_by_id(tenant_id)', lambda: database.get_tenant_by_id(1)),
+    ('get_tenant_by_code(code)', lambda: database.get_tenant_by_code('MOFA')),
+    ('get_tenant_integrations(tenant_id)', lambda: database.get_tenant_integrations(1)),
+    ('get_tenant_settings(tenant_id)', lambda: uncached(database.get_tenant_settings, 1)),
+    ('get_all_roles()', lambda: uncached(database.get_all_roles)),
+    ('get_roles_by_tenant(tenant_id)', lambda: uncached(database.get_roles_by_tenant, 1)),
+    ('get_user_by_id(user_id)', lambda: uncached(database.get_user_by_id, 1)),
+    ('get_user_by_national_id(national_id)', lambda: uncached(database.get_user_by_national_id, '1055443322')),
+    ('get_users_by_tenant(tenant_id)', lambda: database.get_users_by_tenant(1, limit=50)),
+    ('get_users_by_tenant(tenant_id, after)', lambda: database.get_users_by_tenant(1, limit=50, after=CURSOR)),
+    ('get_all_users()', lambda: database.get_all_users(limit=50)),
+    ('get_all_users(before)', lambda: database.get_all_users(limit=50, before=CURSOR)),
+
+    # Sessions (tokens inserted by populate() are not in the session cache)
+    ('get_session_by_token(token)', lambda: database.get_session_by_token(f'token-{random.randrange(10000)}')),
+    ('get_auth_context(token)', lambda: database.get_auth_context(f'token-{random.randrange(10000)}')),
+    ('get_user_sessions(user_id)', lambda: database.get_user_sessions(1)),
+    ('get_user_sessions(user_id, after)', lambda: database.get_user_sessions(1, after=CURSOR)),
+
+    # Writes
+    ('update_user_last_login(user_id)', lambda: database.update_user_last_login(1)),
+    ('update_tenant_settings(tenant_id)', lambda: database.update_tenant_settings(1, {'max_failed_attempts': 3})),
+    ('update_integration(integration_id)', lambda: database.update_integration(1, True)),
+    ('end_session(token)', lambda: database.end_session('token-0')),
+    ('expire_sessions()', lambda: database.expire_sessions(480, batch_size=100)),
+]
+
+# =====================================
+# EXPECTATIONS
+# =====================================
+
+def load_expectations():
+    if not os.path.exists(EXPECTATIONS_FILE):
+        return {'scale': None, 'queries': {}}
+    with open(EXPECTATIONS_FILE, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_expectations(expectations):
+    with open(EXPECTATIONS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(expectations, f, indent=2, ensure_ascii=False, sort_keys=True)
+        f.write('\n')
+
+def plan_diff(expected, actual):
+    """First differing statement plan, as printable lines"""
+    for i in range(max(len(expected), len(actual))):
+        want = expected[i] if i < len(expected) else ['<no statement>']
+        got = actual[i] if i < len(actual) else ['<no statement>']
+        if want != got:
+            return ([f'     statement {i + 1} expected:'] + [f'       {line}' for line in want] +
+                    [f'     statement {i + 1} got:'] + [f'       {line}' for line in got])
+    return []
+
+def uncovered_functions():
+    """Public database.py functions that issue queries but have no case"""
+    covered = {label.split('(')[0] for label, _ in QUERY_CASES}
+    public = {name for name, obj in vars(database).items()
+              if inspect.isfunction(obj) and obj.__module__ == 'database' and not name.startswith('_')}
+    return sorted(public - covered - NOT_QUERIES)
+
+# =====================================
+# RUNNER
+# =====================================
+
+def verify_query_plans(update=False, scale=1):
+    print(f"\n🔍 Verifying query plans (scale {scale:g})...\n")
+
+    workdir = tempfile.mkdtemp()
+    database.DATABASE_PATH = os.path.join(workdir, 'plans.db')
+    database.init_database()
+    database.seed_data()
+    populate(scale)
+    database.reconcile_counters()
+
+    expectations = load_expectations()
+    check_budgets = not update and expectations.get('scale') == scale
+    if not update and not check_budgets:
+        print(f"⚠️  Budgets were recorded at scale {expectations.get('scale')}; checking plans only\n")
+    recorded = {}
+    failures = 0
+
+    for label, run in QUERY_CASES:
+        statements = []
+        with capture_queries(statements):
+            run()
+        # A statement may be traced more than once (UPDATE ... RETURNING); keep one of each
+        statements = list(dict.fromkeys(statements))
+        plans = [query_plan(sql) for sql in statements]
+
+        samples = []
+        for _ in range(TIMING_RUNS):
+            start = time.perf_counter()
+            run()
+            samples.append((time.perf_counter() - start) * 1000)
+        median_ms = sorted(samples)[len(samples) // 2]
+        recorded[label] = {'plans': plans, 'budget_ms': round(max(BUDGET_FLOOR_MS, median_ms * BUDGET_HEADROOM), 1)}
+
+        expected = expectations['queries'].get(label)
+        problems = []
+        scanned = sorted({table for plan in plans for table in full_scans(plan)} - WHOLE_TABLE_READS.get(label, set()) - SHARED_VERSION_TABLES)
+        if scanned:
+            problems.append(f"full scan of {', '.join(scanned)}")
+        if not statements:
+            problems.append('issued no query')
+        if not update and expected is None:
+            problems.append('no stored expectation (run with --update)')
+        elif not update:
+            if expected['plans'] != plans:
+                problems.append('plan changed')
+            if check_budgets and median_ms > expected['budget_ms']:
+                problems.append(f"{median_ms:.1f} ms over budget of {expected['budget_ms']} ms")
+
+        if problems:
+            failures += 1
+            print(f"❌ {label}: {'; '.join(problems)}")
+            if 'plan changed' in problems:
+                print('\n'.join(plan_diff(expected['plans'], plans)))
+        else:
+            print(f"✅ {label}: {len(statements)} queries, all indexed, {median_ms:.2f} ms")
+
+    for name in uncovered_functions():
+        failures += 1
+        print(f"❌ database.{name}(): not covered (add it to QUERY_CASES, or to NOT_QUERIES if it has no query)")
+
+    database.close_pool()
+    print()
+    if update:
+        save_expectations({'scale': scale, 'queries': recorded})
+        print(f"✓ Recorded {len(recorded)} plans and budgets in {os.path.basename(EXPECTATIONS_FILE)}")
+    if failures:
+        print(f"❌ {failures} query path(s) regressed")
+        return False
+    print("✅ Query Plan Verification Complete: plans match, all indexed, within budget.")
+    return True
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='EXPLAIN QUERY PLAN regression suite for database.py')
+    parser.add_argument('--update', action='store_true', help='re-record expected plans and time budgets')
+    parser.add_argument('--scale', type=float, default=1, help='data size multiplier (default 1)')
+    args = parser.parse_args()
+    sys.exit(0 if verify_query_plans(args.update, args.scale) else 1)
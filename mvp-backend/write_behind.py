@@ -0,0 +1,180 @@
+"""
+Write-Behind Queue
+==================
+Group-commit writer for append-only tables (activity logs, alerts).
+
+Callers enqueue (sql, params) pairs and return immediately; a dedicated
+writer thread drains the queue and inserts them with executemany in
+batched transactions, so N request-thread writes cost one commit.
+"""
+
+import queue
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger('app')    # Flask's app.logger
+
+_STOP = object()
+
+class WriteBehindQueue:
+    """
+    Bounded in-memory write queue drained by one writer thread.
+
+    Args:
+        get_db: Context manager factory yielding a database connection
+        flush_interval: Max seconds a queued row waits before being written
+        batch_size: Max rows written per transaction
+        max_queue: Queue capacity; enqueue blocks (backpressure) when full
+    """
+
+    def __init__(self, get_db, flush_interval=0.05, batch_size=500, max_queue=10000):
+        self.get_db = get_db
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,            # Rows that failed on their own retry and were lost
+            'failed_batches': 0,
+            'batches': 0,
+            'blocked_puts': 0,
+            'max_depth': 0,
+            'total_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'last_flush_ms': 0.0,
+        }
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10):
+        """Flush everything still queued and stop the writer thread"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def enqueue(self, sql, params):
+        """Queue one write; blocks while the queue is full"""
+        try:
+            self._queue.put_nowait((sql, params))
+        except queue.Full:
+            with self._lock:
+                self._stats['blocked_puts'] += 1
+            self._queue.put((sql, params))
+        with self._lock:
+            self._stats['enqueued'] += 1
+            self._stats['max_depth'] = max(self._stats['max_depth'], self._queue.qsize())
+
+    def flush(self):
+        """Block until every write queued so far is committed"""
+        if self.running:
+            self._queue.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    self._queue.task_done()
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if stopping:
+                # Drain whatever was queued behind the stop marker
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+                    else:
+                        self._queue.task_done()
+
+            if batch:
+                self._write(batch)
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        written = dropped = 0
+        batch_failed = False
+        with self.get_db() as conn:
+            try:
+                for sql, rows in self._group(batch):
+                    conn.executemany(sql, rows)
+                conn.commit()
+                written = len(batch)
+            except sqlite3.Error as e:
+                conn.rollback()
+                batch_failed = True
+                logger.warning('Write-behind batch of %d rows failed (%s); retrying rows individually', len(batch), e)
+                for sql, params in batch:
+                    try:
+                        conn.execute(sql, params)
+                        conn.commit()
+                        written += 1
+                    except sqlite3.Error as row_error:
+                        conn.rollback()
+                        dropped += 1
+                        logger.error('Write-behind row dropped (%s): %s %r', row_error, ' '.join(sql.split()), params)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._stats['written'] += written
+            self._stats['dropped'] += dropped
+            self._stats['failed_batches'] += batch_failed
+            self._stats['batches'] += 1
+            self._stats['total_flush_ms'] += elapsed_ms
+            self._stats['max_flush_ms'] = max(self._stats['max_flush_ms'], elapsed_ms)
+            self._stats['last_flush_ms'] = elapsed_ms
+
+    @staticmethod
+    def _group(batch):
+        """Group consecutive writes with the same statement for executemany"""
+        groups = []
+        for sql, params in batch:
+            if groups and groups[-1][0] == sql:
+                groups[-1][1].append(params)
+            else:
+                groups.append((sql, [params]))
+        return groups
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['queue_capacity'] = self._queue.maxsize
+        stats['running'] = self.running
+        stats['avg_flush_ms'] = round(stats['total_flush_ms'] / max(stats['batches'], 1), 3)
+        for key in ('total_flush_ms', 'max_flush_ms', 'last_flush_ms'):
+            stats[key] = round(stats[key], 3)
+        return stats
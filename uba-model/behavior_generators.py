@@ -0,0 +1,73 @@
+"""
+Behavior Generators
+===================
+Synthetic normal and anomalous behavior distributions for the 8 UBA
+features. Used to train the model (uba_model.py) and to generate
+realistic load-test data (mvp-backend/seeder.py).
+
+Generators draw from `rng` - the global np.random state by default, or a
+np.random.RandomState for independent, reproducible streams.
+"""
+
+import numpy as np
+
+def normal_behavior(n_samples=1000, rng=np.random):
+    """Normal user behavior patterns, one array per feature"""
+    return {
+        # Login hour (8-18 normal working hours)
+        'login_hour': rng.normal(13, 2, n_samples).clip(8, 18),
+        
+        # Location (0-2: known locations - Riyadh, Jeddah, Dammam)
+        'location_id': rng.choice([0, 1, 2], n_samples, p=[0.7, 0.2, 0.1]),
+        
+        # Device familiarity (0: known, 1: new) - mostly known devices
+        'is_new_device': rng.choice([0, 1], n_samples, p=[0.95, 0.05]),
+        
+        # Number of actions per session (5-30 normal)
+        'actions_count': rng.normal(15, 5, n_samples).clip(5, 30),
+        
+        # Files accessed (1-10 normal)
+        'files_accessed': rng.normal(5, 2, n_samples).clip(1, 10),
+        
+        # Session duration in minutes (15-120 normal)
+        'session_duration': rng.normal(60, 20, n_samples).clip(15, 120),
+        
+        # Failed login attempts (0-1 normal)
+        'failed_logins': rng.choice([0, 1], n_samples, p=[0.9, 0.1]),
+        
+        # Sensitive data access (0-2 normal)
+        'sensitive_access': rng.choice([0, 1, 2], n_samples, p=[0.6, 0.3, 0.1])
+    }
+
+
+def anomalous_behavior(n_samples=50, rng=np.random):
+    """Anomalous/attack behavior patterns, one array per feature"""
+    return {
+        # Login at unusual hours (0-6 AM or late night)
+        'login_hour': rng.choice([2, 3, 4, 23, 0, 1], n_samples),
+        
+        # Location (3-5: unknown/foreign locations)
+        'location_id': rng.choice([3, 4, 5], n_samples),
+        
+        # New/unknown device
+        'is_new_device': np.ones(n_samples),
+        
+        # Unusual number of actions (too many or too few)
+        'actions_count': rng.choice(
+            list(range(80, 200)) + list(range(0, 3)), n_samples
+        ),
+        
+        # Many files accessed (data exfiltration pattern)
+        'files_accessed': rng.randint(30, 100, n_samples),
+        
+        # Very short or very long sessions
+        'session_duration': rng.choice(
+            list(range(1, 5)) + list(range(240, 480)), n_samples
+        ),
+        
+        # Multiple failed login attempts
+        'failed_logins': rng.randint(3, 10, n_samples),
+        
+        # High sensitive data access
+        'sensitive_access': rng.randint(5, 15, n_samples)
+    }
@@ -17,6 +17,8 @@ import pickle
 from datetime import datetime, timedelta
 import random
 
+from behavior_generators import normal_behavior, anomalous_behavior
+
 # =====================================
 # 1. GENERATE SYNTHETIC TRAINING DATA
 # =====================================
@@ -24,71 +26,13 @@ import random
 def generate_normal_behavior(n_samples=1000):
     """Generate normal user behavior patterns"""
     np.random.seed(42)
-    
-    data = {
-        # Login hour (8-18 normal working hours)
-        'login_hour': np.random.normal(13, 2, n_samples).clip(8, 18),
-        
-        # Location (0-2: known locations - Riyadh, Jeddah, Dammam)
-        'location_id': np.random.choice([0, 1, 2], n_samples, p=[0.7, 0.2, 0.1]),
-        
-        # Device familiarity (0: known, 1: new) - mostly known devices
-        'is_new_device': np.random.choice([0, 1], n_samples, p=[0.95, 0.05]),
-        
-        # Number of actions per session (5-30 normal)
-        'actions_count': np.random.normal(15, 5, n_samples).clip(5, 30),
-        
-        # Files accessed (1-10 normal)
-        'files_accessed': np.random.normal(5, 2, n_samples).clip(1, 10),
-        
-        # Session duration in minutes (15-120 normal)
-        'session_duration': np.random.normal(60, 20, n_samples).clip(15, 120),
-        
-        # Failed login attempts (0-1 normal)
-        'failed_logins': np.random.choice([0, 1], n_samples, p=[0.9, 0.1]),
-        
-        # Sensitive data access (0-2 normal)
-        'sensitive_access': np.random.choice([0, 1, 2], n_samples, p=[0.6, 0.3, 0.1])
-    }
-    
-    return pd.DataFrame(data)
+    return pd.DataFrame(normal_behavior(n_samples))
 
 
 def generate_anomalous_behavior(n_samples=50):
     """Generate anomalous/attack behavior patterns"""
     np.random.seed(123)
-    
-    data = {
-        # Login at unusual hours (0-6 AM or late night)
-        'login_hour': np.random.choice([2, 3, 4, 23, 0, 1], n_samples),
-        
-        # Location (3-5: unknown/foreign locations)
-        'location_id': np.random.choice([3, 4, 5], n_samples),
-        
-        # New/unknown device
-        'is_new_device': np.ones(n_samples),
-        
-        # Unusual number of actions (too many or too few)
-        'actions_count': np.random.choice(
-            list(range(80, 200)) + list(range(0, 3)), n_samples
-        ),
-        
-        # Many files accessed (data exfiltration pattern)
-        'files_accessed': np.random.randint(30, 100, n_samples),
-        
-        # Very short or very long sessions
-        'session_duration': np.random.choice(
-            list(range(1, 5)) + list(range(240, 480)), n_samples
-        ),
-        
-        # Multiple failed login attempts
-        'failed_logins': np.random.randint(3, 10, n_samples),
-        
-        # High sensitive data access
-        'sensitive_access': np.random.randint(5, 15, n_samples)
-    }
-    
-    return pd.DataFrame(data)
+    return pd.DataFrame(anomalous_behavior(n_samples))
 
 
 # =====================================